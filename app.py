@@ -125,10 +125,12 @@ def show_dashboard():
             st.switch_page("pages/1_Incident_Report_Generator.py")
 
     with row1[1]:
-        st.button("Tool 2 (Coming soon)", use_container_width=True, disabled=True)
+        if st.button("Incident Search", use_container_width=True):
+            st.switch_page("pages/2_Incident_Search.py")
 
     with row1[2]:
-        st.button("Tool 3 (Coming soon)", use_container_width=True, disabled=True)
+        if st.button("Metrics", use_container_width=True, disabled=not ms_graph.is_admin()):
+            st.switch_page("pages/3_Metrics.py")
 
     with row2[0]:
         st.button("Tool 4 (Coming soon)", use_container_width=True, disabled=True)
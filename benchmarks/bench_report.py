@@ -0,0 +1,294 @@
+"""
+Report engine benchmark suite: generate_docx, parse_existing_ir_docx and the
+table/figure helpers on synthetic reports of varying size.
+
+    python benchmarks/bench_report.py                 # run, compare to baseline.json
+    python benchmarks/bench_report.py --save          # run, write baseline.json
+    python benchmarks/bench_report.py -k rows_ -n 3   # subset / fewer repeats
+
+Each case runs in a fresh process so peak RSS is per case. Recorded per
+case/op: median and min wall time, peak RSS, RSS growth during the op and
+output DOCX size. The fast parser is also checked against the python-docx
+reference on every generated report.
+
+Compared with the baseline, a result regresses when it is slower than
+--time-tol (and at least 5 ms), uses more than --rss-tol memory, or produces
+a DOCX more than --size-tol larger. Any regression or parser mismatch exits 1.
+Baselines are machine-specific; regenerate with --save after hardware changes.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# name -> (event/action rows, image count, image size px, section text chars)
+CASES = {
+    "small": (10, 0, (1024, 768), 500),
+    "typical": (200, 6, (3000, 2000), 3000),
+    "rows_2k": (2000, 0, (1024, 768), 500),
+    "rows_10k": (10000, 0, (1024, 768), 500),
+    "images_20x2mp": (20, 20, (1600, 1200), 500),
+    "images_8x12mp": (20, 8, (4000, 3000), 500),
+    "text_50k": (20, 0, (1024, 768), 50000),
+}
+
+
+# ---------------------------
+# engine loading / inputs (child process)
+# ---------------------------
+def _load_engine():
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+    import ir_engine
+
+    return ir_engine
+
+
+class _Upload:
+    """Stands in for a Streamlit UploadedFile."""
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self._data = data
+
+    def getvalue(self) -> bytes:
+        return self._data
+
+
+def _photo(size: tuple[int, int], seed: int) -> bytes:
+    # noise over a gradient compresses roughly like a phone photo
+    from PIL import Image
+
+    w, h = size
+    noise = Image.effect_noise((w, h), 40 + seed % 20).convert("RGB")
+    grad = Image.linear_gradient("L").resize((w, h)).convert("RGB")
+    img = Image.blend(noise, grad, 0.5)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=92)
+    return buf.getvalue()
+
+
+def _text(n: int, seed: int) -> str:
+    words = ("antenna tracking servo encoder fault observed during pass ACU reset power "
+             "supply inspected cable replaced operator logged telemetry nominal").split()
+    out, i = [], seed
+    while sum(len(w) + 1 for w in out) < n:
+        out.append(words[i % len(words)])
+        i += 7
+    return " ".join(out)[:n]
+
+
+def _report(rows: int, images: int, size: tuple[int, int], text_len: int) -> dict:
+    import pandas as pd
+
+    photos = [_Upload(f"photo_{i}.jpg", _photo(size, i)) for i in range(images)]
+    quarter = [photos[i::4] for i in range(4)]
+    return {
+        "reported_by": "Juan Dela Cruz", "position": "Engineer", "date_of_report": "2026-01-02",
+        "full_incident_no": "SMCOD-IR-GS-QZN-2026-0001", "incident_date": "2026-01-01",
+        "incident_time": "10:00:00", "location": "Quezon City", "current_status": "Resolved",
+        "nature": _text(text_len, 1), "damages": _text(text_len, 2),
+        "investigation": _text(text_len, 3), "conclusion": _text(text_len, 4),
+        "sequence_df": pd.DataFrame({
+            "Date": [f"2026-01-{i % 28 + 1:02d}" for i in range(rows)],
+            "Time": [f"{i % 24:02d}:{i % 60:02d}:00" for i in range(rows)],
+            "Category": ["ACU" if i % 3 else "Scheduler" for i in range(rows)],
+            "Message": [f"Pass {i}: {_text(60, i)}" for i in range(rows)],
+        }),
+        "actions_df": pd.DataFrame({
+            "Date": [f"2026-01-{i % 28 + 1:02d}" for i in range(rows)],
+            "Time": [f"{i % 24:02d}:30:00" for i in range(rows)],
+            "Performed by": ["Operator"] * rows,
+            "Action": [f"Action {i}: {_text(40, i)}" for i in range(rows)],
+            "Result": ["OK"] * rows,
+        }),
+        "sequence_images": quarter[0], "damages_images": quarter[1],
+        "investigation_images": quarter[2], "conclusion_images": quarter[3],
+        "sequence_captions": [f"caption {i}" for i in range(len(quarter[0]))],
+        "damages_captions": [], "investigation_captions": [], "conclusion_captions": [],
+    }
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1_048_576
+
+
+def _same_parse(a: dict, b: dict) -> bool:
+    for k in a:
+        if k.endswith("_df"):
+            if not a[k].astype(str).equals(b[k].astype(str)):
+                return False
+        elif a[k] != b[k]:
+            return False
+    return set(a) == set(b)
+
+
+def _measure(fn, repeats: int, budget_s: float, setup=None) -> tuple[dict, object]:
+    """Time fn() (or fn(setup()) with the setup left out of the timing)."""
+    rss0 = _rss_mb()
+    times, out = [], None
+    start = time.perf_counter()
+    for _ in range(repeats):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        out = fn(arg) if setup else fn()
+        times.append((time.perf_counter() - t0) * 1000)
+        if time.perf_counter() - start > budget_s:
+            break
+    peak = _rss_mb()
+    return {
+        "median_ms": round(statistics.median(times), 2),
+        "min_ms": round(min(times), 2),
+        "runs": len(times),
+        "peak_rss_mb": round(peak, 1),
+        "rss_growth_mb": round(peak - rss0, 1),
+    }, out
+
+
+def run_case(name: str, repeats: int, budget_s: float) -> dict:
+    """Runs in a fresh child process; returns {op: metrics} plus checks."""
+    import copy
+
+    engine = _load_engine()
+    rows, images, size, text_len = CASES[name]
+    data = _report(rows, images, size, text_len)
+    results: dict = {}
+
+    if images:
+        results["prepare_images"], _ = _measure(
+            lambda: engine.prepare_report_images(copy.copy(data)), repeats, budget_s
+        )
+    engine.prepare_report_images(data)
+
+    results["generate"], docx = _measure(lambda: engine.generate_docx(data), repeats, budget_s)
+    results["generate"]["docx_bytes"] = len(docx)
+
+    def fresh_anchors():
+        return engine.DocAnchors(engine.template_cache.load_template(engine.TEMPLATE_PATH))
+
+    def tables(anchors):
+        engine._fill_sequence_table(anchors.tables[2], data["sequence_df"])
+        engine._fill_actions_table(anchors.tables[3], data["actions_df"])
+
+    results["tables"], _ = _measure(tables, repeats, budget_s, setup=fresh_anchors)
+
+    if images:
+        def figures(anchors):
+            for heading, key in [("Sequence of Events", "sequence"), ("Damages Incurred (if any)", "damages"),
+                                 ("Investigation and Analysis", "investigation"),
+                                 ("Conclusion and Recommendations", "conclusion")]:
+                engine._append_figures_after_heading(
+                    anchors, heading, data[f"{key}_images"], data[f"{key}_captions"], 1, heading
+                )
+
+        results["figures"], _ = _measure(figures, repeats, budget_s, setup=fresh_anchors)
+        results["extract_figures"], _ = _measure(lambda: engine.ir_parse.extract_figures(docx), repeats, budget_s)
+
+    results["parse"], fast = _measure(lambda: engine.parse_existing_ir_docx(docx), repeats, budget_s)
+    results["parse_reference"], ref = _measure(
+        lambda: engine.parse_existing_ir_docx_python_docx(docx), repeats, budget_s
+    )
+    results["_checks"] = {"parse_matches_reference": _same_parse(fast, ref)}
+    return results
+
+
+# ---------------------------
+# driver
+# ---------------------------
+def compare(current: dict, baseline: dict, time_tol: float, rss_tol: float, size_tol: float) -> list[str]:
+    problems = []
+    for key, cur in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        slower = cur["median_ms"] - base["median_ms"]
+        if cur["median_ms"] > base["median_ms"] * (1 + time_tol) and slower > 5:
+            problems.append(f"{key}: {base['median_ms']:.1f} -> {cur['median_ms']:.1f} ms")
+        if cur["peak_rss_mb"] > base["peak_rss_mb"] * (1 + rss_tol):
+            problems.append(f"{key}: peak RSS {base['peak_rss_mb']:.0f} -> {cur['peak_rss_mb']:.0f} MB")
+        if "docx_bytes" in base and cur.get("docx_bytes", 0) > base["docx_bytes"] * (1 + size_tol):
+            problems.append(f"{key}: DOCX {base['docx_bytes']} -> {cur['docx_bytes']} bytes")
+    return problems
+
+
+def _machine() -> str:
+    return f"{platform.machine()} {platform.processor() or ''} cpus={os.cpu_count()}".strip()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", "--repeats", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=20.0, help="max seconds per op before stopping repeats")
+    ap.add_argument("-k", default="", help="only cases whose name contains this")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH))
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--out", default="", help="also write this run's results to a JSON file")
+    ap.add_argument("--time-tol", type=float, default=0.25)
+    ap.add_argument("--rss-tol", type=float, default=0.20)
+    ap.add_argument("--size-tol", type=float, default=0.05)
+    args = ap.parse_args()
+
+    names = [n for n in CASES if args.k in n]
+    results: dict = {}
+    failures: list[str] = []
+
+    print(f"{'case/op':<32} {'median ms':>10} {'min ms':>9} {'peak MB':>8} {'+MB':>6} {'docx KB':>9}")
+    for name in names:
+        # spawn: a clean interpreter per case so RSS numbers don't leak between cases
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            out = pool.submit(run_case, name, args.repeats, args.budget).result()
+        checks = out.pop("_checks")
+        if not checks["parse_matches_reference"]:
+            failures.append(f"{name}: fast parser output differs from python-docx reference")
+        for op, m in out.items():
+            key = f"{name}/{op}"
+            results[key] = m
+            kb = f"{m['docx_bytes'] / 1024:.0f}" if "docx_bytes" in m else ""
+            print(f"{key:<32} {m['median_ms']:>10.1f} {m['min_ms']:>9.1f} {m['peak_rss_mb']:>8.0f} "
+                  f"{m['rss_growth_mb']:>6.0f} {kb:>9}")
+
+    doc = {
+        "meta": {"machine": _machine(), "python": platform.python_version(),
+                 "date": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+    }
+    if args.out:
+        Path(args.out).write_text(json.dumps(doc, indent=2) + "\n")
+
+    if args.save:
+        base_path = Path(args.baseline)
+        merged = json.loads(base_path.read_text())["results"] if base_path.exists() and args.k else {}
+        merged.update(results)
+        doc["results"] = dict(sorted(merged.items()))
+        base_path.write_text(json.dumps(doc, indent=2) + "\n")
+        print(f"\nbaseline written: {base_path}")
+    elif Path(args.baseline).exists():
+        base = json.loads(Path(args.baseline).read_text())
+        if base["meta"].get("machine") != doc["meta"]["machine"]:
+            print(f"\nnote: baseline was recorded on '{base['meta'].get('machine')}'")
+        failures += compare(results, base["results"], args.time_tol, args.rss_tol, args.size_tol)
+    else:
+        print(f"\nno baseline at {args.baseline}; run with --save to create one")
+
+    for f in failures:
+        print("REGRESSION" if "->" in f else "FAIL", f)
+    print("OK" if not failures else f"{len(failures)} problem(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Per-rerun cost of the Incident Report Generator page outside Streamlit.
+
+    python benchmarks/bench_rerun.py [-n 200] [--rev ed1c93c]
+
+Before the split the page did runpy.run_path("IR_gen.py") on every rerun:
+the whole file was recompiled and its top level re-executed. Now the page
+imports IR_gen/ir_engine once and only calls IR_gen.render().
+
+Measured here (render() itself needs a Streamlit script context, so it is
+not timed):
+  compile       compile() of the source, what runpy paid every rerun
+  run_path      runpy.run_path(ir_engine.py): compile + top-level exec
+  import        import of the already-loaded module, what a rerun pays now
+--rev also compiles IR_gen.py as of that git revision (the single-file
+version) for a direct before/after.
+"""
+import argparse
+import importlib
+import runpy
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def _median_ms(fn, n: int) -> float:
+    times = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def _report(label: str, ms: float) -> None:
+    print(f"{label:<40} median {ms:9.3f} ms")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-n", type=int, default=200)
+    ap.add_argument("--rev", help="git revision whose single-file IR_gen.py to compile for comparison")
+    args = ap.parse_args()
+
+    sources = {name: (ROOT / name).read_text(encoding="utf-8") for name in ("IR_gen.py", "ir_engine.py")}
+    if args.rev:
+        sources[f"IR_gen.py@{args.rev}"] = subprocess.run(
+            ["git", "show", f"{args.rev}:IR_gen.py"], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout
+
+    for name, src in sources.items():
+        lines = src.count("\n")
+        _report(f"compile {name} ({lines} lines)", _median_ms(lambda: compile(src, name, "exec"), args.n))
+
+    importlib.import_module("ir_engine")  # warm: dependencies loaded, as in a running server
+    _report("run_path ir_engine.py", _median_ms(lambda: runpy.run_path(str(ROOT / "ir_engine.py")), args.n))
+    _report("import ir_engine (cached)", _median_ms(lambda: importlib.import_module("ir_engine"), args.n))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Sequence/Actions table rendering: legacy iterrows + add_row + cell.text loop
+vs docx_tables.render_rows.
+
+    python benchmarks/bench_tables.py [--rows 100 1000 10000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import pandas as pd  # noqa: E402
+
+import docx_tables  # noqa: E402
+import template_cache  # noqa: E402
+
+TEMPLATE_PATH = str(ROOT / "Incident Report Template_blank (1).docx")
+SEQUENCE_COLUMNS = ["Date", "Time", "Category", "Message"]
+
+
+def _legacy_fill(table, df):
+    # what _fill_sequence_table did before render_rows
+    docx_tables.clear_rows(table, header_rows=0)
+    for _, r in df.iterrows():
+        cells = table.add_row().cells
+        cells[0].text = str(r.get("Date", ""))
+        cells[1].text = str(r.get("Time", ""))
+        cells[2].text = str(r.get("Category", ""))
+        cells[3].text = str(r.get("Message", ""))
+
+
+def _bulk_fill(table, df):
+    docx_tables.render_rows(table, df, SEQUENCE_COLUMNS, header_rows=0)
+
+
+def _events(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Date": [f"2026-01-{i % 28 + 1:02d}" for i in range(n)],
+        "Time": [f"{i % 24:02d}:{i % 60:02d}:00" for i in range(n)],
+        "Category": ["Scheduler" if i % 3 else "ACU" for i in range(n)],
+        "Message": [f"Pass {i}: antenna tracking state changed" for i in range(n)],
+    })
+
+
+def _check_blank_cells() -> None:
+    # st.data_editor leaves None/NaN in cells the user cleared; they must render empty
+    df = pd.DataFrame({
+        "Date": ["2026-01-01", None],
+        "Time": [float("nan"), "10:00"],
+        "Category": [pd.NA, "ACU"],
+        "Message": ["ok", None],
+    })
+    doc = template_cache.load_template(TEMPLATE_PATH)
+    table = doc.tables[2]
+    _bulk_fill(table, df)
+    got = [[c.text for c in r.cells] for r in table.rows[-2:]]
+    want = [["2026-01-01", "", "", "ok"], ["", "10:00", "ACU", ""]]
+    assert got == want, got
+
+
+def _time(fill, df) -> float:
+    doc = template_cache.load_template(TEMPLATE_PATH)
+    table = doc.tables[2]
+    t0 = time.perf_counter()
+    fill(table, df)
+    return (time.perf_counter() - t0) * 1000
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    args = ap.parse_args()
+
+    _check_blank_cells()
+
+    print(f"{'rows':>7} {'legacy ms':>11} {'bulk ms':>9} {'speedup':>8}")
+    for n in args.rows:
+        df = _events(n)
+        legacy = _time(_legacy_fill, df)
+        bulk = _time(_bulk_fill, df)
+        print(f"{n:>7} {legacy:>11.1f} {bulk:>9.1f} {legacy / bulk:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Per-report template cost: Document(TEMPLATE_PATH) vs template_cache.load_template.
+
+    python benchmarks/bench_template_cache.py [-n 50]
+
+Each iteration opens the template, edits one cell and saves to memory, which
+is the part of generate_docx that the cache changes.
+"""
+import argparse
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from docx import Document  # noqa: E402
+
+import template_cache  # noqa: E402
+
+TEMPLATE_PATH = str(ROOT / "Incident Report Template_blank (1).docx")
+
+
+def _one(open_doc) -> tuple[float, float]:
+    t0 = time.perf_counter()
+    doc = open_doc()
+    t1 = time.perf_counter()
+    doc.tables[0].rows[0].cells[1].text = "bench"
+    doc.save(io.BytesIO())
+    t2 = time.perf_counter()
+    return (t1 - t0) * 1000, (t2 - t0) * 1000
+
+
+def _run(label: str, open_doc, n: int) -> None:
+    opens, totals = zip(*(_one(open_doc) for _ in range(n)))
+    print(
+        f"{label:<14} open median {statistics.median(opens):7.1f} ms   "
+        f"open+save median {statistics.median(totals):7.1f} ms   (n={n})"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=30)
+    args = ap.parse_args()
+
+    _run("Document()", lambda: Document(TEMPLATE_PATH), args.n)
+    template_cache.load_template(TEMPLATE_PATH)  # warm
+    _run("load_template", lambda: template_cache.load_template(TEMPLATE_PATH), args.n)
+    print(template_cache.cache_info())
+
+
+if __name__ == "__main__":
+    main()
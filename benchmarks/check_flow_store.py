@@ -0,0 +1,123 @@
+"""
+Concurrency check for flow_store: many users signing in at once.
+
+    python benchmarks/check_flow_store.py [--users 2000] [--replicas 4]
+
+Each simulated user puts its flow on one replica and the callback pops it on
+another (for sqlite, replicas are separate processes sharing one file; for
+memory, threads sharing one process). Every flow must come back exactly once,
+and a second pop must miss. Also checks TTL expiry and LRU bounds.
+Exits non-zero on any failure.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import flow_store  # noqa: E402
+
+
+def _flow(i: int) -> dict:
+    return {"state": f"s{i}", "code_verifier": f"v{i}", "scope": ["User.Read"], "auth_uri": f"https://x/{i}"}
+
+
+def _replica(db_path: str, users: list[int], role: str) -> list[str]:
+    """One replica process: 'put' starts flows, 'pop' handles callbacks."""
+    store = flow_store.SqliteFlowStore(db_path)
+    errors = []
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        if role == "put":
+            list(pool.map(lambda i: store.put(f"s{i}", _flow(i)), users))
+        else:
+            for i, got in zip(users, pool.map(lambda i: store.pop(f"s{i}"), users)):
+                if got != _flow(i):
+                    errors.append(f"s{i}: got {got!r}")
+                if store.pop(f"s{i}") is not None:
+                    errors.append(f"s{i}: popped twice")
+    return errors
+
+
+def check_sqlite(users: int, replicas: int, db_path: str) -> list[str]:
+    ids = list(range(users))
+    random.shuffle(ids)
+    shards = [ids[r::replicas] for r in range(replicas)]
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=replicas) as pool:
+        # put on replica r, pop on replica r+1
+        for f in [pool.submit(_replica, db_path, shards[r], "put") for r in range(replicas)]:
+            f.result()
+        pops = [pool.submit(_replica, db_path, shards[(r + 1) % replicas], "pop") for r in range(replicas)]
+        errors = [e for f in pops for e in f.result()]
+    left = len(flow_store.SqliteFlowStore(db_path))
+    print(f"sqlite  users={users} replicas={replicas} {time.perf_counter() - t0:.2f}s left={left} errors={len(errors)}")
+    if left:
+        errors.append(f"{left} flows left behind")
+    return errors
+
+
+def check_memory(users: int) -> list[str]:
+    store = flow_store.MemoryFlowStore()
+    errors = []
+
+    def _user(i):
+        store.put(f"s{i}", _flow(i))
+        if store.pop(f"s{i}") != _flow(i):
+            errors.append(f"s{i}: lost")
+        if store.pop(f"s{i}") is not None:
+            errors.append(f"s{i}: popped twice")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        list(pool.map(_user, range(users)))
+    print(f"memory  users={users} {time.perf_counter() - t0:.2f}s left={len(store)} errors={len(errors)}")
+    return errors
+
+
+def check_eviction(make) -> list[str]:
+    errors = []
+    store = make(ttl=0.2, max_entries=10)
+    for i in range(25):
+        store.put(f"s{i}", _flow(i))
+    if len(store) != 10:
+        errors.append(f"{type(store).__name__}: {len(store)} entries, expected 10")
+    store.get("s15")  # touch: should survive the next inserts
+    for i in range(25, 34):
+        store.put(f"s{i}", _flow(i))
+    if store.get("s15") is None:
+        errors.append(f"{type(store).__name__}: recently used flow was evicted")
+    time.sleep(0.3)
+    if store.pop("s33") is not None:
+        errors.append(f"{type(store).__name__}: expired flow returned")
+    store.purge()
+    if len(store):
+        errors.append(f"{type(store).__name__}: purge left {len(store)} flows")
+    return errors
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=2000)
+    ap.add_argument("--replicas", type=int, default=4)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        errors = check_memory(args.users)
+        errors += check_sqlite(args.users, args.replicas, os.path.join(tmp, "flows.sqlite"))
+        errors += check_eviction(flow_store.MemoryFlowStore)
+        errors += check_eviction(lambda **kw: flow_store.SqliteFlowStore(os.path.join(tmp, "evict.sqlite"), **kw))
+
+    for e in errors[:20]:
+        print("FAIL", e)
+    print("OK" if not errors else f"{len(errors)} failure(s)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+"""
+End-to-end load test against benchmarks/mock_graph.py.
+
+    python benchmarks/load_test.py [--users 20] [--flows 5] [--update-ratio 0.5]
+                                   [--latency-ms 40] [--jitter-ms 20] [--throttle-rate 0.02]
+
+Starts the mock in-process (or uses --url), seeds the Incident Reports tree,
+then runs --users concurrent simulated operators, each doing --flows
+"Create New" / "Update Existing" flows through the real sp_folder_graph code
+(shared pooled client, retries, $batch, read cache). Prints p50/p95/p99 per
+Graph endpoint (including client retries) and per flow.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+import mock_graph  # noqa: E402
+
+TEMPLATE_PATH = ROOT / "Incident Report Template_blank (1).docx"
+ROOT_PATH = "Ground Station Operations/Installations, Maintenance and Repair/Incident Reports"
+SITE_URL = "https://mock.sharepoint.com/sites/smcod"
+CITIES = {"Davao City": "DVO", "Quezon City": "QZN"}
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: dict[str, list[float]] = {}
+        self.statuses: dict[str, dict[int, int]] = {}
+
+    def add(self, key: str, ms: float, status: int | None = None) -> None:
+        with self._lock:
+            self.samples.setdefault(key, []).append(ms)
+            if status is not None:
+                by = self.statuses.setdefault(key, {})
+                by[status] = by.get(status, 0) + 1
+
+
+def _pct(sorted_ms: list[float], p: float) -> float:
+    # nearest-rank percentile
+    k = max(0, min(len(sorted_ms) - 1, int(round(p / 100 * len(sorted_ms) + 0.5)) - 1))
+    return sorted_ms[k]
+
+
+def _table(title: str, rec: Recorder, keys: list[str]) -> None:
+    print(f"\n{title}")
+    print(f"{'':<28} {'n':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  status")
+    for key in keys:
+        ms = sorted(rec.samples[key])
+        status = " ".join(f"{s}:{n}" for s, n in sorted(rec.statuses.get(key, {}).items()))
+        print(f"{key:<28} {len(ms):>6} {_pct(ms, 50):>8.1f} {_pct(ms, 95):>8.1f} {_pct(ms, 99):>8.1f} {ms[-1]:>8.1f}  {status}")
+
+
+def _instrument(client, rec: Recorder) -> None:
+    """Time every Graph call made through the shared client, grouped by mock route."""
+    inner = client.request
+
+    def timed(method, url, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            r = inner(method, url, *args, **kwargs)
+        except Exception:
+            rec.add(f"{method} (error)", (time.perf_counter() - t0) * 1000)
+            raise
+        route = r.headers.get("X-Mock-Route", "unknown")
+        rec.add(f"{method} {route}", (time.perf_counter() - t0) * 1000, r.status_code)
+        return r
+
+    client.request = timed
+
+
+def _seed(mock: mock_graph.MockGraph, template: bytes, folders_per_city: int) -> list[str]:
+    d = mock.drive
+    seeded = []
+    year = time.strftime("%Y")
+    for city, code in CITIES.items():
+        for i in range(1, folders_per_city + 1):
+            inc = f"SMCOD-IR-GS-{code}-{year}-{i:04d}"
+            fid = d.ensure_path(f"{ROOT_PATH}/{year}/{city}/{inc}")
+            with d.lock:
+                d.put_file(fid, f"{inc}.docx", template, DOCX_MIME)
+            seeded.append(inc)
+    return seeded
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--flows", type=int, default=5, help="flows per user")
+    ap.add_argument("--update-ratio", type=float, default=0.5)
+    ap.add_argument("--latency-ms", type=float, default=40.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.02)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--max-concurrency", type=int, default=0)
+    ap.add_argument("--large-ratio", type=float, default=0.1,
+                    help="share of uploads padded past 4 MB (upload session path)")
+    ap.add_argument("--seed-folders", type=int, default=30, help="existing incident folders per city")
+    ap.add_argument("--url", default="", help="use a running mock (base URL incl. /v1.0) instead of starting one")
+    args = ap.parse_args()
+
+    server = mock = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        server, mock = mock_graph.start_in_thread(
+            latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, throttle_rate=args.throttle_rate,
+            retry_after=args.retry_after, max_concurrency=args.max_concurrency,
+        )
+        base = f"{mock.base_url}{mock_graph.API_PREFIX}"
+
+    # must be set before the app modules read it
+    os.environ["GRAPH_BASE_URL"] = base
+    import graph_http  # noqa: E402
+    import ir_engine  # noqa: E402
+    import ir_parse  # noqa: E402
+    import sp_folder_graph as spg  # noqa: E402
+
+    template = TEMPLATE_PATH.read_bytes()
+    if mock is not None:
+        _seed(mock, template, args.seed_folders)
+
+    calls, flows = Recorder(), Recorder()
+    _instrument(graph_http.get_client(), calls)
+    token = "mock-token"
+    year = time.strftime("%Y")
+
+    def payload() -> bytes:
+        if random.random() < args.large_ratio:
+            return template + os.urandom(5 * 1024 * 1024)
+        return template
+
+    def create_new() -> None:
+        site = spg.resolve_site_id(token, SITE_URL)
+        drive = spg.get_default_drive_id(token, site)
+        city = random.choice(list(CITIES))
+        folder, inc = ir_engine.reserve_incident(token, drive, ROOT_PATH, year, city)
+        spg.upload_file_to_folder(token, drive, folder["id"], f"{inc}.docx", payload(), DOCX_MIME)
+
+    def update_existing() -> None:
+        site = spg.resolve_site_id(token, SITE_URL)
+        drive = spg.get_default_drive_id(token, site)
+        city = random.choice(list(CITIES))
+        folders = spg.list_incident_folders(token, drive, f"{ROOT_PATH}/{year}/{city}")
+        folder = random.choice(folders)
+        docx = [f for f in spg.list_files(token, drive, folder["id"]) if f["name"].endswith(".docx")]
+        if not docx:
+            return
+        data = spg.download_file_bytes(token, drive, docx[0]["id"])
+        ir_parse.parse_ir_docx(data)
+        spg.upload_file_to_folder(token, drive, folder["id"], docx[0]["name"], payload(), DOCX_MIME)
+
+    def user(_):
+        for _ in range(args.flows):
+            kind, fn = ("update_existing", update_existing) if random.random() < args.update_ratio \
+                else ("create_new", create_new)
+            t0 = time.perf_counter()
+            try:
+                fn()
+                flows.add(kind, (time.perf_counter() - t0) * 1000, 200)
+            except Exception as e:
+                flows.add(kind, (time.perf_counter() - t0) * 1000, 500)
+                print(f"{kind} failed: {e}")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.users) as pool:
+        list(pool.map(user, range(args.users)))
+    wall = time.perf_counter() - t0
+
+    total_flows = sum(len(v) for v in flows.samples.values())
+    print(f"{args.users} users x {args.flows} flows = {total_flows} flows in {wall:.1f} s "
+          f"({total_flows / wall:.1f} flows/s); latency {args.latency_ms}±{args.jitter_ms} ms, "
+          f"throttle {args.throttle_rate:.0%}")
+    _table("Graph calls (client-side, incl. retries)", calls, sorted(calls.samples))
+    _table("Flows", flows, sorted(flows.samples))
+    print("\nclient:", spg.http_stats())
+    print("cache: ", spg.cache_stats())
+    if mock is not None:
+        print("mock:  ", dict(sorted(mock.counters.items())))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+"""
+Local stand-in for the slice of Microsoft Graph this app uses, for load tests.
+
+    python benchmarks/mock_graph.py [--port 8765] [--latency-ms 40] [--throttle-rate 0.02]
+
+then run the app (or benchmarks/load_test.py) with
+GRAPH_BASE_URL=http://127.0.0.1:8765/v1.0.
+
+Implements: sites by path, site drive, items by path / id, children (paged,
+$select, $top), folder create with conflictBehavior, item DELETE and content PUT/GET (with
+If-Match), quickXorHash plus a pre-authenticated downloadUrl (Range-aware),
+upload sessions, root delta and $batch (dependsOn, 424). Every
+response carries X-Mock-Route so clients can group latencies per endpoint.
+
+Latency is latency_ms +/- jitter_ms per request. Throttling returns 429 with
+Retry-After for a random throttle_rate share of requests, and whenever more
+than max_concurrency requests are in flight.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from quickxor import quickxor_b64  # noqa: E402
+
+API_PREFIX = "/v1.0"
+SITE_ID = "mock.sharepoint.com,00000000-0000-0000-0000-000000000001,00000000-0000-0000-0000-000000000002"
+DRIVE_ID = "b!mockdrive"
+PAGE_SIZE = 200
+
+
+class MockResponse:
+    def __init__(self, status: int, body=None, headers: dict | None = None, route: str = ""):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.route = route
+
+
+def _error(status: int, code: str, message: str, route: str = "", headers: dict | None = None) -> MockResponse:
+    return MockResponse(status, {"error": {"code": code, "message": message}}, headers, route)
+
+
+class MockDrive:
+    """In-memory drive: items by id, children by (parent id, lower-cased name)."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.items: dict[str, dict] = {}
+        self.children: dict[str, dict[str, str]] = {}
+        self.content: dict[str, bytes] = {}
+        # deleted item id -> (delta seq, parent id), reported by delta as tombstones
+        self.deleted: dict[str, tuple[int, str]] = {}
+        self._seq = itertools.count(1)
+        self.root_id = self._new_item(None, "root", folder=True)
+
+    def _new_item(self, parent_id: str | None, name: str, folder: bool, mime: str = "") -> str:
+        item_id = "itm-" + uuid.uuid4().hex[:16]
+        self.items[item_id] = {
+            "id": item_id, "name": name, "parent": parent_id, "folder": folder,
+            "mime": mime, "version": 1, "seq": next(self._seq), "size": 0,
+        }
+        if folder:
+            self.children[item_id] = {}
+        if parent_id is not None:
+            self.children[parent_id][name.lower()] = item_id
+        return item_id
+
+    def _touch(self, item_id: str) -> None:
+        it = self.items[item_id]
+        it["version"] += 1
+        it["seq"] = next(self._seq)
+
+    def etag(self, item_id: str) -> str:
+        it = self.items[item_id]
+        return f'"{{{item_id}}},{it["version"]}"'
+
+    def to_json(self, item_id: str, select: list[str] | None = None) -> dict:
+        it = self.items[item_id]
+        out = {
+            "id": item_id,
+            "name": it["name"],
+            "eTag": self.etag(item_id),
+            "cTag": self.etag(item_id),
+            "size": it["size"],
+            "parentReference": {"driveId": DRIVE_ID, "id": it["parent"]} if it["parent"] else {"driveId": DRIVE_ID},
+        }
+        if it["folder"]:
+            out["folder"] = {"childCount": len(self.children[item_id])}
+        else:
+            out["file"] = {"mimeType": it["mime"] or "application/octet-stream"}
+            if item_id in self.content:
+                out["file"]["hashes"] = {"quickXorHash": it["qxh"]}
+        if item_id == self.root_id:
+            out["root"] = {}
+        if select:
+            out = {k: v for k, v in out.items() if k in select}
+        return out
+
+    def resolve(self, path: str, base_id: str | None = None) -> str | None:
+        cur = base_id or self.root_id
+        for part in [p for p in path.strip("/").split("/") if p]:
+            kids = self.children.get(cur)
+            if kids is None:
+                return None
+            cur = kids.get(part.lower())
+            if cur is None:
+                return None
+        return cur
+
+    def create_folder(self, parent_id: str, name: str, conflict: str = "fail") -> tuple[int, str | None]:
+        existing = self.children[parent_id].get(name.lower())
+        if existing:
+            if conflict == "fail":
+                return 409, None
+            if conflict == "rename":
+                n = 1
+                while f"{name} {n}".lower() in self.children[parent_id]:
+                    n += 1
+                name = f"{name} {n}"
+            else:
+                return 200, existing
+        item_id = self._new_item(parent_id, name, folder=True)
+        self._touch(parent_id)
+        return 201, item_id
+
+    def put_file(self, parent_id: str, name: str, data: bytes, mime: str = "") -> tuple[int, str]:
+        existing = self.children[parent_id].get(name.lower())
+        if existing:
+            item_id, status = existing, 200
+            self._touch(item_id)
+        else:
+            item_id, status = self._new_item(parent_id, name, folder=False, mime=mime), 201
+            self._touch(parent_id)
+        self.content[item_id] = data
+        self.items[item_id]["size"] = len(data)
+        self.items[item_id]["qxh"] = quickxor_b64(data)
+        if mime:
+            self.items[item_id]["mime"] = mime
+        return status, item_id
+
+    def delete(self, item_id: str) -> None:
+        it = self.items[item_id]
+        for child in list(self.children.get(item_id, {}).values()):
+            self.delete(child)
+        del self.children[it["parent"]][it["name"].lower()]
+        self.children.pop(item_id, None)
+        self.content.pop(item_id, None)
+        del self.items[item_id]
+        self.deleted[item_id] = (next(self._seq), it["parent"])
+        self._touch(it["parent"])
+
+    # seeding helpers for scripts
+    def ensure_path(self, path: str) -> str:
+        with self.lock:
+            cur = self.root_id
+            for part in [p for p in path.strip("/").split("/") if p]:
+                _, cur = self.create_folder(cur, part, conflict="replace")
+            return cur
+
+
+class MockGraph:
+    def __init__(self, base_url: str = "", latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 1, max_concurrency: int = 0,
+                 page_size: int = PAGE_SIZE, seed: int | None = None):
+        self.base_url = base_url
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.max_concurrency = max_concurrency
+        self.page_size = page_size
+        self.drive = MockDrive()
+        self.uploads: dict[str, dict] = {}
+        self._rng = random.Random(seed)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self.counters: dict[str, int] = {}
+
+    # ---------------------------
+    # shaping
+    # ---------------------------
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def _delay(self) -> None:
+        if self.latency_ms or self.jitter_ms:
+            ms = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            time.sleep(max(0.0, ms) / 1000)
+
+    def _throttled(self) -> bool:
+        return self.throttle_rate > 0 and self._rng.random() < self.throttle_rate
+
+    def _throttle_response(self, route: str) -> MockResponse:
+        self._count("throttled")
+        return _error(429, "TooManyRequests", "Mock throttling", route, {"Retry-After": str(self.retry_after)})
+
+    def serve(self, method: str, url: str, headers: dict, body: bytes) -> MockResponse:
+        """Entry point for HTTP requests: latency, concurrency limit, then routing."""
+        with self._lock:
+            self._inflight += 1
+            over = self.max_concurrency and self._inflight > self.max_concurrency
+        try:
+            self._delay()
+            if over or self._throttled():
+                return self._throttle_response(self._route_name(method, url))
+            return self.handle(method, url, headers, body)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    # ---------------------------
+    # routing
+    # ---------------------------
+    _ROUTES = [
+        ("GET", re.compile(r"^/sites/([^/]+)/drive$"), "site_drive"),
+        ("GET", re.compile(r"^/sites/([^/:]+):(/.*)$"), "site_by_path"),
+        ("GET", re.compile(r"^/drives/([^/]+)/root/delta$"), "delta"),
+        ("POST", re.compile(r"^/drives/([^/]+)/root:/(.+):/children$"), "create_by_path"),
+        ("GET", re.compile(r"^/drives/([^/]+)/root:/(.+)$"), "item_by_path"),
+        ("GET", re.compile(r"^/drives/([^/]+)/items/([^/:]+)/children$"), "children"),
+        ("POST", re.compile(r"^/drives/([^/]+)/items/([^/:]+)/children$"), "create_folder"),
+        ("PUT", re.compile(r"^/drives/([^/]+)/items/([^/:]+):/(.+):/content$"), "put_content"),
+        ("POST", re.compile(r"^/drives/([^/]+)/items/([^/:]+):/(.+):/createUploadSession$"), "create_upload_session"),
+        ("GET", re.compile(r"^/drives/([^/]+)/items/([^/:]+):/(.+)$"), "item_by_relpath"),
+        ("GET", re.compile(r"^/drives/([^/]+)/items/([^/:]+)/content$"), "get_content"),
+        ("PUT", re.compile(r"^/drives/([^/]+)/items/([^/:]+)/content$"), "put_item_content"),
+        ("GET", re.compile(r"^/drives/([^/]+)/items/([^/:]+)$"), "item"),
+        ("DELETE", re.compile(r"^/drives/([^/]+)/items/([^/:]+)$"), "delete_item"),
+        ("POST", re.compile(r"^/\$batch$"), "batch"),
+    ]
+    _UPLOAD_RE = re.compile(r"^/upload/([0-9a-f]+)$")
+    _DOWNLOAD_RE = re.compile(r"^/download/([^/]+)$")
+
+    def _split(self, url: str) -> tuple[str, dict]:
+        parts = urlsplit(url)
+        path = parts.path
+        if path.startswith(API_PREFIX):
+            path = path[len(API_PREFIX):]
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return path, query
+
+    def _match(self, method: str, path: str):
+        m = self._UPLOAD_RE.match(path)
+        if m:
+            return f"upload_{method.lower()}", m.groups()
+        m = self._DOWNLOAD_RE.match(path)
+        if m and method == "GET":
+            return "download", m.groups()
+        for meth, rx, name in self._ROUTES:
+            if meth == method:
+                m = rx.match(path)
+                if m:
+                    return name, m.groups()
+        return None, ()
+
+    def _route_name(self, method: str, url: str) -> str:
+        path, _ = self._split(url)
+        return self._match(method, path)[0] or "unknown"
+
+    def handle(self, method: str, url: str, headers: dict, body: bytes) -> MockResponse:
+        path, query = self._split(url)
+        name, groups = self._match(method, path)
+        self._count(name or "unknown")
+        if name is None:
+            return _error(400, "invalidRequest", f"Mock has no route for {method} {path}", "unknown")
+        res = getattr(self, f"_r_{name}")(groups, query, headers, body)
+        res.route = name
+        return res
+
+    def _json_body(self, body) -> dict:
+        if isinstance(body, (bytes, bytearray)):
+            return json.loads(body or b"{}")
+        return body or {}
+
+    def _select(self, query: dict) -> list[str] | None:
+        sel = query.get("$select")
+        return sel.split(",") if sel else None
+
+    # ---------------------------
+    # handlers
+    # ---------------------------
+    def _r_site_by_path(self, groups, query, headers, body):
+        return MockResponse(200, {"id": SITE_ID, "webUrl": f"https://{groups[0]}{unquote(groups[1])}"})
+
+    def _r_site_drive(self, groups, query, headers, body):
+        return MockResponse(200, {"id": DRIVE_ID, "driveType": "documentLibrary"})
+
+    def _r_item_by_path(self, groups, query, headers, body):
+        d = self.drive
+        with d.lock:
+            item_id = d.resolve(unquote(groups[1]))
+            if not item_id:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            return MockResponse(200, d.to_json(item_id, self._select(query)))
+
+    def _r_item(self, groups, query, headers, body):
+        d = self.drive
+        with d.lock:
+            if groups[1] not in d.items:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            out = d.to_json(groups[1], self._select(query))
+            select = self._select(query)
+            if groups[1] in d.content and (select is None or "@microsoft.graph.downloadUrl" in select):
+                out["@microsoft.graph.downloadUrl"] = f"{self.base_url}/download/{groups[1]}"
+            return MockResponse(200, out)
+
+    def _r_item_by_relpath(self, groups, query, headers, body):
+        d = self.drive
+        with d.lock:
+            if groups[1] not in d.items:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            item_id = d.resolve(unquote(groups[2]), base_id=groups[1])
+            if not item_id:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            return MockResponse(200, d.to_json(item_id, self._select(query)))
+
+    def _r_children(self, groups, query, headers, body):
+        d = self.drive
+        folder_id = groups[1]
+        top = int(query.get("$top") or self.page_size)
+        skip = int(query.get("$skiptoken") or 0)
+        with d.lock:
+            if folder_id not in d.children:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            ids = sorted(d.children[folder_id].values(), key=lambda i: d.items[i]["name"].lower())
+            page = [d.to_json(i, self._select(query)) for i in ids[skip:skip + top]]
+        out = {"value": page}
+        if skip + top < len(ids):
+            q = {"$skiptoken": str(skip + top), "$top": str(top)}
+            if query.get("$select"):
+                q["$select"] = query["$select"]
+            qs = "&".join(f"{k}={quote(v, safe=',')}" for k, v in q.items())
+            out["@odata.nextLink"] = f"{self.base_url}{API_PREFIX}/drives/{groups[0]}/items/{folder_id}/children?{qs}"
+        return MockResponse(200, out)
+
+    def _create(self, parent_id: str | None, payload: dict):
+        d = self.drive
+        if not parent_id or parent_id not in d.children:
+            return _error(404, "itemNotFound", "Parent folder not found.")
+        name = payload.get("name", "")
+        if "folder" not in payload or not name:
+            return _error(400, "invalidRequest", "Mock only creates folders.")
+        conflict = payload.get("@microsoft.graph.conflictBehavior", "fail")
+        with d.lock:
+            status, item_id = d.create_folder(parent_id, name, conflict)
+            if status == 409:
+                return _error(409, "nameAlreadyExists", "The specified item name already exists.")
+            return MockResponse(status, d.to_json(item_id))
+
+    def _r_create_folder(self, groups, query, headers, body):
+        return self._create(groups[1], self._json_body(body))
+
+    def _r_create_by_path(self, groups, query, headers, body):
+        with self.drive.lock:
+            parent_id = self.drive.resolve(unquote(groups[1]))
+        return self._create(parent_id, self._json_body(body))
+
+    def _check_if_match(self, parent_id: str, name: str, headers: dict):
+        want = headers.get("If-Match") or headers.get("if-match")
+        if not want:
+            return None
+        existing = self.drive.children[parent_id].get(name.lower())
+        if want != "*" and (not existing or self.drive.etag(existing) != want):
+            return _error(412, "preconditionFailed", "ETag does not match current item's value.")
+        return None
+
+    def _r_put_content(self, groups, query, headers, body):
+        d = self.drive
+        name = unquote(groups[2])
+        with d.lock:
+            if groups[1] not in d.children:
+                return _error(404, "itemNotFound", "Parent folder not found.")
+            failed = self._check_if_match(groups[1], name, headers)
+            if failed:
+                return failed
+            if query.get("@microsoft.graph.conflictBehavior") == "fail" and name.lower() in d.children[groups[1]]:
+                return _error(409, "nameAlreadyExists", "The specified item name already exists.")
+            status, item_id = d.put_file(groups[1], name, body or b"", headers.get("Content-Type", ""))
+            return MockResponse(status, d.to_json(item_id))
+
+    def _r_put_item_content(self, groups, query, headers, body):
+        d = self.drive
+        with d.lock:
+            it = d.items.get(groups[1])
+            if it is None or it["folder"]:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            failed = self._check_if_match(it["parent"], it["name"], headers)
+            if failed:
+                return failed
+            status, item_id = d.put_file(it["parent"], it["name"], body or b"", headers.get("Content-Type", ""))
+            return MockResponse(status, d.to_json(item_id))
+
+    def _r_delete_item(self, groups, query, headers, body):
+        d = self.drive
+        want = headers.get("If-Match") or headers.get("if-match")
+        with d.lock:
+            if groups[1] not in d.items or groups[1] == d.root_id:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            if want and want != "*" and d.etag(groups[1]) != want:
+                return _error(412, "preconditionFailed", "ETag does not match current item's value.")
+            d.delete(groups[1])
+            return MockResponse(204)
+
+    def _r_get_content(self, groups, query, headers, body):
+        d = self.drive
+        with d.lock:
+            data = d.content.get(groups[1])
+            if data is None:
+                return _error(404, "itemNotFound", "The resource could not be found.")
+            return MockResponse(200, data, {"Content-Type": "application/octet-stream", "ETag": d.etag(groups[1])})
+
+    def _r_download(self, groups, query, headers, body):
+        if headers.get("Authorization") or headers.get("authorization"):
+            return _error(401, "unauthenticated", "Do not send Authorization to a pre-authenticated downloadUrl.")
+        d = self.drive
+        with d.lock:
+            data = d.content.get(groups[0])
+        if data is None:
+            return _error(404, "itemNotFound", "The resource could not be found.")
+        m = re.match(r"bytes=(\d+)-$", headers.get("Range") or headers.get("range") or "")
+        if m:
+            start = int(m.group(1))
+            if start >= len(data):
+                return _error(416, "invalidRange", "Requested range not satisfiable.")
+            return MockResponse(206, data[start:], {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"})
+        return MockResponse(200, data, {"Content-Type": "application/octet-stream"})
+
+    def _r_create_upload_session(self, groups, query, headers, body):
+        payload = self._json_body(body).get("item", {})
+        sid = uuid.uuid4().hex
+        with self._lock:
+            self.uploads[sid] = {
+                "parent": groups[1], "name": unquote(groups[2]), "data": bytearray(), "total": None,
+                "conflict": payload.get("@microsoft.graph.conflictBehavior", "replace"),
+                "if_match": headers.get("If-Match") or headers.get("if-match"),
+                "expires": time.time() + 3600,
+            }
+        return MockResponse(200, {
+            "uploadUrl": f"{self.base_url}/upload/{sid}",
+            "expirationDateTime": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 3600)),
+            "nextExpectedRanges": ["0-"],
+        })
+
+    def _upload_status(self, up: dict) -> dict:
+        return {"nextExpectedRanges": [f"{len(up['data'])}-"]}
+
+    def _r_upload_get(self, groups, query, headers, body):
+        up = self.uploads.get(groups[0])
+        if not up:
+            return _error(404, "itemNotFound", "Upload session not found.")
+        return MockResponse(200, self._upload_status(up))
+
+    def _r_upload_put(self, groups, query, headers, body):
+        if headers.get("Authorization") or headers.get("authorization"):
+            return _error(401, "unauthenticated", "Do not send Authorization to a pre-authenticated uploadUrl.")
+        up = self.uploads.get(groups[0])
+        if not up:
+            return _error(404, "itemNotFound", "Upload session not found.")
+        m = re.match(r"bytes (\d+)-(\d+)/(\d+)", headers.get("Content-Range") or headers.get("content-range") or "")
+        if not m:
+            return _error(400, "invalidRange", "Missing or bad Content-Range.")
+        start, end, total = (int(x) for x in m.groups())
+        body = body or b""
+        if start != len(up["data"]) or end - start + 1 != len(body):
+            return _error(416, "invalidRange", "Fragment does not start at the next expected byte.")
+        up["data"] += body
+        up["total"] = total
+        if len(up["data"]) < total:
+            return MockResponse(202, self._upload_status(up))
+
+        d = self.drive
+        with d.lock:
+            self.uploads.pop(groups[0], None)
+            failed = self._check_if_match(up["parent"], up["name"], {"If-Match": up["if_match"]}) if up["if_match"] else None
+            if failed:
+                return failed
+            if up["conflict"] == "fail" and up["name"].lower() in d.children[up["parent"]]:
+                return _error(409, "nameAlreadyExists", "The specified item name already exists.")
+            status, item_id = d.put_file(up["parent"], up["name"], bytes(up["data"]))
+            return MockResponse(status, d.to_json(item_id))
+
+    def _r_upload_delete(self, groups, query, headers, body):
+        self.uploads.pop(groups[0], None)
+        return MockResponse(204)
+
+    def _r_delta(self, groups, query, headers, body):
+        d = self.drive
+        since = int(query.get("token") or 0)
+        skip = int(query.get("$skiptoken") or 0)
+        with d.lock:
+            changed = sorted(
+                [(it["seq"], i) for i, it in d.items.items() if it["seq"] > since]
+                + [(seq, i) for i, (seq, _) in d.deleted.items() if seq > since]
+            )
+            latest = max([it["seq"] for it in d.items.values()] + [seq for seq, _ in d.deleted.values()], default=0)
+            page = [
+                d.to_json(i, self._select(query)) if i in d.items
+                else {"id": i, "deleted": {"state": "deleted"}, "parentReference": {"driveId": DRIVE_ID, "id": d.deleted[i][1]}}
+                for _, i in changed[skip:skip + self.page_size]
+            ]
+        base = f"{self.base_url}{API_PREFIX}/drives/{groups[0]}/root/delta"
+        out = {"value": page}
+        if skip + self.page_size < len(changed):
+            out["@odata.nextLink"] = f"{base}?token={since}&$skiptoken={skip + self.page_size}"
+        else:
+            out["@odata.deltaLink"] = f"{base}?token={latest}"
+        return MockResponse(200, out)
+
+    def _r_batch(self, groups, query, headers, body):
+        reqs = self._json_body(body).get("requests", [])
+        if len(reqs) > 20:
+            return _error(400, "BadRequest", "A maximum of 20 requests is allowed per batch.")
+        status_by_id: dict[str, int] = {}
+        responses = []
+        # dependsOn chains run in order; everything else could run in any order, so keep list order
+        for req in reqs:
+            rid = req["id"]
+            deps = req.get("dependsOn") or []
+            if any(status_by_id.get(dep, 0) >= 400 or dep not in status_by_id for dep in deps):
+                status_by_id[rid] = 424
+                responses.append({"id": rid, "status": 424, "body": {"error": {"code": "FailedDependency"}}})
+                continue
+            if self._throttled():
+                self._count("throttled")
+                res = _error(429, "TooManyRequests", "Mock throttling", headers={"Retry-After": str(self.retry_after)})
+            else:
+                sub_headers = dict(req.get("headers") or {})
+                res = self.handle(req["method"], req["url"], sub_headers, req.get("body"))
+            status_by_id[rid] = res.status
+            responses.append({"id": rid, "status": res.status, "headers": res.headers, "body": res.body})
+        return MockResponse(200, {"responses": responses})
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mock: MockGraph = None  # set by make_server
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _dispatch(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path = self.path
+        if path == "/_mock/stats":
+            res = MockResponse(200, dict(self.mock.counters), route="stats")
+        else:
+            res = self.mock.serve(method, path, dict(self.headers), body)
+
+        if isinstance(res.body, (bytes, bytearray)):
+            payload = bytes(res.body)
+        elif res.body is None:
+            payload = b""
+        else:
+            payload = json.dumps(res.body).encode()
+            res.headers.setdefault("Content-Type", "application/json")
+
+        self.send_response(res.status)
+        for k, v in res.headers.items():
+            self.send_header(k, v)
+        self.send_header("X-Mock-Route", res.route or "unknown")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+def make_server(host: str = "127.0.0.1", port: int = 0, **options) -> tuple[ThreadingHTTPServer, MockGraph]:
+    """Bind a server (port 0 = any free port). options go to MockGraph."""
+    mock = MockGraph(**options)
+    handler = type("MockGraphHandler", (_Handler,), {"mock": mock})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    mock.base_url = f"http://{host}:{server.server_address[1]}"
+    return server, mock
+
+
+def start_in_thread(**options) -> tuple[ThreadingHTTPServer, MockGraph]:
+    server, mock = make_server(**options)
+    threading.Thread(target=server.serve_forever, name="mock-graph", daemon=True).start()
+    return server, mock
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--throttle-rate", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--max-concurrency", type=int, default=0)
+    ap.add_argument("--seed-path", action="append", default=[], help="folder path to create up front (repeatable)")
+    args = ap.parse_args()
+
+    server, mock = make_server(
+        args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate, retry_after=args.retry_after, max_concurrency=args.max_concurrency,
+    )
+    for p in args.seed_path:
+        mock.drive.ensure_path(p)
+    print(f"Mock Graph on {mock.base_url}{API_PREFIX}  (GRAPH_BASE_URL={mock.base_url}{API_PREFIX})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import copy
+
+from docx.oxml.ns import qn
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W14_NS = "http://schemas.microsoft.com/office/word/2010/wordml"
+_ID_ATTRS = {f"{{{_W14_NS}}}paraId", f"{{{_W14_NS}}}textId"}
+_RSID_PREFIX = f"{{{_W_NS}}}rsid"
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+
+def clear_rows(table, header_rows: int = 1) -> None:
+    """Drop every row after the first header_rows (single pass over w:tr)."""
+    tbl = table._tbl
+    for tr in tbl.tr_lst[header_rows:]:
+        tbl.remove(tr)
+
+
+def _strip_ids(el) -> None:
+    # paraId/textId must be unique per document and rsids are revision noise;
+    # neither should be copied into thousands of cloned rows.
+    for node in el.iter():
+        if not isinstance(node.tag, str):
+            continue
+        for attr in list(node.attrib):
+            if attr in _ID_ATTRS or attr.startswith(_RSID_PREFIX):
+                del node.attrib[attr]
+
+
+def row_prototype(table, header_rows: int = 1):
+    """
+    Blank w:tr modelled on the table's last data row: keeps row, cell,
+    paragraph and first-run formatting, with one empty w:t per cell.
+    Falls back to a plain python-docx row when the table has no data row.
+    """
+    if len(table._tbl.tr_lst) > header_rows:
+        proto = copy.deepcopy(table._tbl.tr_lst[-1])
+    else:
+        tr = table.add_row()._tr
+        proto = copy.deepcopy(tr)
+        table._tbl.remove(tr)
+
+    for tc in proto.iterchildren(qn("w:tc")):
+        p_src = tc.find(qn("w:p"))
+        r_src = p_src.find(qn("w:r")) if p_src is not None else None
+        p_pr = p_src.find(qn("w:pPr")) if p_src is not None else None
+        r_pr = r_src.find(qn("w:rPr")) if r_src is not None else None
+
+        for child in list(tc):
+            if child.tag != qn("w:tcPr"):
+                tc.remove(child)
+
+        p = tc.makeelement(qn("w:p"), {})
+        if p_pr is not None:
+            p.append(copy.deepcopy(p_pr))
+        r = p.makeelement(qn("w:r"), {})
+        if r_pr is not None:
+            r.append(copy.deepcopy(r_pr))
+        r.append(r.makeelement(qn("w:t"), {}))
+        p.append(r)
+        tc.append(p)
+
+    _strip_ids(proto)
+    return proto
+
+
+def _set_text(t, text: str) -> None:
+    if "\t" in text or "\n" in text or "\r" in text:
+        # let python-docx turn tabs/newlines into w:tab / w:br, like cell.text does
+        r = t.getparent()
+        r.remove(t)
+        r.text = text
+        return
+    t.text = text
+    if text != text.strip():
+        t.set(_XML_SPACE, "preserve")
+
+
+def render_rows(table, df, columns: list[str], header_rows: int = 1) -> None:
+    """
+    Replace the table's data rows with one row per DataFrame row.
+
+    Values are converted column-wise (str(); missing columns and blank
+    None/NaN cells from st.data_editor -> ""), and each
+    row is a deepcopy of a prototype row, so the template's cell formatting is
+    kept and no per-cell python-docx proxies are built.
+    """
+    proto = row_prototype(table, header_rows)
+    clear_rows(table, header_rows)
+    if df is None or len(df) == 0:
+        return
+
+    values = df.reindex(columns=columns, fill_value="")
+    # astype(str) would keep NaN/None as NaN under pandas 3 (and spell them "nan"/"None" before)
+    values = values.astype(object).where(values.notna(), "")
+    cols = [[str(v) for v in values[c].tolist()] for c in columns]
+
+    tbl = table._tbl
+    t_tag = qn("w:t")
+    for row_vals in zip(*cols):
+        tr = copy.deepcopy(proto)
+        for t, v in zip(list(tr.iter(t_tag)), row_vals):
+            _set_text(t, v)
+        tbl.append(tr)
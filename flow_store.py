@@ -0,0 +1,215 @@
+"""
+Storage for in-progress MSAL auth code flows, keyed by OAuth state.
+
+The Sign In redirect and the callback can land on different Streamlit
+replicas, so the flow must be readable by whichever process handles the
+callback. MemoryFlowStore is per process; SqliteFlowStore is shared by every
+replica that can see the same file (one host / shared volume).
+
+Both expire flows after ttl seconds and keep at most max_entries, evicting the
+least recently used first. Flows are single-use: pop() removes them.
+"""
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_ENTRIES = 5000
+
+
+class FlowStore(abc.ABC):
+    """Interface shared by the flow store backends."""
+
+    ttl: float
+    max_entries: int
+
+    @abc.abstractmethod
+    def put(self, state: str, flow: dict) -> None: ...
+
+    @abc.abstractmethod
+    def get(self, state: str) -> dict | None: ...
+
+    @abc.abstractmethod
+    def pop(self, state: str) -> dict | None: ...
+
+    @abc.abstractmethod
+    def purge(self) -> int:
+        """Drop expired flows; returns how many were removed."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int: ...
+
+
+class MemoryFlowStore(FlowStore):
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge_locked(self, now: float) -> int:
+        # entries are ordered by last touch, so stop at the first one still within ttl
+        removed = 0
+        while self._data:
+            state, (touched, _) = next(iter(self._data.items()))
+            if now - touched <= self.ttl:
+                break
+            del self._data[state]
+            removed += 1
+        return removed
+
+    def put(self, state: str, flow: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._data[state] = (now, flow)
+            self._data.move_to_end(state)
+            self._purge_locked(now)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get(self, state: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            self._purge_locked(now)
+            hit = self._data.get(state)
+            if hit is None:
+                return None
+            self._data[state] = (now, hit[1])
+            self._data.move_to_end(state)
+            return hit[1]
+
+    def pop(self, state: str) -> dict | None:
+        with self._lock:
+            self._purge_locked(time.time())
+            hit = self._data.pop(state, None)
+        return hit[1] if hit else None
+
+    def purge(self) -> int:
+        with self._lock:
+            return self._purge_locked(time.time())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class SqliteFlowStore(FlowStore):
+    """
+    Flows in a SQLite file (WAL). Each call opens a short-lived connection,
+    so instances are safe to share between threads and processes.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS flows (
+        state    TEXT PRIMARY KEY,
+        flow     TEXT NOT NULL,
+        touched  REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS flows_touched ON flows(touched);
+    """
+
+    def __init__(self, db_path: str, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(self.SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit; writes take the lock up front with BEGIN IMMEDIATE
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _write(self, fn):
+        con = self._connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(con)
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+            return out
+        finally:
+            con.close()
+
+    def put(self, state: str, flow: dict) -> None:
+        now = time.time()
+        blob = json.dumps(flow)
+
+        def _do(con):
+            con.execute("DELETE FROM flows WHERE touched < ?", (now - self.ttl,))
+            con.execute(
+                "INSERT INTO flows (state, flow, touched) VALUES (?, ?, ?) "
+                "ON CONFLICT(state) DO UPDATE SET flow = excluded.flow, touched = excluded.touched",
+                (state, blob, now),
+            )
+            con.execute(
+                "DELETE FROM flows WHERE state IN ("
+                " SELECT state FROM flows ORDER BY touched DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+        self._write(_do)
+
+    def get(self, state: str) -> dict | None:
+        now = time.time()
+
+        def _do(con):
+            row = con.execute(
+                "SELECT flow FROM flows WHERE state = ? AND touched >= ?", (state, now - self.ttl)
+            ).fetchone()
+            if row:
+                con.execute("UPDATE flows SET touched = ? WHERE state = ?", (now, state))
+            return row
+
+        row = self._write(_do)
+        return json.loads(row[0]) if row else None
+
+    def pop(self, state: str) -> dict | None:
+        now = time.time()
+
+        def _do(con):
+            row = con.execute(
+                "SELECT flow FROM flows WHERE state = ? AND touched >= ?", (state, now - self.ttl)
+            ).fetchone()
+            con.execute("DELETE FROM flows WHERE state = ?", (state,))
+            return row
+
+        row = self._write(_do)
+        return json.loads(row[0]) if row else None
+
+    def purge(self) -> int:
+        cutoff = time.time() - self.ttl
+        return self._write(lambda con: con.execute("DELETE FROM flows WHERE touched < ?", (cutoff,)).rowcount)
+
+    def __len__(self) -> int:
+        con = self._connect()
+        try:
+            return con.execute("SELECT COUNT(*) FROM flows").fetchone()[0]
+        finally:
+            con.close()
+
+
+def make_flow_store(backend: str = "memory", path: str = "", ttl: float = DEFAULT_TTL,
+                    max_entries: int = DEFAULT_MAX_ENTRIES) -> FlowStore:
+    """backend: "memory" or "sqlite" (path required)."""
+    backend = (backend or "memory").lower()
+    if backend == "memory":
+        return MemoryFlowStore(ttl=ttl, max_entries=max_entries)
+    if backend == "sqlite":
+        if not path:
+            raise ValueError("sqlite flow store needs a path")
+        return SqliteFlowStore(path, ttl=ttl, max_entries=max_entries)
+    raise ValueError(f"Unknown flow store backend: {backend}")
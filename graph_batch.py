@@ -0,0 +1,211 @@
+import json
+import time
+
+import graph_http
+
+GRAPH_BASE = graph_http.GRAPH_BASE
+BATCH_URL = f"{GRAPH_BASE}/$batch"
+
+# Graph rejects batches with more than 20 requests.
+MAX_BATCH_SIZE = 20
+RETRY_STATUSES = {429, 503}
+
+
+class BatchResponse:
+    def __init__(self, request_id: str, status: int, headers: dict | None, body):
+        self.id = request_id
+        self.status_code = status
+        self.headers = headers or {}
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self) -> None:
+        if not self.ok:
+            err = self.body.get("error", {}) if isinstance(self.body, dict) else {}
+            msg = err.get("message") or json.dumps(self.body)[:300]
+            raise RuntimeError(f"Batch request {self.id} failed ({self.status_code}): {msg}")
+
+    def __repr__(self):
+        return f"BatchResponse(id={self.id!r}, status={self.status_code})"
+
+
+class GraphBatch:
+    """
+    Collects Graph requests and sends them through the JSON $batch endpoint.
+
+        b = GraphBatch(token)
+        a = b.get(f"/drives/{drive_id}/root:/{path}")
+        c = b.post(f"/drives/{drive_id}/root:/{path}:/children", {...}, depends_on=[a])
+        res = b.execute()          # {id: BatchResponse}
+
+    Independent requests are packed up to 20 per round trip. Requests linked by
+    depends_on are kept in the same batch (Graph requires that) and Graph runs
+    them in order. Requests that come back 429/503 are re-sent, honouring
+    Retry-After, together with anything that failed only because it depended
+    on them (424).
+    """
+
+    def __init__(self, token: str, client: graph_http.GraphClient | None = None, max_retries: int = 3):
+        self.token = token
+        self.client = client or graph_http.get_client()
+        self.max_retries = max_retries
+        self._requests: dict[str, dict] = {}
+
+    def __len__(self):
+        return len(self._requests)
+
+    def add(
+        self,
+        method: str,
+        url: str,
+        body=None,
+        headers: dict | None = None,
+        depends_on: list[str] | None = None,
+        request_id: str | None = None,
+    ) -> str:
+        """Queue a request. url may be absolute or relative to /v1.0. Returns its id."""
+        if url.startswith(GRAPH_BASE):
+            url = url[len(GRAPH_BASE):]
+        if not url.startswith("/"):
+            url = "/" + url
+
+        request_id = request_id or str(len(self._requests) + 1)
+        if request_id in self._requests:
+            raise ValueError(f"Duplicate batch request id: {request_id}")
+        for dep in depends_on or []:
+            if dep not in self._requests:
+                raise ValueError(f"Batch request {request_id} depends on unknown id {dep}")
+
+        req = {"id": request_id, "method": method.upper(), "url": url}
+        hdrs = dict(headers or {})
+        if body is not None:
+            req["body"] = body
+            hdrs.setdefault("Content-Type", "application/json")
+        if hdrs:
+            req["headers"] = hdrs
+        if depends_on:
+            req["dependsOn"] = list(depends_on)
+        self._requests[request_id] = req
+        return request_id
+
+    def get(self, url: str, **kwargs) -> str:
+        return self.add("GET", url, **kwargs)
+
+    def post(self, url: str, body=None, **kwargs) -> str:
+        return self.add("POST", url, body=body, **kwargs)
+
+    def put(self, url: str, body=None, **kwargs) -> str:
+        return self.add("PUT", url, body=body, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> str:
+        return self.add("DELETE", url, **kwargs)
+
+    # ---------------------------
+    # execution
+    # ---------------------------
+    def _groups(self, ids: list[str]) -> list[list[str]]:
+        """Split ids into dependency-connected groups (kept in insertion order)."""
+        parent = {i: i for i in ids}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for i in ids:
+            for dep in self._requests[i].get("dependsOn", []):
+                if dep in parent:
+                    parent[find(i)] = find(dep)
+
+        groups: dict[str, list[str]] = {}
+        for i in ids:
+            groups.setdefault(find(i), []).append(i)
+        return list(groups.values())
+
+    def _chunks(self, ids: list[str]) -> list[list[str]]:
+        chunks: list[list[str]] = []
+        current: list[str] = []
+        for group in self._groups(ids):
+            if len(group) > MAX_BATCH_SIZE:
+                raise ValueError(f"A dependsOn chain has {len(group)} requests; Graph allows {MAX_BATCH_SIZE} per batch")
+            if len(current) + len(group) > MAX_BATCH_SIZE:
+                chunks.append(current)
+                current = []
+            current.extend(group)
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _send(self, ids: list[str]) -> list[dict]:
+        pending = set(ids)
+        payload = []
+        for i in ids:
+            req = dict(self._requests[i])
+            # drop dependencies that already completed in an earlier round
+            deps = [d for d in req.get("dependsOn", []) if d in pending]
+            if deps:
+                req["dependsOn"] = deps
+            else:
+                req.pop("dependsOn", None)
+            payload.append(req)
+
+        r = self.client.post(
+            BATCH_URL,
+            headers={"Authorization": f"Bearer {self.token}", "Content-Type": "application/json"},
+            json={"requests": payload},
+            timeout=120,
+        )
+        r.raise_for_status()
+        return r.json().get("responses", [])
+
+    def execute(self) -> dict[str, BatchResponse]:
+        results: dict[str, BatchResponse] = {}
+        pending = list(self._requests)
+        attempt = 0
+
+        while pending:
+            retry: list[str] = []
+            wait = 0.0
+            for chunk in self._chunks(pending):
+                for resp in self._send(chunk):
+                    res = BatchResponse(resp.get("id"), int(resp.get("status", 0)), resp.get("headers"), resp.get("body"))
+                    if res.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                        retry.append(res.id)
+                        ra = res.headers.get("Retry-After") or res.headers.get("retry-after")
+                        wait = max(wait, float(ra) if ra and str(ra).isdigit() else 2.0 ** attempt)
+                        continue
+                    results[res.id] = res
+
+            if not retry:
+                break
+
+            # re-send throttled requests plus dependents that only failed with 424
+            retry_set = set(retry)
+            for i in pending:
+                if results.get(i) is not None and results[i].status_code == 424:
+                    if any(d in retry_set for d in self._requests[i].get("dependsOn", [])):
+                        retry_set.add(i)
+                        results.pop(i)
+            pending = [i for i in pending if i in retry_set]
+            attempt += 1
+            time.sleep(wait)
+
+        return results
+
+
+def run_batch(token: str, requests_: list[dict]) -> dict[str, BatchResponse]:
+    """
+    Convenience wrapper: requests_ is a list of dicts with the same keys as
+    GraphBatch.add (method, url, body, headers, depends_on, request_id).
+    """
+    b = GraphBatch(token)
+    for req in requests_:
+        b.add(**req)
+    return b.execute()
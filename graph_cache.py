@@ -0,0 +1,162 @@
+"""
+Process-wide TTL cache for read-only Graph lookups.
+
+Shared by every Streamlit session in the process, so N operators opening the
+tool trigger one site/drive resolution and one listing per folder instead of
+N. Entries carry tags (e.g. a drive path or folder item id); writers call
+invalidate_tags() for what they touched. Concurrent misses on the same key
+are collapsed into a single load, and a load that an invalidation overtook
+is returned to its caller but not stored (it may predate the write).
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 60.0
+DEFAULT_MAX_ENTRIES = 4096
+
+
+class TTLCache:
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (expires_at, value, tags); ordered by last use for LRU eviction
+        self._data: OrderedDict = OrderedDict()
+        self._tags: dict = {}
+        self._inflight: dict = {}
+        # invalidation generations: a load only stores its result if neither its key
+        # nor any of its tags was invalidated after it started
+        self._gen = 0
+        self._key_gen: dict = {}
+        self._tag_gen: dict = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "loads": 0, "invalidations": 0, "evictions": 0}
+
+    def _drop_locked(self, key) -> None:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _lookup_locked(self, key, now: float):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < now:
+            self._drop_locked(key)
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry[1]
+
+    def get_or_load(self, key, loader, ttl: float | None = None, tags=()):
+        """Return the cached value for key, or call loader() once and cache its result."""
+        while True:
+            with self._lock:
+                found, value = self._lookup_locked(key, time.time())
+                if found:
+                    self._stats["hits"] += 1
+                    return value
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._stats["misses"] += 1
+                    waiter = self._inflight[key] = threading.Event()
+                    started = self._gen
+                    break
+            # another thread is loading this key; use its result (or retry if it failed)
+            waiter.wait()
+
+        try:
+            value = loader()
+            with self._lock:
+                self._stats["loads"] += 1
+                if not self._invalidated_since_locked(started, key, tags):
+                    self._store_locked(key, value, ttl, tags)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if not self._inflight:
+                    # no load left to compare against
+                    self._key_gen.clear()
+                    self._tag_gen.clear()
+            waiter.set()
+
+    def _invalidated_since_locked(self, started: int, key, tags) -> bool:
+        if self._key_gen.get(key, -1) > started:
+            return True
+        return any(self._tag_gen.get(tag, -1) > started for tag in tags)
+
+    def _bump_locked(self, keys=(), tags=()) -> None:
+        if not self._inflight:
+            return
+        self._gen += 1
+        for key in keys:
+            self._key_gen[key] = self._gen
+        for tag in tags:
+            self._tag_gen[tag] = self._gen
+
+    def _store_locked(self, key, value, ttl, tags) -> None:
+        self._drop_locked(key)
+        tags = frozenset(tags)
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.max_entries:
+            oldest = next(iter(self._data))
+            self._drop_locked(oldest)
+            self._stats["evictions"] += 1
+
+    def put(self, key, value, ttl: float | None = None, tags=()) -> None:
+        with self._lock:
+            self._store_locked(key, value, ttl, tags)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self._bump_locked(keys=(key,))
+            if key in self._data:
+                self._drop_locked(key)
+                self._stats["invalidations"] += 1
+
+    def invalidate_tags(self, *tags) -> int:
+        """Drop every entry carrying any of tags. Returns how many were dropped."""
+        n = 0
+        with self._lock:
+            self._bump_locked(tags=tags)
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop_locked(key)
+                    n += 1
+            self._stats["invalidations"] += n
+        return n
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bump_locked(keys=list(self._inflight))
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._data)
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else 0.0
+        return out
+
+
+_cache: TTLCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> TTLCache:
+    """Process-wide cache shared by every session."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTLCache()
+        return _cache
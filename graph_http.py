@@ -0,0 +1,198 @@
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+
+# GRAPH_BASE_URL points the app at another Graph endpoint (e.g. benchmarks/mock_graph.py)
+GRAPH_BASE = os.getenv("GRAPH_BASE_URL", "https://graph.microsoft.com/v1.0").rstrip("/")
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+
+def _retry_after_seconds(r: requests.Response) -> float | None:
+    """Parse Retry-After (delta-seconds or HTTP-date). None if absent/invalid."""
+    raw = r.headers.get("Retry-After")
+    if not raw:
+        return None
+    raw = raw.strip()
+    if raw.isdigit():
+        return float(raw)
+    try:
+        when = parsedate_to_datetime(raw)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+_ID_SEGMENT = re.compile(r"/(sites|drives|items|users|groups)/[^/:?]+")
+_PATH_SEGMENT = re.compile(r":/[^:?]*(:|$)")
+
+
+def endpoint_template(url: str) -> str:
+    """Graph URL with ids and drive paths replaced, e.g. GET /drives/{id}/items/{id}/children."""
+    if not url.startswith(GRAPH_BASE):
+        # pre-authenticated upload session URLs, download redirects, ...
+        return "{upload_session}" if "uploadSession" in url else "{external}"
+    path = url[len(GRAPH_BASE):].split("?", 1)[0]
+    path = _ID_SEGMENT.sub(lambda m: f"/{m.group(1)}/{{id}}", path)
+    return _PATH_SEGMENT.sub(lambda m: ":/{path}" + m.group(1), path)
+
+
+def _body_size(kwargs: dict) -> int:
+    data = kwargs.get("data")
+    if isinstance(data, (bytes, bytearray, str)):
+        return len(data)
+    if kwargs.get("json") is not None:
+        return len(requests.compat.json.dumps(kwargs["json"]))
+    return 0
+
+
+class GraphClient:
+    """
+    Shared HTTP client for Graph calls.
+
+    - one requests.Session => keep-alive connections are reused across calls
+    - pool_maxsize caps connections per host; pool_block makes extra threads wait
+      instead of opening throwaway connections
+    - 429/502/503/504 are retried, honouring Retry-After, otherwise exponential
+      backoff with full jitter
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 8,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=True,
+            max_retries=0,
+        )
+        self._session = requests.Session()
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._retries = 0
+        self._throttled = 0
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            # Server told us when; add a little jitter so parallel callers spread out.
+            return min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, timeout: float = 60, **kwargs) -> requests.Response:
+        method = method.upper()
+        if not tracing.enabled():
+            return self._request(method, url, timeout, **kwargs)
+
+        with tracing.span(
+            "http.graph",
+            **{"http.method": method, "http.endpoint": endpoint_template(url), "http.request_bytes": _body_size(kwargs)},
+        ) as sp:
+            r = self._request(method, url, timeout, _span=sp, **kwargs)
+            # don't pull a streamed body into memory just to measure it
+            size = int(r.headers.get("Content-Length") or 0) if kwargs.get("stream") else len(r.content)
+            sp.set(**{"http.status": r.status_code, "http.response_bytes": size})
+            return r
+
+    def _request(self, method: str, url: str, timeout: float, _span=None, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            with self._lock:
+                self._requests += 1
+            try:
+                r = self._session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, None)
+            else:
+                if r.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return r
+                if r.status_code == 429:
+                    with self._lock:
+                        self._throttled += 1
+                delay = self._backoff(attempt, _retry_after_seconds(r))
+                r.close()
+
+            with self._lock:
+                self._retries += 1
+            attempt += 1
+            if _span is not None:
+                _span.set(**{"http.retries": attempt})
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    def stats(self) -> dict:
+        """
+        Counters since the client was created.
+        connections_reused = requests that went over an already-open connection.
+        """
+        opened = 0
+        sent = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            sent += pool.num_requests
+
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "retries": self._retries,
+                "throttled": self._throttled,
+                "connections_opened": opened,
+                "connections_reused": max(0, sent - opened),
+            }
+
+    def close(self) -> None:
+        self._session.close()
+
+
+_client: GraphClient | None = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GraphClient:
+    """Process-wide client (module import is cached, unlike runpy'd page scripts)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GraphClient()
+    return _client
@@ -0,0 +1,323 @@
+"""
+Headless batch generation of Incident Reports from a manifest.
+
+    python ir_batch.py manifest.xlsx --out reports/
+    python ir_batch.py incidents.csv --events events.csv --actions actions.csv \\
+        --upload --site-url https://tenant.sharepoint.com/sites/smcod
+
+Manifest: one row per incident (CSV, or the "incidents" / first sheet of an
+XLSX). The incident is identified by city, year and serial columns, or by a
+full incident_no (SMCOD-IR-GS-DVO-2026-0001). Other columns map onto the form
+fields (reported_by, position, date_of_report, incident_date, incident_time,
+location, current_status, nature, damages, investigation, conclusion) and an
+optional image_dir, relative to the manifest, with sequence/, damages/,
+investigation/ and conclusion/ subfolders. Figure captions are the file names.
+
+Events and actions: sheets "events" / "actions" of the XLSX, or --events /
+--actions CSVs, keyed by an incident_no column, with the same columns as the
+form tables (Date, Time, Category, Message / Date, Time, Performed by,
+Action, Result).
+
+Reports are rendered on a process pool and written to --out. With --upload
+they are published like Create New (an existing incident folder is skipped,
+not overwritten) on a bounded thread pool while generation continues. The
+Graph token comes from --token / MS_GRAPH_TOKEN, or from an app-only client
+credentials grant with MS_TENANT_ID, MS_CLIENT_ID and MS_CLIENT_SECRET.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import ir_engine
+import sp_folder_graph as spg
+
+FIELD_DEFAULTS = {
+    "reported_by": "",
+    "position": "",
+    "date_of_report": "",
+    "incident_date": "",
+    "incident_time": "",
+    "location": "",
+    "current_status": "Resolved",
+    "nature": "",
+    "damages": "None",
+    "investigation": "",
+    "conclusion": "",
+}
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg"}
+GRAPH_DEFAULT_SCOPE = "https://graph.microsoft.com/.default"
+
+
+class ManifestError(ValueError):
+    """A manifest row cannot be turned into a report."""
+
+
+# ==============================
+# MANIFEST
+# ==============================
+def _read_table(path: Path, sheet=None) -> pd.DataFrame:
+    if path.suffix.lower() in (".xlsx", ".xlsm", ".xls"):
+        df = pd.read_excel(path, sheet_name=sheet if sheet is not None else 0, dtype=str)
+    else:
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    df.columns = [str(c).strip() for c in df.columns]
+    return df.fillna("")
+
+
+def _xlsx_sheet(path: Path, name: str) -> pd.DataFrame | None:
+    if path.suffix.lower() not in (".xlsx", ".xlsm", ".xls"):
+        return None
+    sheets = pd.ExcelFile(path).sheet_names
+    match = next((s for s in sheets if s.strip().lower() == name), None)
+    return _read_table(path, match) if match is not None else None
+
+
+def _incident_location(row: dict) -> tuple[str, str, str]:
+    """(city, year, full incident no) for a manifest row."""
+    by_code = {code: city for city, code in ir_engine.CITY_CODES.items()}
+    full = (row.get("incident_no") or "").strip()
+    if full:
+        parts = full.split("-")
+        if len(parts) != 6 or parts[3] not in by_code:
+            raise ManifestError(f"unrecognised incident_no {full!r}")
+        city, year = by_code[parts[3]], parts[4]
+        # same normalisation as the form; rejects malformed serials
+        full = ir_engine.format_incident_no(city, year, parts[5])
+    else:
+        city, year = (row.get("city") or "").strip(), (row.get("year") or "").strip()
+        if city not in ir_engine.CITY_CODES:
+            city = by_code.get(city.upper(), city)
+        if city not in ir_engine.CITY_CODES:
+            raise ManifestError(f"unknown city {city!r}")
+        full = ir_engine.format_incident_no(city, year, row.get("serial", ""))
+    if not full or not year.isdigit():
+        raise ManifestError("needs incident_no, or city + year + serial (up to 4 digits)")
+    return city, year, full
+
+
+def _rows_for(df: pd.DataFrame | None, incident_no: str, columns: list[str]) -> pd.DataFrame:
+    if df is None or df.empty or "incident_no" not in df.columns:
+        return pd.DataFrame(columns=columns)
+    sub = df[df["incident_no"].str.strip() == incident_no]
+    return sub.reindex(columns=columns, fill_value="").reset_index(drop=True)
+
+
+def load_manifest(path, events_path=None, actions_path=None) -> list[dict]:
+    """
+    Read the manifest and linked sheets into one job dict per incident:
+    {"city", "year", "incident_no", "fields", "sequence_df", "actions_df",
+    "image_dir"} (or {"incident_no", "error"} for rows that cannot be used).
+    """
+    path = Path(path)
+    incidents = _xlsx_sheet(path, "incidents")
+    if incidents is None:
+        incidents = _read_table(path)
+    events = _read_table(Path(events_path)) if events_path else _xlsx_sheet(path, "events")
+    actions = _read_table(Path(actions_path)) if actions_path else _xlsx_sheet(path, "actions")
+
+    jobs = []
+    for i, row in enumerate(incidents.to_dict("records"), start=2):
+        if not any(str(v).strip() for v in row.values()):
+            continue  # blank trailing line
+        try:
+            city, year, full = _incident_location(row)
+        except ManifestError as e:
+            jobs.append({"incident_no": row.get("incident_no") or f"row {i}", "error": str(e)})
+            continue
+
+        fields = {k: (row.get(k) or "").strip() or v for k, v in FIELD_DEFAULTS.items()}
+        fields["date_of_report"] = fields["date_of_report"] or date.today().strftime("%Y-%m-%d")
+        fields["location"] = fields["location"] or city
+        image_dir = (row.get("image_dir") or "").strip()
+
+        jobs.append({
+            "city": city,
+            "year": year,
+            "incident_no": full,
+            "fields": fields,
+            "sequence_df": _rows_for(events, full, ir_engine.SEQUENCE_COLUMNS),
+            "actions_df": _rows_for(actions, full, ir_engine.ACTIONS_COLUMNS),
+            "image_dir": str((path.parent / image_dir).resolve()) if image_dir else "",
+        })
+    return jobs
+
+
+# ==============================
+# GENERATION (worker processes)
+# ==============================
+class _ImageFile:
+    """Image on disk with the .name / .getvalue() surface of an uploaded file."""
+
+    def __init__(self, path: Path):
+        self.name = path.name
+        self._path = path
+
+    def getvalue(self) -> bytes:
+        return self._path.read_bytes()
+
+
+def _section_images(image_dir: str, section: str) -> list:
+    folder = Path(image_dir) / section if image_dir else None
+    if folder is None or not folder.is_dir():
+        return []
+    return [_ImageFile(p) for p in sorted(folder.iterdir()) if p.suffix.lower() in IMAGE_SUFFIXES]
+
+
+def build_job(job: dict, out_dir: str) -> dict:
+    """Render one manifest job to out_dir/<incident_no>.docx. Runs in a worker process."""
+    t0 = time.perf_counter()
+    data = dict(job["fields"])
+    data["full_incident_no"] = job["incident_no"]
+    data["sequence_df"] = job["sequence_df"]
+    data["actions_df"] = job["actions_df"]
+    for section in ir_engine.FIGURE_SECTIONS:
+        data[f"{section}_images"] = _section_images(job["image_dir"], section)
+        data[f"{section}_captions"] = []
+
+    docx_bytes, image_stats = ir_engine.build_report(data)
+    out = Path(out_dir) / f"{job['incident_no']}.docx"
+    out.write_bytes(docx_bytes)
+    return {
+        "path": str(out),
+        "size": len(docx_bytes),
+        "images": image_stats["count"],
+        "seconds": time.perf_counter() - t0,
+    }
+
+
+# ==============================
+# UPLOAD
+# ==============================
+def _graph_token(explicit: str = "") -> str:
+    token = explicit or os.getenv("MS_GRAPH_TOKEN", "")
+    if token:
+        return token
+
+    import msal
+
+    tenant_id = os.getenv("MS_TENANT_ID", "")
+    client_id = os.getenv("MS_CLIENT_ID", "")
+    client_secret = os.getenv("MS_CLIENT_SECRET", "")
+    if not (tenant_id and client_id and client_secret):
+        raise SystemExit("--upload needs --token / MS_GRAPH_TOKEN or MS_TENANT_ID, MS_CLIENT_ID and MS_CLIENT_SECRET")
+    app = msal.ConfidentialClientApplication(
+        client_id,
+        client_credential=client_secret,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+    )
+    result = app.acquire_token_for_client(scopes=[GRAPH_DEFAULT_SCOPE])
+    if "access_token" not in result:
+        raise SystemExit(f"Token request failed: {result.get('error_description') or result.get('error')}")
+    return result["access_token"]
+
+
+def _upload(token: str, drive_id: str, root_path: str, job: dict, path: str) -> dict:
+    ir_engine.publish_report(
+        token,
+        drive_id,
+        Path(path).read_bytes(),
+        job["incident_no"],
+        root_path=root_path,
+        year=job["year"],
+        city=job["city"],
+    )
+    return {"uploaded": True}
+
+
+# ==============================
+# CLI
+# ==============================
+def _summary(results: dict, jobs_total: int, wall: float, uploading: bool) -> None:
+    built = [r for r in results.values() if "path" in r]
+    failed = {k: r["error"] for k, r in results.items() if r.get("error")}
+    uploaded = [r for r in results.values() if r.get("uploaded")]
+    skipped = [k for k, r in results.items() if r.get("duplicate")]
+    mb = sum(r["size"] for r in built) / 1_048_576
+    cpu = sum(r["seconds"] for r in built)
+
+    print()
+    print(f"Reports:    {len(built)}/{jobs_total} generated, {len(failed)} failed, {sum(r['images'] for r in built)} photos")
+    print(f"Wall time:  {wall:.1f} s  ({len(built) / wall if wall else 0:.2f} reports/s, {mb / wall if wall else 0:.1f} MB/s)")
+    if built:
+        print(f"Per report: {cpu / len(built):.2f} s mean in workers, {mb / len(built):.2f} MB mean size")
+    if uploading:
+        up_mb = sum(r["size"] for r in uploaded) / 1_048_576
+        print(f"Uploads:    {len(uploaded)} done ({up_mb:.1f} MB), {len(skipped)} skipped (folder exists)")
+    for k in skipped:
+        print(f"  exists  {k}")
+    for k, err in failed.items():
+        print(f"  FAILED  {k}: {err}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("manifest", help="CSV or XLSX, one row per incident")
+    ap.add_argument("--events", help="Sequence of Events CSV (default: 'events' sheet of the XLSX)")
+    ap.add_argument("--actions", help="Actions Taken CSV (default: 'actions' sheet of the XLSX)")
+    ap.add_argument("--out", default="reports", help="output directory for the DOCX files")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="generator processes")
+    ap.add_argument("--upload", action="store_true", help="publish each report to SharePoint")
+    ap.add_argument("--upload-workers", type=int, default=4, help="concurrent uploads")
+    ap.add_argument("--site-url", default=os.getenv("SHAREPOINT_SITE_URL", ""))
+    ap.add_argument("--root-path", default=ir_engine.DEFAULT_ROOT_PATH)
+    ap.add_argument("--token", default="", help="Graph bearer token (default: MS_GRAPH_TOKEN / client credentials)")
+    args = ap.parse_args(argv)
+
+    jobs = load_manifest(args.manifest, args.events, args.actions)
+    Path(args.out).mkdir(parents=True, exist_ok=True)
+
+    results = {j["incident_no"]: {"error": j["error"]} for j in jobs if "error" in j}
+    todo = [j for j in jobs if "error" not in j]
+    dupes = {k for k, n in Counter(j["incident_no"] for j in todo).items() if n > 1}
+    for k in dupes:
+        results[k] = {"error": "listed more than once in the manifest"}
+    todo = [j for j in todo if j["incident_no"] not in dupes]
+
+    token = drive_id = None
+    if args.upload:
+        if not args.site_url:
+            raise SystemExit("--upload needs --site-url (or SHAREPOINT_SITE_URL)")
+        token = _graph_token(args.token)
+        site_id = spg.resolve_site_id(token, args.site_url)
+        drive_id = spg.get_default_drive_id(token, site_id)
+
+    t0 = time.perf_counter()
+    uploads = {}
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as procs, \
+            ThreadPoolExecutor(max_workers=max(1, args.upload_workers)) as uploaders:
+        builds = {procs.submit(build_job, j, args.out): j for j in todo}
+        for fut in as_completed(builds):
+            job = builds[fut]
+            key = job["incident_no"]
+            try:
+                results[key] = fut.result()
+            except Exception as e:
+                results[key] = {"error": f"generate: {e}"}
+                continue
+            print(f"  built   {key}  {results[key]['size'] / 1_048_576:.2f} MB  {results[key]['seconds']:.1f} s")
+            if args.upload:
+                uploads[uploaders.submit(_upload, token, drive_id, args.root_path, job, results[key]["path"])] = key
+
+        for fut in as_completed(uploads):
+            key = uploads[fut]
+            try:
+                results[key].update(fut.result())
+                print(f"  upload  {key}")
+            except ir_engine.DuplicateIncidentError:
+                results[key]["duplicate"] = True
+            except Exception as e:
+                results[key]["error"] = f"upload: {e}"
+
+    _summary(results, len(jobs), time.perf_counter() - t0, args.upload)
+    return 1 if any(r.get("error") for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
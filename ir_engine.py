@@ -0,0 +1,509 @@
+"""
+Incident Report engine: DOCX generation from the template, parsing of
+existing reports and the SharePoint publish workflow.
+
+No Streamlit here, so it can be imported once and reused across reruns, and
+used from scripts/CLI. IR_gen.py is the UI on top of it.
+"""
+import io
+import re
+import struct
+import zipfile
+from pathlib import Path
+
+from docx import Document
+from docx.shared import Emu, Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+import docx_tables
+import image_prep
+import ir_parse
+import template_cache
+import tracing
+import sp_folder_graph as spg
+from quickxor import quickxor_b64
+
+
+# ==============================
+# CONFIG
+# ==============================
+TEMPLATE_PATH = str(Path(__file__).resolve().parent / "Incident Report Template_blank (1).docx")
+
+CITY_CODES = {
+    "Davao City": "DVO",
+    "Quezon City": "QZN",
+}
+
+STANDARD_IMAGE_WIDTH_IN = 5.5
+
+# Section headings in the template whose following paragraph holds the section text
+SECTION_HEADINGS = ir_parse.SECTION_HEADINGS
+# Photos are downscaled to STANDARD_IMAGE_WIDTH_IN at this DPI and re-encoded before embedding
+IMAGE_TARGET_DPI = 300
+IMAGE_JPEG_QUALITY = 85
+
+DEFAULT_ROOT_PATH = "Ground Station Operations/Installations, Maintenance and Repair/Incident Reports"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+# ==============================
+# DOCX HELPERS
+# ==============================
+def _set_2col_table_value(table, label, value):
+    for row in table.rows:
+        if row.cells and row.cells[0].text.strip() == label.strip():
+            row.cells[1].text = "" if value is None else str(value)
+            return
+
+
+class DocAnchors:
+    """
+    One pass over the document body that records the body-level tables and,
+    for each known heading, the heading paragraph and the body paragraph after
+    it (same meaning as doc.paragraphs[i + 1]).
+
+    Entries hold the underlying XML elements, so they stay valid when figure
+    paragraphs are inserted later on.
+    """
+
+    def __init__(self, doc, headings=SECTION_HEADINGS):
+        body = doc._body
+        wanted = {h.strip() for h in headings}
+        self.tables = []
+        self._heading = {}
+        self._after = {}
+
+        waiting = []
+        for child in doc.element.body.iterchildren():
+            if child.tag == qn("w:tbl"):
+                self.tables.append(Table(child, body))
+            elif child.tag == qn("w:p"):
+                p = Paragraph(child, body)
+                for h in waiting:
+                    self._after[h] = p
+                waiting = []
+
+                text = p.text.strip()
+                if text in wanted and text not in self._heading:
+                    self._heading[text] = p
+                    waiting.append(text)
+
+    def heading(self, heading_text):
+        return self._heading.get(heading_text.strip())
+
+    def after(self, heading_text):
+        return self._after.get(heading_text.strip())
+
+
+def _set_paragraph_after_heading(anchors, heading_text, new_text):
+    p = anchors.after(heading_text)
+    if p is not None:
+        p.text = new_text or ""
+
+
+def _insert_paragraph_after(paragraph):
+    new_p = OxmlElement("w:p")
+    paragraph._p.addnext(new_p)
+    return Paragraph(new_p, paragraph._parent)
+
+
+def _append_figures_after_heading(anchors, heading_text, files, captions, figure_start, section_label):
+    if not files:
+        return figure_start
+
+    heading = anchors.heading(heading_text)
+    if heading is None:
+        return figure_start
+
+    anchor = anchors.after(heading_text) or heading
+    fig_no = figure_start
+
+    for idx, f in enumerate(files):
+        img_p = _insert_paragraph_after(anchor)
+        img_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = img_p.add_run()
+        if getattr(f, "width_emu", None) and getattr(f, "height_emu", None):
+            # figure carried over from the loaded report: keep its original display size
+            run.add_picture(io.BytesIO(f.getvalue()), width=Emu(f.width_emu), height=Emu(f.height_emu))
+        else:
+            run.add_picture(io.BytesIO(f.getvalue()), width=Inches(STANDARD_IMAGE_WIDTH_IN))
+
+        caption_text = ""
+        if captions and idx < len(captions):
+            caption_text = (captions[idx] or "").strip()
+        if not caption_text:
+            caption_text = f.name.rsplit(".", 1)[0]
+
+        cap_p = _insert_paragraph_after(img_p)
+        cap_p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        cap_run = cap_p.add_run(f"Figure {fig_no}. {section_label} – {caption_text}")
+        cap_run.italic = True
+
+        anchor = cap_p
+        fig_no += 1
+
+    return fig_no
+
+
+SEQUENCE_COLUMNS = ["Date", "Time", "Category", "Message"]
+ACTIONS_COLUMNS = ["Date", "Time", "Performed by", "Action", "Result"]
+
+
+def _fill_sequence_table(table, df):
+    docx_tables.render_rows(table, df, SEQUENCE_COLUMNS, header_rows=0)
+
+
+def _fill_actions_table(table, df):
+    docx_tables.render_rows(table, df, ACTIONS_COLUMNS, header_rows=1)
+
+
+IMAGE_KEYS = ["sequence_images", "damages_images", "investigation_images", "conclusion_images"]
+
+
+def prepare_report_images(data):
+    """
+    Downscale/re-encode every section's photos in one pooled pass, replacing
+    the lists in data in place. Returns before/after byte stats.
+    """
+    with tracing.span("images.prepare"):
+        all_files = [f for k in IMAGE_KEYS for f in (data.get(k) or [])]
+        prepared, stats = image_prep.prepare_images(
+            all_files,
+            STANDARD_IMAGE_WIDTH_IN,
+            dpi=IMAGE_TARGET_DPI,
+            jpeg_quality=IMAGE_JPEG_QUALITY,
+        )
+        pos = 0
+        for k in IMAGE_KEYS:
+            n = len(data.get(k) or [])
+            data[k] = prepared[pos:pos + n]
+            pos += n
+        return stats
+
+
+def generate_docx(data):
+    with tracing.span("docx.generate"):
+        with tracing.span("docx.template"):
+            doc = template_cache.load_template(TEMPLATE_PATH)
+            anchors = DocAnchors(doc)
+        t0, t1, t2, t3 = anchors.tables[:4]
+
+        with tracing.span("docx.fields"):
+            _set_2col_table_value(t0, "Reported by", data["reported_by"])
+            _set_2col_table_value(t0, "Position", data["position"])
+            _set_2col_table_value(t0, "Date of Report", data["date_of_report"])
+            _set_2col_table_value(t0, "Incident No.", data["full_incident_no"])
+
+            _set_2col_table_value(t1, "Date (YYYY-MM-DD)", data["incident_date"])
+            _set_2col_table_value(t1, "Time", data["incident_time"])
+            _set_2col_table_value(t1, "Location", data["location"])
+            _set_2col_table_value(t1, "Current Status", data["current_status"])
+
+            _set_paragraph_after_heading(anchors, "Nature of Incident", data["nature"])
+            _set_paragraph_after_heading(anchors, "Damages Incurred (if any)", data["damages"])
+            _set_paragraph_after_heading(anchors, "Investigation and Analysis", data["investigation"])
+            _set_paragraph_after_heading(anchors, "Conclusion and Recommendations", data["conclusion"])
+
+        with tracing.span("docx.tables", rows=len(data["sequence_df"]) + len(data["actions_df"])):
+            _fill_sequence_table(t2, data["sequence_df"])
+            _fill_actions_table(t3, data["actions_df"])
+
+        with tracing.span("docx.figures") as sp:
+            fig = 1
+            fig = _append_figures_after_heading(anchors, "Sequence of Events", data["sequence_images"], data["sequence_captions"], fig, "Sequence of Events")
+            fig = _append_figures_after_heading(anchors, "Damages Incurred (if any)", data["damages_images"], data["damages_captions"], fig, "Damages Incurred")
+            fig = _append_figures_after_heading(anchors, "Investigation and Analysis", data["investigation_images"], data["investigation_captions"], fig, "Investigation and Analysis")
+            fig = _append_figures_after_heading(anchors, "Conclusion and Recommendations", data["conclusion_images"], data["conclusion_captions"], fig, "Conclusion and Recommendations")
+            sp.set(figures=fig - 1)
+
+        with tracing.span("docx.save") as sp:
+            out = io.BytesIO()
+            doc.save(out)
+            _clear_zip_timestamps(out)
+            sp.set(bytes=out.tell())
+        return out.getvalue()
+
+
+# 1980-01-01 00:00:00, the earliest DOS timestamp
+_DOS_EPOCH = (0, (1 << 5) | 1)
+
+
+def _clear_zip_timestamps(buf: io.BytesIO) -> None:
+    """
+    python-docx stamps every zip member with the save time. Pin them to the DOS
+    epoch in place (CRCs do not cover the header dates) so the same report
+    always gives the same bytes, and publish_report can skip re-uploading it.
+    """
+    with zipfile.ZipFile(buf) as zf:
+        infos = zf.infolist()
+        central_dir = zf.start_dir
+    with buf.getbuffer() as view:
+        pos = central_dir
+        for info in infos:
+            struct.pack_into("<HH", view, info.header_offset + 10, *_DOS_EPOCH)
+            struct.pack_into("<HH", view, pos + 12, *_DOS_EPOCH)
+            name_len, extra_len, comment_len = struct.unpack_from("<HHH", view, pos + 28)
+            pos += 46 + name_len + extra_len + comment_len
+
+
+# ==============================
+# PARSE EXISTING DOCX
+# ==============================
+def _table_rows(table):
+    return [[c.text for c in r.cells] for r in table.rows]
+
+
+def _get_paragraph_after_heading(anchors, heading_text):
+    p = anchors.after(heading_text)
+    return p.text.strip() if p is not None else ""
+
+
+def _rewound(source):
+    """DOCX bytes or a seekable binary file -> a file object positioned at the start."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    source.seek(0)
+    return source
+
+
+def parse_existing_ir_docx_python_docx(source) -> dict:
+    """Reference parser on the full python-docx object model (fallback for parse_existing_ir_docx)."""
+    doc = Document(_rewound(source))
+    anchors = DocAnchors(doc)
+    rows = [_table_rows(t) for t in anchors.tables[:4]]
+
+    out = {key: ir_parse.label_value(rows[ti], label) for ti, label, key in ir_parse.LABEL_FIELDS}
+    for heading, key in ir_parse.PARAGRAPH_FIELDS:
+        out[key] = _get_paragraph_after_heading(anchors, heading)
+    out["sequence_df"] = ir_parse.rows_to_sequence_df(rows[2])
+    out["actions_df"] = ir_parse.rows_to_actions_df(rows[3])
+    return out
+
+
+def parse_existing_ir_docx(source) -> dict:
+    # source: DOCX bytes or a seekable binary file.
+    # Streaming lxml parse of word/document.xml only; python-docx if that chokes on the file.
+    try:
+        return ir_parse.parse_ir_docx(_rewound(source))
+    except Exception:
+        return parse_existing_ir_docx_python_docx(source)
+
+
+# ==============================
+# INCIDENT NUMBERS
+# ==============================
+def normalize_serial(serial_raw: str) -> str:
+    s = (serial_raw or "").strip()
+    if not s:
+        return ""
+    if not re.fullmatch(r"\d{1,4}", s):
+        return ""
+    return s.zfill(4)
+
+
+def format_incident_no(city: str, year: str, serial: str) -> str:
+    """SMCOD-IR-GS-<site>-<year>-<serial>; "" if the serial is not valid."""
+    serial = normalize_serial(serial)
+    return f"SMCOD-IR-GS-{CITY_CODES[city]}-{year}-{serial}" if serial else ""
+
+
+MAX_SERIAL = 9999
+# Serials tried past a 409 before giving up on automatic allocation
+SERIAL_RESERVE_TRIES = 50
+
+
+def next_serial(folder_names, city: str, year: str) -> str:
+    """One past the highest serial among this site/year's incident folder names."""
+    pattern = re.compile(rf"SMCOD-IR-GS-{re.escape(CITY_CODES[city])}-{re.escape(str(year))}-(\d{{4}})", re.IGNORECASE)
+    used = [int(m.group(1)) for m in map(pattern.fullmatch, folder_names) if m]
+    return str(max(used, default=0) + 1).zfill(4)
+
+
+def suggest_serial(token: str, drive_id: str, root_path: str, year: str, city: str) -> str:
+    """Next free serial from the cached folder listing (a hint; reserve_incident makes it stick)."""
+    try:
+        folders = spg.list_incident_folders(token, drive_id, f"{root_path}/{year}/{city}")
+    except RuntimeError:
+        # no folder for this year/site yet
+        return "0001"
+    return next_serial([f["name"] for f in folders], city, year)
+
+
+def reserve_incident(token: str, drive_id: str, root_path: str, year: str, city: str, serial: str = "") -> tuple[dict, str]:
+    """
+    Claim an incident number by creating its folder (conflictBehavior fail).
+
+    With serial, exactly that number is reserved (DuplicateIncidentError if
+    taken). Without, allocation starts at the suggested serial and moves on
+    to the next number on every 409, so concurrent operators each end up
+    with their own. Returns (incident folder, full incident no).
+    """
+    with tracing.span("incident.reserve"):
+        parent = spg.ensure_path(token, drive_id, root_path, parts=[year, city])
+
+        if serial:
+            full_incident_no = format_incident_no(city, year, serial)
+            if not full_incident_no:
+                raise ValueError(f"Invalid incident serial: {serial!r}")
+            folder = spg.create_folder(token, drive_id, parent["id"], full_incident_no)
+            if folder is None:
+                raise DuplicateIncidentError(f"{full_incident_no} already exists")
+            return folder, full_incident_no
+
+        n = int(suggest_serial(token, drive_id, root_path, year, city))
+        for _ in range(SERIAL_RESERVE_TRIES):
+            if n > MAX_SERIAL:
+                break
+            full_incident_no = format_incident_no(city, year, str(n))
+            folder = spg.create_folder(token, drive_id, parent["id"], full_incident_no)
+            if folder is not None:
+                return folder, full_incident_no
+            n += 1
+        raise RuntimeError(f"Could not reserve an incident serial for {city} {year} (last tried {n - 1:04d})")
+
+
+def release_incident(token: str, drive_id: str, root_path: str, year: str, city: str, folder: dict) -> bool:
+    """
+    Give back a number claimed with reserve_incident that was never used:
+    its folder is deleted only if it is still empty and has the eTag it was
+    created with, else WriteConflictError. Returns False if already gone.
+    """
+    with tracing.span("incident.release"):
+        current = spg.get_item(token, drive_id, folder["id"], select="id,eTag,folder")
+        if current is None:
+            return False
+        if (current.get("folder") or {}).get("childCount"):
+            raise spg.WriteConflictError(f"{folder['name']} is no longer empty")
+        deleted = spg.delete_item(
+            token, drive_id, folder["id"],
+            parent_item_id=(folder.get("parentReference") or {}).get("id", ""),
+            if_match=folder.get("eTag", ""),
+        )
+        spg.invalidate_path(drive_id, f"{root_path}/{year}/{city}/{folder['name']}")
+        return deleted
+
+
+# ==============================
+# REPORT WORKFLOW
+# ==============================
+FIGURE_SECTIONS = ["sequence", "damages", "investigation", "conclusion"]
+
+
+class DuplicateIncidentError(RuntimeError):
+    """The incident folder already exists (Create New with a used serial)."""
+
+
+def load_report(token: str, drive_id: str, file_item_id: str) -> tuple[dict, dict, dict]:
+    """
+    Download an existing report; returns (parsed fields, figures by section,
+    driveItem metadata). The metadata's eTag is the one to publish against
+    (target["etag"]). The file is streamed to a spooled temp file and parsed
+    from there, so a photo-heavy report is never held as one bytes object.
+    """
+    with tracing.span("report.load"):
+        item = spg.get_item(token, drive_id, file_item_id, select=spg.DOWNLOAD_SELECT)
+        if item is None:
+            raise RuntimeError("The report no longer exists on SharePoint")
+        with spg.download_file(token, drive_id, file_item_id, item=item) as f:
+            parsed = parse_existing_ir_docx(f)
+            return parsed, ir_parse.extract_figures(_rewound(f)), item
+
+
+def build_report(data: dict, keep_figures: dict | None = None) -> tuple[bytes, dict]:
+    """
+    Optimize the new photos, put carried-over figures (keep_figures[section])
+    in front of them, and render the DOCX. data is updated in place.
+    Returns (docx bytes, image stats).
+    """
+    with tracing.span("report.build"):
+        image_stats = prepare_report_images(data)
+
+        # Carried-over figures go first, as-is (no decode/re-encode), new uploads after them
+        for section in FIGURE_SECTIONS:
+            kept = (keep_figures or {}).get(section) or []
+            data[f"{section}_images"] = kept + list(data.get(f"{section}_images") or [])
+            data[f"{section}_captions"] = [f.caption for f in kept] + list(data.get(f"{section}_captions") or [])
+
+        return generate_docx(data), image_stats
+
+
+def publish_report(
+    token: str,
+    drive_id: str,
+    docx_bytes: bytes,
+    full_incident_no: str,
+    root_path: str = DEFAULT_ROOT_PATH,
+    year: str = "",
+    city: str = "",
+    target: dict | None = None,
+    progress=None,
+    mirror=None,
+) -> dict:
+    """
+    Upload a generated report.
+
+    Update (or a number already claimed with reserve_incident): target is
+    {"folder_id", "docx_name"} and the file is written there. When target
+    also has the loaded report's "docx_id" and "etag", nothing is sent if
+    SharePoint already holds exactly these bytes (same quickXorHash; the
+    returned item then has unchanged=True), and otherwise the write is
+    conditional on that eTag: spg.WriteConflictError if someone else changed
+    the report since it was loaded. Create:
+    root_path/year/city/full_incident_no is created (raises
+    DuplicateIncidentError if it already exists).
+    mirror (an sp_mirror.SharePointMirror), if given, gets the written items.
+    Returns the uploaded driveItem.
+    """
+    with tracing.span("report.publish") as sp:
+        written = []
+        if_match = None
+        if target:
+            folder_id = target["folder_id"]
+            filename = target.get("docx_name") or f"{full_incident_no}.docx"
+            if target.get("docx_id"):
+                current = spg.get_item(token, drive_id, target["docx_id"], select="id,name,size,eTag,file,webUrl")
+                if current is None and target.get("etag"):
+                    raise spg.WriteConflictError(f"{filename} was deleted since it was loaded")
+                if current is not None and spg.quickxor_of(current) == quickxor_b64(docx_bytes):
+                    sp.set(unchanged=True)
+                    if progress:
+                        progress(len(docx_bytes), len(docx_bytes))
+                    return dict(current, unchanged=True)
+                if_match = target.get("etag")
+                # fail before sending the bytes; If-Match still guards the write itself
+                if if_match and current is not None and current.get("eTag") != if_match:
+                    raise spg.WriteConflictError(f"{filename} was changed by someone else since it was loaded")
+        else:
+            # The create itself is the duplicate check (conflictBehavior fail), so two
+            # submissions of the same number cannot both succeed.
+            parent = spg.ensure_path(token, drive_id, root_path, parts=[year, city])
+            folder = spg.create_folder(token, drive_id, parent["id"], full_incident_no)
+            if folder is None:
+                raise DuplicateIncidentError(f"{full_incident_no} already exists")
+            folder_id = folder["id"]
+            filename = f"{full_incident_no}.docx"
+            written.append(folder)
+
+        uploaded = spg.upload_file_to_folder(
+            token,
+            drive_id,
+            folder_item_id=folder_id,
+            filename=filename,
+            content_bytes=docx_bytes,
+            content_type=DOCX_MIME,
+            progress=progress,
+            if_match=if_match,
+        )
+        written.append(uploaded)
+
+        # Write-through so the Update Existing lists show the new report before the next delta sync
+        if mirror is not None:
+            try:
+                mirror.apply_items(written)
+            except Exception:
+                pass
+        return uploaded
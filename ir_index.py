@@ -0,0 +1,345 @@
+"""
+Full-text search over past Incident Reports.
+
+update_index() walks the Incident Reports tree, downloads DOCX files whose
+eTag changed since the last run, parses them on a process pool and stores the
+fields plus Sequence/Actions rows in a SQLite FTS5 table. search() is a local
+bm25-ranked query.
+"""
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import ir_engine
+import sp_folder_graph as spg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id          INTEGER PRIMARY KEY,
+    item_id     TEXT NOT NULL UNIQUE,
+    etag        TEXT NOT NULL,
+    path        TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    year        TEXT NOT NULL DEFAULT '',
+    city        TEXT NOT NULL DEFAULT '',
+    fields      TEXT NOT NULL,
+    indexed_at  REAL NOT NULL
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+    incident_no, reported_by, location, current_status,
+    nature, damages, investigation, conclusion,
+    events, actions,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+TEXT_FIELDS = ["reported_by", "position", "date_of_report", "full_incident_no", "incident_date",
+               "incident_time", "location", "current_status", "nature", "damages", "investigation", "conclusion"]
+
+# bm25 column weights, same order as reports_fts columns
+FTS_WEIGHTS = (10.0, 2.0, 2.0, 1.0, 4.0, 3.0, 3.0, 3.0, 1.5, 1.5)
+
+INDEX_SELECT = "id,name,folder,file,size,eTag"
+
+# parsed reports written per transaction
+STORE_BATCH = 50
+
+_write_lock = threading.Lock()
+_SPAWN = multiprocessing.get_context("spawn")
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    parent = os.path.dirname(db_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    con = sqlite3.connect(db_path, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.executescript(SCHEMA)
+    return con
+
+
+# ---------------------------
+# walking SharePoint
+# ---------------------------
+def iter_report_files(token: str, drive_id: str, root_path: str):
+    """Yield {"id", "name", "etag", "path"} for every .docx below root_path."""
+    root = spg._item_by_path(token, drive_id, root_path)
+    if not root:
+        raise RuntimeError(f"Root path not found in drive: {root_path}")
+
+    stack = [(root["id"], "")]
+    while stack:
+        folder_id, rel = stack.pop()
+        for k in spg.iter_children(token, drive_id, folder_id, select=INDEX_SELECT):
+            child_rel = f"{rel}/{k['name']}" if rel else k["name"]
+            if k.get("folder") is not None:
+                stack.append((k["id"], child_rel))
+            elif k.get("file") is not None and k["name"].lower().endswith(".docx"):
+                yield {"id": k["id"], "name": k["name"], "etag": k.get("eTag", ""), "path": child_rel}
+
+
+# ---------------------------
+# parsing (runs in worker processes)
+# ---------------------------
+def _parse_for_index(path: str) -> dict:
+    # same parser chain as the Update page, so a report it can open is also searchable
+    with open(path, "rb") as fh:
+        parsed = ir_engine.parse_existing_ir_docx(fh)
+    out = {k: parsed.get(k, "") for k in TEXT_FIELDS}
+    # plain lists pickle back to the parent much cheaper than DataFrames
+    out["sequence_rows"] = parsed["sequence_df"].astype(str).values.tolist()
+    out["actions_rows"] = parsed["actions_df"].astype(str).values.tolist()
+    return out
+
+
+def _rows_text(rows: list[list[str]]) -> str:
+    return "\n".join(" ".join(c for c in r if c) for r in rows if any(r))
+
+
+def _store(con: sqlite3.Connection, f: dict, fields: dict) -> None:
+    parts = f["path"].split("/")
+    year = parts[0] if len(parts) > 1 else ""
+    city = parts[1] if len(parts) > 2 else ""
+
+    row = con.execute("SELECT id FROM reports WHERE item_id = ?", (f["id"],)).fetchone()
+    if row:
+        con.execute("DELETE FROM reports_fts WHERE rowid = ?", (row[0],))
+        con.execute(
+            "UPDATE reports SET etag = ?, path = ?, name = ?, year = ?, city = ?, fields = ?, indexed_at = ? WHERE id = ?",
+            (f["etag"], f["path"], f["name"], year, city, json.dumps(fields), time.time(), row[0]),
+        )
+        rowid = row[0]
+    else:
+        cur = con.execute(
+            "INSERT INTO reports (item_id, etag, path, name, year, city, fields, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (f["id"], f["etag"], f["path"], f["name"], year, city, json.dumps(fields), time.time()),
+        )
+        rowid = cur.lastrowid
+
+    con.execute(
+        "INSERT INTO reports_fts (rowid, incident_no, reported_by, location, current_status, nature, damages, "
+        "investigation, conclusion, events, actions) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            rowid,
+            fields.get("full_incident_no", ""),
+            fields.get("reported_by", ""),
+            fields.get("location", ""),
+            fields.get("current_status", ""),
+            fields.get("nature", ""),
+            fields.get("damages", ""),
+            fields.get("investigation", ""),
+            fields.get("conclusion", ""),
+            _rows_text(fields.get("sequence_rows", [])),
+            _rows_text(fields.get("actions_rows", [])),
+        ),
+    )
+
+
+def _remove_missing(con: sqlite3.Connection, seen_ids: set[str]) -> int:
+    gone = [(rid, iid) for rid, iid in con.execute("SELECT id, item_id FROM reports") if iid not in seen_ids]
+    for rid, _ in gone:
+        con.execute("DELETE FROM reports_fts WHERE rowid = ?", (rid,))
+        con.execute("DELETE FROM reports WHERE id = ?", (rid,))
+    return len(gone)
+
+
+def _store_batch(db_path: str, parsed: list[tuple[dict, dict]]) -> None:
+    """Write parsed reports in one short transaction, so searches are never blocked for a whole run."""
+    if not parsed:
+        return
+    with _write_lock:
+        con = _connect(db_path)
+        try:
+            for f, fields in parsed:
+                _store(con, f, fields)
+            con.commit()
+        finally:
+            con.close()
+
+
+def update_index(
+    token: str,
+    drive_id: str,
+    root_path: str,
+    db_path: str,
+    files=None,
+    parse_workers: int | None = None,
+    download_workers: int = 4,
+    progress=None,
+) -> dict:
+    """
+    Bring the index up to date. Only files whose eTag changed are downloaded
+    and parsed. files may be passed in (e.g. from the local mirror) instead of
+    walking SharePoint. progress(done, total) is called as files complete.
+    Returns {"seen", "indexed", "unchanged", "removed", "failed", "seconds"}.
+    """
+    t0 = time.perf_counter()
+    files = list(files if files is not None else iter_report_files(token, drive_id, root_path))
+
+    con = _connect(db_path)
+    try:
+        known = dict(con.execute("SELECT item_id, etag FROM reports"))
+    finally:
+        con.close()
+    todo = [f for f in files if known.get(f["id"]) != f["etag"]]
+    failed: list[tuple[str, str]] = []
+
+    if todo:
+        # Downloads stream to temp files and workers parse from the path, so
+        # no report is ever held (or pickled across processes) as bytes. At most
+        # `window` files are downloading, queued or parsing at once, and each
+        # is removed as soon as its parse comes back, so the spool stays small.
+        workers = parse_workers or os.cpu_count() or 1
+        window = max(2 * workers, download_workers)
+        queue = iter(enumerate(todo))
+        with tempfile.TemporaryDirectory(prefix="ir_index_") as spool_dir:
+
+            def download(i, f):
+                path = os.path.join(spool_dir, f"{i}.docx")
+                try:
+                    with open(path, "wb") as out:
+                        spg.download_file(token, drive_id, f["id"], sink=out)
+                except BaseException:
+                    os.remove(path)
+                    raise
+                return path
+
+            # downloads are I/O-bound (threads), parsing is CPU-bound (processes).
+            # spawn, not fork: this runs inside the Streamlit server, whose threads
+            # and held locks must not be copied into the workers.
+            with ThreadPoolExecutor(max_workers=download_workers) as dl, \
+                    ProcessPoolExecutor(max_workers=parse_workers, mp_context=_SPAWN) as parse_pool:
+                downloading: dict = {}  # future -> file
+                parsing: dict = {}  # future -> (file, spool path)
+                parsed: list[tuple[dict, dict]] = []
+                done = 0
+
+                def top_up():
+                    while len(downloading) + len(parsing) < window:
+                        nxt = next(queue, None)
+                        if nxt is None:
+                            return
+                        downloading[dl.submit(download, *nxt)] = nxt[1]
+
+                top_up()
+                while downloading or parsing:
+                    finished, _ = wait([*downloading, *parsing], return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        if fut in downloading:
+                            f = downloading.pop(fut)
+                            try:
+                                path = fut.result()
+                            except Exception as e:
+                                failed.append((f["path"], str(e)))
+                            else:
+                                parsing[parse_pool.submit(_parse_for_index, path)] = (f, path)
+                                continue
+                        else:
+                            f, path = parsing.pop(fut)
+                            try:
+                                parsed.append((f, fut.result()))
+                            except Exception as e:
+                                failed.append((f["path"], str(e)))
+                            finally:
+                                os.remove(path)
+                        done += 1
+                        if len(parsed) >= STORE_BATCH:
+                            _store_batch(db_path, parsed)
+                            parsed = []
+                        if progress:
+                            progress(done, len(todo))
+                    top_up()
+                _store_batch(db_path, parsed)
+
+    with _write_lock:
+        con = _connect(db_path)
+        try:
+            removed = _remove_missing(con, {f["id"] for f in files})
+            con.commit()
+        finally:
+            con.close()
+
+    return {
+        "seen": len(files),
+        "indexed": len(todo) - len(failed),
+        "unchanged": len(files) - len(todo),
+        "removed": removed,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+# ---------------------------
+# search
+# ---------------------------
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def to_fts_query(text: str) -> str:
+    """Free text -> FTS5 query: every word must match, the last one as a prefix."""
+    tokens = _TOKEN_RE.findall(text or "")
+    if not tokens:
+        return ""
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += "*"
+    return " AND ".join(quoted)
+
+
+def search(db_path: str, text: str, limit: int = 50, raw: bool = False) -> list[dict]:
+    """
+    Ranked matches for text (raw=True passes FTS5 syntax through).
+    Each hit: item_id, path, name, year, city, incident_no, score, snippet, fields.
+    """
+    query = text if raw else to_fts_query(text)
+    if not query:
+        return []
+
+    weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+    con = _connect(db_path)
+    try:
+        rows = con.execute(
+            f"""
+            SELECT r.item_id, r.path, r.name, r.year, r.city, r.fields,
+                   bm25(reports_fts, {weights}) AS score,
+                   snippet(reports_fts, -1, '**', '**', ' … ', 12)
+            FROM reports_fts JOIN reports r ON r.id = reports_fts.rowid
+            WHERE reports_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (query, limit),
+        ).fetchall()
+    finally:
+        con.close()
+
+    out = []
+    for item_id, path, name, year, city, fields, score, snippet in rows:
+        fields = json.loads(fields)
+        out.append({
+            "item_id": item_id,
+            "path": path,
+            "name": name,
+            "year": year,
+            "city": city,
+            "incident_no": fields.get("full_incident_no", ""),
+            "score": -score,
+            "snippet": snippet,
+            "fields": fields,
+        })
+    return out
+
+
+def index_stats(db_path: str) -> dict:
+    con = _connect(db_path)
+    try:
+        n, last = con.execute("SELECT COUNT(*), MAX(indexed_at) FROM reports").fetchone()
+    finally:
+        con.close()
+    return {"reports": n, "last_indexed_at": last}
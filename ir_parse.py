@@ -0,0 +1,374 @@
+"""
+Streaming reader for Incident Report DOCX files.
+
+Only word/document.xml is parsed (no python-docx object model), with
+lxml.etree.iterparse. Body-level elements are processed as soon as they are
+complete and then dropped, and parsing stops once every field is found.
+extract_figures additionally reads the referenced media parts as raw bytes.
+The text rules mirror python-docx (Paragraph.text / _Cell.text / _Row.cells),
+so the result matches the python-docx based parser.
+"""
+import io
+import posixpath
+import re
+import zipfile
+
+import pandas as pd
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+
+def _w(tag: str) -> str:
+    return f"{{{W_NS}}}{tag}"
+
+
+W_BODY = _w("body")
+W_P = _w("p")
+W_R = _w("r")
+W_TBL = _w("tbl")
+W_TR = _w("tr")
+W_TC = _w("tc")
+W_HYPERLINK = _w("hyperlink")
+W_VAL = _w("val")
+W_TYPE = _w("type")
+
+SECTION_HEADINGS = [
+    "Nature of Incident",
+    "Sequence of Events",
+    "Damages Incurred (if any)",
+    "Investigation and Analysis",
+    "Conclusion and Recommendations",
+]
+
+# (table index, label in first column, output key)
+LABEL_FIELDS = [
+    (0, "Reported by", "reported_by"),
+    (0, "Position", "position"),
+    (0, "Date of Report", "date_of_report"),
+    (0, "Incident No.", "full_incident_no"),
+    (1, "Date (YYYY-MM-DD)", "incident_date"),
+    (1, "Time", "incident_time"),
+    (1, "Location", "location"),
+    (1, "Current Status", "current_status"),
+]
+
+PARAGRAPH_FIELDS = [
+    ("Nature of Incident", "nature"),
+    ("Damages Incurred (if any)", "damages"),
+    ("Investigation and Analysis", "investigation"),
+    ("Conclusion and Recommendations", "conclusion"),
+]
+
+
+# ---------------------------
+# rows -> values (shared with the python-docx parser in ir_engine)
+# ---------------------------
+def label_value(rows: list[list[str]], label: str) -> str:
+    for cells in rows:
+        if cells and cells[0].strip() == label.strip():
+            return cells[1].strip() if len(cells) > 1 else ""
+    return ""
+
+
+def rows_to_sequence_df(rows: list[list[str]]) -> pd.DataFrame:
+    out = []
+    for r in rows:
+        cells = [c.strip() for c in r]
+        if len(cells) >= 4:
+            out.append({"Date": cells[0], "Time": cells[1], "Category": cells[2], "Message": cells[3]})
+    df = pd.DataFrame(out)
+    if df.empty:
+        df = pd.DataFrame([{"Date": "", "Time": "", "Category": "", "Message": ""}])
+    return df
+
+
+def rows_to_actions_df(rows: list[list[str]]) -> pd.DataFrame:
+    out = []
+    for idx, r in enumerate(rows):
+        cells = [c.strip() for c in r]
+        if len(cells) >= 5:
+            if idx == 0 and ("Performed" in cells[2] or "Action" in cells[3] or "Result" in cells[4]):
+                continue
+            out.append({"Date": cells[0], "Time": cells[1], "Performed by": cells[2], "Action": cells[3], "Result": cells[4]})
+    df = pd.DataFrame(out)
+    if df.empty:
+        df = pd.DataFrame([{"Date": "", "Time": "", "Performed by": "", "Action": "", "Result": ""}])
+    return df
+
+
+# ---------------------------
+# XML text, python-docx rules
+# ---------------------------
+_RUN_TEXT = {
+    _w("t"): lambda e: e.text or "",
+    _w("tab"): lambda e: "\t",
+    _w("ptab"): lambda e: "\t",
+    _w("cr"): lambda e: "\n",
+    _w("noBreakHyphen"): lambda e: "-",
+    _w("br"): lambda e: "\n" if e.get(W_TYPE, "textWrapping") == "textWrapping" else "",
+}
+
+
+def _run_text(r) -> str:
+    return "".join(_RUN_TEXT[c.tag](c) for c in r if c.tag in _RUN_TEXT)
+
+
+def _paragraph_text(p) -> str:
+    parts = []
+    for c in p:
+        if c.tag == W_R:
+            parts.append(_run_text(c))
+        elif c.tag == W_HYPERLINK:
+            parts.extend(_run_text(r) for r in c if r.tag == W_R)
+    return "".join(parts)
+
+
+def _tc_props(tc) -> tuple[int, str | None]:
+    """(gridSpan, vMerge value or None)."""
+    tc_pr = tc.find(_w("tcPr"))
+    if tc_pr is None:
+        return 1, None
+    span_el = tc_pr.find(_w("gridSpan"))
+    span = int(span_el.get(W_VAL)) if span_el is not None else 1
+    vm_el = tc_pr.find(_w("vMerge"))
+    vmerge = None if vm_el is None else vm_el.get(W_VAL, "continue")
+    return span, vmerge
+
+
+def _grid_before(tr) -> int:
+    tr_pr = tr.find(_w("trPr"))
+    if tr_pr is None:
+        return 0
+    gb = tr_pr.find(_w("gridBefore"))
+    return int(gb.get(W_VAL)) if gb is not None else 0
+
+
+def _table_rows(tbl) -> list[list[str]]:
+    """Cell texts per row, repeating spanned cells and resolving vMerge like _Row.cells."""
+    rows = []
+    above: dict[int, str] = {}  # grid offset -> cell text of the previous row
+    for tr in tbl:
+        if tr.tag != W_TR:
+            continue
+        cells = []
+        current: dict[int, str] = {}
+        offset = _grid_before(tr)
+        for tc in tr:
+            if tc.tag != W_TC:
+                continue
+            span, vmerge = _tc_props(tc)
+            if vmerge == "continue":
+                text = above.get(offset, "")
+            else:
+                text = "\n".join(_paragraph_text(p) for p in tc if p.tag == W_P)
+            for _ in range(span):
+                cells.append(text)
+            current[offset] = text
+            offset += span
+        rows.append(cells)
+        above = current
+    return rows
+
+
+# ---------------------------
+# streaming parse
+# ---------------------------
+def parse_ir_docx(source) -> dict:
+    """
+    Same dict as ir_engine.parse_existing_ir_docx.
+    source: DOCX bytes, a path, or a binary file-like object.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    tables: list[list[list[str]]] = []
+    after: dict[str, str] = {}
+    waiting: list[str] = []
+    wanted = {h.strip() for h in SECTION_HEADINGS}
+    seen_headings: set[str] = set()
+    needed = {h for h, _ in PARAGRAPH_FIELDS}
+
+    with zipfile.ZipFile(source) as zf, zf.open("word/document.xml") as xml:
+        for _, el in etree.iterparse(xml, events=("end",), tag=(W_P, W_TBL), huge_tree=True):
+            parent = el.getparent()
+            if parent is None or parent.tag != W_BODY:
+                continue  # nested inside a table / sdt; handled with its container
+
+            if el.tag == W_TBL:
+                if len(tables) < 4:
+                    tables.append(_table_rows(el))
+            else:
+                text = _paragraph_text(el)
+                for h in waiting:
+                    after[h] = text
+                waiting = []
+                key = text.strip()
+                if key in wanted and key not in seen_headings:
+                    seen_headings.add(key)
+                    waiting.append(key)
+
+            # free what has been consumed so memory stays flat
+            el.clear()
+            while el.getprevious() is not None:
+                del parent[0]
+
+            if len(tables) >= 4 and needed <= after.keys():
+                break
+
+    if len(tables) < 4:
+        raise ValueError(f"Expected 4 tables in the report, found {len(tables)}")
+
+    out = {key: label_value(tables[ti], label) for ti, label, key in LABEL_FIELDS}
+    for heading, key in PARAGRAPH_FIELDS:
+        out[key] = after.get(heading, "").strip()
+    out["sequence_df"] = rows_to_sequence_df(tables[2])
+    out["actions_df"] = rows_to_actions_df(tables[3])
+    return out
+
+
+# ---------------------------
+# existing figures
+# ---------------------------
+# (heading, caption label, data key prefix) in document order
+FIGURE_SECTIONS = [
+    ("Sequence of Events", "Sequence of Events", "sequence"),
+    ("Damages Incurred (if any)", "Damages Incurred", "damages"),
+    ("Investigation and Analysis", "Investigation and Analysis", "investigation"),
+    ("Conclusion and Recommendations", "Conclusion and Recommendations", "conclusion"),
+]
+
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+WP_NS = "http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_CAPTION_RE = re.compile(r"^Figure\s+\d+\.\s+(?P<label>.+?)\s+–\s+(?P<caption>.*)$", re.S)
+
+
+class ExistingFigure:
+    """
+    Image part lifted from an existing report, with its caption and display
+    size. Has the .name / .getvalue() surface of an upload, so it can be passed
+    to generate_docx as-is; the bytes are never decoded.
+    """
+
+    def __init__(self, name: str, data: bytes, caption: str, width_emu: int | None, height_emu: int | None):
+        self.name = name
+        self.data = data
+        self.caption = caption
+        self.width_emu = width_emu
+        self.height_emu = height_emu
+
+    def getvalue(self) -> bytes:
+        return self.data
+
+
+def _document_rels(zf: zipfile.ZipFile) -> dict[str, str]:
+    """rId -> zip member name for word/document.xml's internal relationships."""
+    try:
+        root = etree.fromstring(zf.read("word/_rels/document.xml.rels"))
+    except KeyError:
+        return {}
+    out = {}
+    for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("TargetMode") == "External":
+            continue
+        target = rel.get("Target", "")
+        if target.startswith("/"):
+            member = target.lstrip("/")
+        else:
+            member = posixpath.normpath(posixpath.join("word", target))
+        out[rel.get("Id")] = member
+    return out
+
+
+def _drawings(p) -> list[tuple[str, int | None, int | None]]:
+    """(rId, cx, cy) for every inline/anchored picture in a paragraph."""
+    out = []
+    for blip in p.iter(f"{{{A_NS}}}blip"):
+        rid = blip.get(f"{{{R_NS}}}embed")
+        if not rid:
+            continue
+        cx = cy = None
+        node = blip.getparent()
+        while node is not None and node.tag not in (f"{{{WP_NS}}}inline", f"{{{WP_NS}}}anchor"):
+            node = node.getparent()
+        if node is not None:
+            ext = node.find(f"{{{WP_NS}}}extent")
+            if ext is not None:
+                cx, cy = int(ext.get("cx")), int(ext.get("cy"))
+        out.append((rid, cx, cy))
+    return out
+
+
+def extract_figures(source) -> dict[str, list[ExistingFigure]]:
+    """
+    Figures (image + caption) per section of an existing report, keyed by
+    FIGURE_SECTIONS prefix ("sequence", "damages", ...).
+
+    A caption "Figure N. <label> – <text>" decides the section; uncaptioned
+    pictures go to the section whose heading they follow (pictures before the
+    first figure section count towards it).
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+
+    by_heading = {h: key for h, _, key in FIGURE_SECTIONS}
+    by_label = {label: key for _, label, key in FIGURE_SECTIONS}
+    found: list[tuple[str, str, int | None, int | None, str]] = []  # (key, rId, cx, cy, caption)
+
+    with zipfile.ZipFile(source) as zf:
+        rels = _document_rels(zf)
+
+        section = FIGURE_SECTIONS[0][2]
+        pending: list[tuple[str, int | None, int | None]] = []
+
+        def flush(caption: str = "", key: str | None = None):
+            for rid, cx, cy in pending:
+                found.append((key or section, rid, cx, cy, caption))
+            pending.clear()
+
+        with zf.open("word/document.xml") as xml:
+            for _, el in etree.iterparse(xml, events=("end",), tag=(W_P, W_TBL), huge_tree=True):
+                parent = el.getparent()
+                if parent is None or parent.tag != W_BODY:
+                    continue
+
+                if el.tag == W_P:
+                    pics = _drawings(el)
+                    if pics:
+                        flush()
+                        pending.extend(pics)
+                    else:
+                        text = _paragraph_text(el).strip()
+                        m = _CAPTION_RE.match(text)
+                        if pending and m:
+                            # only the last picture before a caption is captioned by it
+                            last = pending.pop()
+                            flush()
+                            pending.append(last)
+                            flush(m.group("caption").strip(), by_label.get(m.group("label").strip()))
+                        else:
+                            flush()
+                            if text in by_heading:
+                                section = by_heading[text]
+                else:
+                    flush()
+
+                el.clear()
+                while el.getprevious() is not None:
+                    del parent[0]
+        flush()
+
+        out: dict[str, list[ExistingFigure]] = {key: [] for _, _, key in FIGURE_SECTIONS}
+        for key, rid, cx, cy, caption in found:
+            member = rels.get(rid)
+            if not member:
+                continue
+            try:
+                data = zf.read(member)
+            except KeyError:
+                continue
+            out[key].append(ExistingFigure(posixpath.basename(member), data, caption, cx, cy))
+    return out
@@ -1,13 +1,23 @@
 import os
 import time
+import requests
 import streamlit as st
 import msal
 
+import flow_store
+import msal_cache
+import tracing
+
 DEFAULT_SCOPES_READONLY = ["User.Read", "Sites.Read.All"]
 DEFAULT_SCOPES_WRITE = ["User.Read", "Sites.ReadWrite.All"]
 
 _STATE_QP_KEY = "ms_state"
 
+# Tokens with more than this many seconds left are used as-is; below it we ask
+# MSAL (which refreshes at 5 minutes) and only send the user to Sign In if
+# the refresh token itself no longer works.
+TOKEN_MIN_TTL = 300
+
 
 def _cfg() -> dict:
     s = st.secrets.get("ms_graph", {})
@@ -26,6 +36,9 @@ def _cfg() -> dict:
         "client_secret": client_secret,
         "redirect_uri": redirect_uri,
         "authority": authority or "",
+        # Optional encrypted on-disk token cache (Fernet key, e.g. Fernet.generate_key())
+        "token_cache_dir": s.get("token_cache_dir") or os.getenv("MS_TOKEN_CACHE_DIR", ""),
+        "token_cache_key": s.get("token_cache_key") or os.getenv("MS_TOKEN_CACHE_KEY", ""),
     }
 
 
@@ -38,23 +51,75 @@ def _require_cfg() -> dict:
     return cfg
 
 
+@st.cache_resource
+def _msal_http() -> tuple[requests.Session, dict]:
+    # Shared by every MSAL app in the process: pooled connections, and the
+    # authority/instance discovery responses are fetched once, not per app.
+    return requests.Session(), {}
+
+
+def _build_app(client_id: str, client_secret: str, authority: str, cache=None) -> msal.ConfidentialClientApplication:
+    http_client, http_cache = _msal_http()
+    return msal.ConfidentialClientApplication(
+        client_id=client_id,
+        client_credential=client_secret,
+        authority=authority,
+        token_cache=cache,
+        http_client=http_client,
+        http_cache=http_cache,
+    )
+
+
+@st.cache_resource
+def _cached_app(client_id: str, client_secret: str, authority: str) -> msal.ConfidentialClientApplication:
+    return _build_app(client_id, client_secret, authority)
+
+
 def _msal_app() -> msal.ConfidentialClientApplication:
+    """Process-wide app used to start auth code flows (holds no user tokens)."""
     cfg = _require_cfg()
-    return msal.ConfidentialClientApplication(
-        client_id=cfg["client_id"],
-        client_credential=cfg["client_secret"],
-        authority=cfg["authority"],
+    return _cached_app(cfg["client_id"], cfg["client_secret"], cfg["authority"])
+
+
+@st.cache_resource
+def _cached_registry(client_id: str, client_secret: str, authority: str,
+                     cache_dir: str, cache_key: str) -> msal_cache.TokenCacheRegistry:
+    disk = msal_cache.DiskStore(cache_dir, cache_key) if cache_dir and cache_key else None
+    return msal_cache.TokenCacheRegistry(
+        lambda cache: _build_app(client_id, client_secret, authority, cache),
+        disk=disk,
+    )
+
+
+def _token_registry() -> msal_cache.TokenCacheRegistry:
+    cfg = _require_cfg()
+    return _cached_registry(
+        cfg["client_id"], cfg["client_secret"], cfg["authority"],
+        cfg["token_cache_dir"], cfg["token_cache_key"],
     )
 
 
 @st.cache_resource
-def _flow_store():
-    # dict[state] = flow
-    return {}
+def _cached_flow_store(backend: str, path: str, ttl: float, max_entries: int) -> flow_store.FlowStore:
+    return flow_store.make_flow_store(backend, path, ttl=ttl, max_entries=max_entries)
+
+
+def _flow_store() -> flow_store.FlowStore:
+    """
+    Pending auth flows by state. Use flow_store = "sqlite" (+ flow_store_path on a
+    volume every replica can see) when callbacks may hit a different replica.
+    """
+    s = st.secrets.get("ms_graph", {})
+    return _cached_flow_store(
+        s.get("flow_store") or os.getenv("MS_FLOW_STORE", "memory"),
+        s.get("flow_store_path") or os.getenv("MS_FLOW_STORE_PATH", ".cache/auth_flows.sqlite"),
+        float(s.get("flow_ttl_seconds", flow_store.DEFAULT_TTL)),
+        int(s.get("flow_max_entries", flow_store.DEFAULT_MAX_ENTRIES)),
+    )
 
 
 def _reset_login_state(clear_url: bool = True) -> None:
-    for k in ["ms_token", "ms_scopes"]:
+    for k in ["ms_token", "ms_scopes", "ms_account", "ms_username"]:
         st.session_state.pop(k, None)
 
     if clear_url:
@@ -65,6 +130,9 @@ def _reset_login_state(clear_url: bool = True) -> None:
 
 
 def logout() -> None:
+    account_id = st.session_state.get("ms_account")
+    if account_id:
+        _token_registry().remove(account_id)
     _reset_login_state(clear_url=True)
     st.rerun()
 
@@ -75,13 +143,13 @@ def _start_flow(app: msal.ConfidentialClientApplication, scopes: list[str]) -> t
     and return (auth_url, state).
     """
     cfg = _require_cfg()
-    flow = app.initiate_auth_code_flow(scopes=scopes, redirect_uri=cfg["redirect_uri"])
+    with tracing.span("msal.initiate_flow"):
+        flow = app.initiate_auth_code_flow(scopes=scopes, redirect_uri=cfg["redirect_uri"])
     state = flow.get("state")
     if not state:
         raise RuntimeError("MSAL did not return a state value.")
 
-    store = _flow_store()
-    store[state] = flow
+    _flow_store().put(state, flow)
 
     # Put only the state in the URL (small, safe)
     try:
@@ -123,20 +191,30 @@ def login_ui(scopes: list[str] | None = None) -> None:
 
         if not state or not flow:
             # This happens when the browser returns from Microsoft, but the Streamlit
-            # server lost the cached flow/state (restart, cache eviction, etc.).
+            # server lost the flow/state (restart, expired after flow_ttl_seconds, or a
+            # different replica answered without a shared flow store).
             st.warning("Login session expired. Please click **Sign In** again.")
             _reset_login_state(clear_url=True)
             # After clearing query params, fall through to show Sign In button.
         else:
             auth_response = {k: qp.get(k) for k in qp.keys()}
+            # Redeem into a fresh per-user cache so the refresh token stays with this account
+            registry = _token_registry()
+            user_cache, user_app = registry.new_cache()
             try:
-                result = app.acquire_token_by_auth_code_flow(flow, auth_response)
+                with tracing.span("msal.redeem_code"):
+                    result = user_app.acquire_token_by_auth_code_flow(flow, auth_response)
             except ValueError as e:
                 st.error(f"Login failed: {e}")
                 return
 
             if "access_token" in result:
+                # single-use: the auth code in this flow has been redeemed
+                store.pop(state)
+                result["expires_at"] = int(time.time()) + int(result.get("expires_in", 3599))
                 st.session_state["ms_token"] = result
+                st.session_state["ms_account"] = registry.register(user_cache, user_app, scopes)
+                st.session_state["ms_username"] = (result.get("id_token_claims") or {}).get("preferred_username", "")
                 try:
                     st.query_params.clear()
                 except Exception:
@@ -164,8 +242,56 @@ def get_access_token() -> str | None:
         token["expires_at"] = int(time.time()) + int(expires_in)
         expires_at = token["expires_at"]
 
+    if int(expires_at) - int(time.time()) > TOKEN_MIN_TTL:
+        return token.get("access_token")
+
+    # Close to expiry: the background refresher has usually renewed it already,
+    # so this is a cache lookup; otherwise MSAL redeems the refresh token here.
+    account_id = st.session_state.get("ms_account")
+    scopes = st.session_state.get("ms_scopes") or DEFAULT_SCOPES_READONLY
+    result = _token_registry().acquire(account_id, scopes) if account_id else None
+    if result:
+        st.session_state["ms_token"] = result
+        return result["access_token"]
+
     if int(expires_at) - int(time.time()) < 120:
         _reset_login_state(clear_url=True)
         st.rerun()
 
     return token.get("access_token")
+
+
+def current_account() -> str | None:
+    """home_account_id of the signed-in user (None before sign in)."""
+    return st.session_state.get("ms_account")
+
+
+def current_username() -> str:
+    """Sign-in name (UPN) of the signed-in user from the ID token ("" before sign in)."""
+    return st.session_state.get("ms_username", "")
+
+
+def is_admin() -> bool:
+    """
+    Signed-in user is listed in secrets [admin] users (or IR_ADMINS, comma
+    separated). Nobody is an admin when the list is empty.
+    """
+    users = st.secrets.get("admin", {}).get("users") or os.getenv("IR_ADMINS", "").split(",")
+    allowed = {u.strip().lower() for u in users if u.strip()}
+    return bool(allowed) and current_username().lower() in allowed
+
+
+def background_token_source(scopes: list[str] | None = None):
+    """
+    Callable account_id -> access token (or None) for worker threads, which
+    have no session state. Goes through the per-user MSAL caches, so it keeps
+    working after the page is closed and, with token_cache_dir, after a restart.
+    """
+    registry = _token_registry()
+    scopes = list(scopes or DEFAULT_SCOPES_READONLY)
+
+    def _token(account_id: str) -> str | None:
+        result = registry.acquire(account_id, scopes) if account_id else None
+        return result["access_token"] if result else None
+
+    return _token
@@ -0,0 +1,213 @@
+"""
+Per-user MSAL token caches, kept warm in the background.
+
+Each signed-in account gets a SerializableTokenCache and a lightweight
+ConfidentialClientApplication bound to it. A daemon thread calls
+acquire_token_silent for active accounts every REFRESH_INTERVAL seconds; MSAL
+redeems the refresh token once the access token is within 5 minutes of
+expiry, so reruns normally find a fresh token in memory.
+
+When a disk directory and a Fernet key are configured, caches are also
+written to <dir>/<sha256(account)>.bin encrypted, so idle accounts evicted
+from memory (or a restarted process) can be restored without a new sign-in.
+Nothing is written to disk unencrypted.
+"""
+import hashlib
+import os
+import threading
+import time
+
+import msal
+from cryptography.fernet import Fernet  # installed with msal
+
+import tracing
+
+REFRESH_INTERVAL = 60.0
+# accounts not used for this long stop being refreshed and leave memory
+IDLE_TIMEOUT = 8 * 3600
+
+
+class DiskStore:
+    """Fernet-encrypted token cache blobs, one file per account."""
+
+    def __init__(self, directory: str, key: str):
+        self.directory = directory
+        self._fernet = Fernet(key.encode() if isinstance(key, str) else key)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, account_id: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(account_id.encode()).hexdigest() + ".bin")
+
+    def load(self, account_id: str) -> str | None:
+        try:
+            with open(self._path(account_id), "rb") as f:
+                return self._fernet.decrypt(f.read()).decode()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # wrong key / corrupt file: treat as absent, the user signs in again
+            return None
+
+    def save(self, account_id: str, blob: str) -> None:
+        path = self._path(account_id)
+        tmp = path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self._fernet.encrypt(blob.encode()))
+        os.replace(tmp, path)
+
+    def delete(self, account_id: str) -> None:
+        try:
+            os.remove(self._path(account_id))
+        except FileNotFoundError:
+            pass
+
+
+class UserSession:
+    """One account's token cache and the MSAL app that reads/writes it."""
+
+    def __init__(self, account_id: str, app: msal.ConfidentialClientApplication,
+                 cache: msal.SerializableTokenCache, scopes: list[str]):
+        self.account_id = account_id
+        self.app = app
+        self.cache = cache
+        self.scopes = list(scopes)
+        self.last_seen = time.time()
+        self.lock = threading.Lock()
+
+    def acquire_silent(self, scopes: list[str] | None = None) -> dict | None:
+        """Cached token, refreshed by MSAL when close to expiry. None if refresh is impossible."""
+        scopes = list(scopes or self.scopes)
+        with tracing.span("msal.acquire_silent") as sp, self.lock:
+            account = next(
+                (a for a in self.app.get_accounts() if a.get("home_account_id") == self.account_id),
+                None,
+            )
+            if not account:
+                return None
+            result = self.app.acquire_token_silent(scopes, account=account)
+            sp.set(ok=bool(result and "access_token" in result))
+        if result and "access_token" in result:
+            result.setdefault("expires_at", int(time.time()) + int(result.get("expires_in", 0)))
+            return result
+        return None
+
+
+class TokenCacheRegistry:
+    """
+    Process-wide map of account id -> UserSession.
+    app_factory(cache) must return a ConfidentialClientApplication using that cache.
+    """
+
+    def __init__(self, app_factory, disk: DiskStore | None = None,
+                 refresh_interval: float = REFRESH_INTERVAL, idle_timeout: float = IDLE_TIMEOUT):
+        self._app_factory = app_factory
+        self.disk = disk
+        self.refresh_interval = refresh_interval
+        self.idle_timeout = idle_timeout
+        self._sessions: dict[str, UserSession] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.stats = {"refresh_runs": 0, "refresh_failures": 0, "restored_from_disk": 0}
+
+    # ---------------------------
+    # sessions
+    # ---------------------------
+    def new_cache(self) -> tuple[msal.SerializableTokenCache, msal.ConfidentialClientApplication]:
+        """Empty cache + app, used to redeem an auth code before the account is known."""
+        cache = msal.SerializableTokenCache()
+        return cache, self._app_factory(cache)
+
+    def register(self, cache: msal.SerializableTokenCache, app: msal.ConfidentialClientApplication,
+                 scopes: list[str]) -> str | None:
+        """Adopt a cache that now holds a signed-in account. Returns its home_account_id."""
+        accounts = app.get_accounts()
+        if not accounts:
+            return None
+        account_id = accounts[0]["home_account_id"]
+        sess = UserSession(account_id, app, cache, scopes)
+        with self._lock:
+            self._sessions[account_id] = sess
+        self._persist(sess)
+        self._ensure_refresher()
+        return account_id
+
+    def get(self, account_id: str, scopes: list[str] | None = None) -> UserSession | None:
+        with self._lock:
+            sess = self._sessions.get(account_id)
+        if sess is None and self.disk is not None:
+            blob = self.disk.load(account_id)
+            if blob:
+                cache = msal.SerializableTokenCache()
+                cache.deserialize(blob)
+                sess = UserSession(account_id, self._app_factory(cache), cache, scopes or [])
+                with self._lock:
+                    sess = self._sessions.setdefault(account_id, sess)
+                self.stats["restored_from_disk"] += 1
+                self._ensure_refresher()
+        if sess is not None:
+            sess.last_seen = time.time()
+            if scopes:
+                sess.scopes = list(scopes)
+        return sess
+
+    def acquire(self, account_id: str, scopes: list[str]) -> dict | None:
+        sess = self.get(account_id, scopes)
+        if sess is None:
+            return None
+        result = sess.acquire_silent(scopes)
+        self._persist(sess)
+        return result
+
+    def remove(self, account_id: str) -> None:
+        with self._lock:
+            sess = self._sessions.pop(account_id, None)
+        if sess is not None:
+            with sess.lock:
+                for a in sess.app.get_accounts():
+                    sess.app.remove_account(a)
+        if self.disk is not None:
+            self.disk.delete(account_id)
+
+    def _persist(self, sess: UserSession) -> None:
+        if self.disk is not None and sess.cache.has_state_changed:
+            with sess.lock:
+                self.disk.save(sess.account_id, sess.cache.serialize())
+                sess.cache.has_state_changed = False
+
+    # ---------------------------
+    # background refresh
+    # ---------------------------
+    def _ensure_refresher(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="msal-token-refresh", daemon=True)
+            self._thread.start()
+
+    def refresh_once(self) -> None:
+        """Refresh every active account's token if it is close to expiry; drop idle ones."""
+        now = time.time()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        for sess in sessions:
+            if now - sess.last_seen > self.idle_timeout:
+                with self._lock:
+                    self._sessions.pop(sess.account_id, None)
+                continue
+            try:
+                if sess.acquire_silent() is None:
+                    self.stats["refresh_failures"] += 1
+                self._persist(sess)
+            except Exception:
+                self.stats["refresh_failures"] += 1
+        self.stats["refresh_runs"] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_once()
+
+    def stop(self) -> None:
+        self._stop.set()
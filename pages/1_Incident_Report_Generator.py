@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-import runpy
 from pathlib import Path
 import streamlit as st
 import ms_graph
+import IR_gen
+import rerun_profiler
 
 APP_TITLE = "Incident Report Generator"
 LOGO_BASENAME = "PhilSA_v4-01"
@@ -72,8 +73,11 @@ def main():
 
     st.divider()
 
-    # IMPORTANT: do NOT `import IR_gen` (it gets cached and becomes blank on reruns)
-    runpy.run_path(str(ROOT / "IR_gen.py"), run_name="__main__")
+    # Shown above the form: render() may end the run early via st.stop()/st.rerun()
+    rerun_profiler.admin_expander()
+
+    # IR_gen is imported once per process; render() draws the page on every rerun
+    rerun_profiler.run(IR_gen.render, page="ir_generator")
 
 
 if __name__ == "__main__":
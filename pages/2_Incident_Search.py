@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from pathlib import Path
+import streamlit as st
+import ms_graph
+import IR_gen
+import ir_index
+import sp_folder_graph as spg
+
+APP_TITLE = "Incident Search"
+LOGO_BASENAME = "PhilSA_v4-01"
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+st.set_page_config(
+    page_title=APP_TITLE,
+    layout="wide",
+    initial_sidebar_state="collapsed",
+)
+
+# Hide Streamlit header so it never overlaps your logo
+st.markdown(
+    """
+    <style>
+      header[data-testid="stHeader"] { display: none; }
+      div[data-testid="stToolbar"] { display: none; }
+      #MainMenu { visibility: hidden; }
+      footer { visibility: hidden; }
+
+      .block-container { padding-top: 1.3rem; }
+    </style>
+    """,
+    unsafe_allow_html=True,
+)
+
+
+def _find_logo_path() -> Path | None:
+    gfx = ROOT / "graphics"
+    for ext in [".png", ".jpg", ".jpeg", ".webp"]:
+        p = gfx / f"{LOGO_BASENAME}{ext}"
+        if p.exists():
+            return p
+    for p in gfx.glob(f"{LOGO_BASENAME}*"):
+        if p.is_file():
+            return p
+    return None
+
+
+def render_logo_header():
+    """Universal logo header. Everything else goes below."""
+    logo_path = _find_logo_path()
+    if logo_path:
+        st.image(str(logo_path), width=120)
+    st.divider()
+
+
+def _drive_id(token: str, cfg: dict) -> str:
+    # same session keys as the Incident Report Generator, so either page resolves once
+    if "sp_site_id" not in st.session_state or "sp_drive_id" not in st.session_state:
+        with st.spinner("Resolving SharePoint site/drive..."):
+            st.session_state["sp_site_id"] = spg.resolve_site_id(token, cfg["site_url"])
+            st.session_state["sp_drive_id"] = spg.get_default_drive_id(token, st.session_state["sp_site_id"])
+    return st.session_state["sp_drive_id"]
+
+
+def update_index_ui(token: str, cfg: dict) -> None:
+    drive_id = _drive_id(token, cfg)
+    bar = st.progress(0.0, text="Listing reports...")
+
+    def _progress(done: int, total: int) -> None:
+        bar.progress(done / max(total, 1), text=f"Indexing {done}/{total}")
+
+    res = ir_index.update_index(token, drive_id, cfg["root_path"], cfg["search_index_path"], progress=_progress)
+    bar.empty()
+    st.success(
+        f"Index updated in {res['seconds']} s: {res['indexed']} indexed, "
+        f"{res['unchanged']} unchanged, {res['removed']} removed."
+    )
+    if res["failed"]:
+        with st.expander(f"{len(res['failed'])} file(s) could not be indexed"):
+            for path, err in res["failed"]:
+                st.write(f"- `{path}`: {err}")
+
+
+def render_hit(hit: dict) -> None:
+    f = hit["fields"]
+    title = hit["incident_no"] or hit["name"]
+    with st.expander(f"{title} — {f.get('nature', '')[:90]}"):
+        st.caption(f"{hit['path']}  ·  score {hit['score']:.2f}")
+        st.markdown(hit["snippet"])
+        c = st.columns(3)
+        c[0].write(f"**Incident date:** {f.get('incident_date', '')} {f.get('incident_time', '')}")
+        c[1].write(f"**Location:** {f.get('location', '')}")
+        c[2].write(f"**Status:** {f.get('current_status', '')}")
+        st.write(f"**Reported by:** {f.get('reported_by', '')} ({f.get('position', '')})")
+
+
+def main():
+    # Must be logged in; otherwise go back to login/home
+    token = ms_graph.get_access_token()
+    if not token:
+        st.switch_page("app.py")
+
+    render_logo_header()
+
+    st.markdown(f"## {APP_TITLE}")
+
+    nav = st.columns([0.22, 0.14, 0.64])
+    with nav[0]:
+        if st.button("← Back to Home", use_container_width=True):
+            st.switch_page("app.py")
+    with nav[1]:
+        if st.button("Logout", use_container_width=True):
+            ms_graph.logout()
+
+    st.divider()
+
+    cfg = IR_gen._sharepoint_config()
+    if not cfg["site_url"]:
+        st.error("Missing sharepoint.site_url in Streamlit secrets.")
+        st.stop()
+
+    stats = ir_index.index_stats(cfg["search_index_path"])
+    head = st.columns([0.75, 0.25])
+    with head[0]:
+        last = stats["last_indexed_at"]
+        when = datetime.fromtimestamp(last).strftime("%Y-%m-%d %H:%M") if last else "never"
+        st.caption(f"{stats['reports']} report(s) indexed · last update {when}")
+    with head[1]:
+        if st.button("Update index", use_container_width=True):
+            update_index_ui(token, cfg)
+
+    q = st.text_input("Search incident reports", placeholder="e.g. antenna tracking, ACU fault, 2025-IR-003")
+    if not q.strip():
+        return
+
+    t0 = time.perf_counter()
+    hits = ir_index.search(cfg["search_index_path"], q)
+    ms = (time.perf_counter() - t0) * 1000
+
+    st.caption(f"{len(hits)} result(s) in {ms:.0f} ms")
+    for hit in hits:
+        render_hit(hit)
+
+
+if __name__ == "__main__":
+    main()
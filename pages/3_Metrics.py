@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+import ms_graph
+import sp_folder_graph as spg
+import tracing
+
+APP_TITLE = "Metrics"
+LOGO_BASENAME = "PhilSA_v4-01"
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEFAULT_OTLP_EXPORT_PATH = ".cache/traces.otlp.jsonl"
+
+
+st.set_page_config(
+    page_title=APP_TITLE,
+    layout="wide",
+    initial_sidebar_state="collapsed",
+)
+
+# Hide Streamlit header so it never overlaps your logo
+st.markdown(
+    """
+    <style>
+      header[data-testid="stHeader"] { display: none; }
+      div[data-testid="stToolbar"] { display: none; }
+      #MainMenu { visibility: hidden; }
+      footer { visibility: hidden; }
+
+      .block-container { padding-top: 1.3rem; }
+    </style>
+    """,
+    unsafe_allow_html=True,
+)
+
+
+def _find_logo_path() -> Path | None:
+    gfx = ROOT / "graphics"
+    for ext in [".png", ".jpg", ".jpeg", ".webp"]:
+        p = gfx / f"{LOGO_BASENAME}{ext}"
+        if p.exists():
+            return p
+    for p in gfx.glob(f"{LOGO_BASENAME}*"):
+        if p.is_file():
+            return p
+    return None
+
+
+def render_logo_header():
+    """Universal logo header. Everything else goes below."""
+    logo_path = _find_logo_path()
+    if logo_path:
+        st.image(str(logo_path), width=120)
+    st.divider()
+
+
+def _trace_label(spans: list[dict]) -> str:
+    root = next((s for s in spans if not s["parent_id"]), spans[0])
+    total = (max(s["end_ns"] for s in spans) - min(s["start_ns"] for s in spans)) / 1e6
+    errors = sum(1 for s in spans if s["error"])
+    return f"{root['name']} · {total:.0f} ms · {len(spans)} spans" + (f" · {errors} error(s)" if errors else "")
+
+
+def _span_label(s: dict) -> str:
+    a = s["attrs"]
+    if "http.endpoint" in a:
+        return f"{a.get('http.method', '')} {a['http.endpoint']} → {a.get('http.status', '?')}"
+    return s["name"]
+
+
+def render_waterfall(spans: list[dict]) -> None:
+    t0 = min(s["start_ns"] for s in spans)
+    depth = {}
+    for s in spans:
+        depth[s["span_id"]] = depth.get(s["parent_id"], -1) + 1
+    df = pd.DataFrame([
+        {
+            "#": i,
+            "span": f"{'  ' * depth[s['span_id']]}{_span_label(s)}",
+            "start_ms": (s["start_ns"] - t0) / 1e6,
+            "end_ms": (s["end_ns"] - t0) / 1e6,
+            "duration_ms": round(s["duration_ms"], 1),
+            "status": "error" if s["error"] else "ok",
+            "attrs": json.dumps(s["attrs"], default=str),
+        }
+        for i, s in enumerate(spans)
+    ])
+    chart = (
+        alt.Chart(df)
+        .mark_bar()
+        .encode(
+            x=alt.X("start_ms:Q", title="ms"),
+            x2="end_ms:Q",
+            y=alt.Y("span:N", sort=alt.EncodingSortField("#"), title=None),
+            color=alt.Color("status:N", scale=alt.Scale(domain=["ok", "error"], range=["#4c78a8", "#e45756"]), legend=None),
+            tooltip=["span", "duration_ms", "attrs"],
+        )
+        .properties(height=max(60, 22 * len(df)))
+    )
+    st.altair_chart(chart, use_container_width=True)
+
+
+def main():
+    # Must be logged in; otherwise go back to login/home
+    if not ms_graph.get_access_token():
+        st.switch_page("app.py")
+
+    render_logo_header()
+
+    st.markdown(f"## {APP_TITLE}")
+
+    # tracing is process-wide and spans cover every session's requests
+    if not ms_graph.is_admin():
+        st.error("This page is limited to the admins listed in [admin] users.")
+        st.stop()
+
+    otlp_path = st.secrets.get("tracing", {}).get("otlp_path", DEFAULT_OTLP_EXPORT_PATH)
+
+    nav = st.columns([0.22, 0.14, 0.64])
+    with nav[0]:
+        if st.button("← Back to Home", use_container_width=True):
+            st.switch_page("app.py")
+    with nav[1]:
+        if st.button("Logout", use_container_width=True):
+            ms_graph.logout()
+
+    st.divider()
+
+    on = st.toggle("Tracing enabled (this server process)", value=tracing.enabled())
+    if on != tracing.enabled():
+        tracing.enable(on)
+        st.rerun()
+
+    c = st.columns(3)
+    with c[0]:
+        if st.button("Clear recorded spans", use_container_width=True):
+            tracing.clear()
+    with c[1]:
+        if st.button("Export OTLP JSON", use_container_width=True):
+            n = tracing.export_otlp_json(otlp_path)
+            st.success(f"Appended {n} spans to {otlp_path}")
+    with c[2]:
+        st.download_button(
+            "Download Prometheus text",
+            data=tracing.prometheus_text(),
+            file_name="metrics.prom",
+            mime="text/plain",
+            use_container_width=True,
+        )
+
+    st.subheader("Graph client")
+    st.json({"http": spg.http_stats(), "cache": spg.cache_stats()}, expanded=False)
+
+    st.subheader("Recent traces")
+    traces = tracing.recent_traces(limit=st.slider("Traces", 5, 100, 20))
+    if not traces:
+        st.info("No spans recorded yet." if tracing.enabled() else "Tracing is off. Turn it on above, then use the tools.")
+    for spans in traces:
+        with st.expander(_trace_label(spans)):
+            render_waterfall(spans)
+
+    with st.expander("Prometheus text"):
+        st.code(tracing.prometheus_text(), language="text")
+
+
+if __name__ == "__main__":
+    main()
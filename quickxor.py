@@ -0,0 +1,55 @@
+"""
+QuickXorHash, the content hash OneDrive for Business / SharePoint report in
+driveItem.file.hashes.quickXorHash.
+
+Each input byte i is XORed into a 160-bit register rotated left by
+(11 * i) mod 160 bits; the total length is XORed into the top 64 bits and
+the 20 little-endian bytes are base64 encoded. Bytes whose positions are
+congruent mod 160 land on the same rotation, so a chunk is folded with numpy
+into 160 XOR sums and only those are rotated in Python.
+"""
+import base64
+
+import numpy as np
+
+WIDTH_BITS = 160
+SHIFT = 11
+_MASK = (1 << WIDTH_BITS) - 1
+
+
+class QuickXorHash:
+    """hashlib-style incremental hasher: update(data) ... b64digest()."""
+
+    name = "quickXorHash"
+
+    def __init__(self, data: bytes = b""):
+        self._cells = np.zeros(WIDTH_BITS, dtype=np.uint8)  # XOR of the bytes at each position mod 160
+        self._length = 0
+        if data:
+            self.update(data)
+
+    def update(self, data) -> None:
+        n = len(data)
+        if not n:
+            return
+        offset = self._length % WIDTH_BITS
+        padded = np.zeros(-(-(offset + n) // WIDTH_BITS) * WIDTH_BITS, dtype=np.uint8)
+        padded[offset:offset + n] = np.frombuffer(data, dtype=np.uint8)
+        self._cells ^= np.bitwise_xor.reduce(padded.reshape(-1, WIDTH_BITS), axis=0)
+        self._length += n
+
+    def digest(self) -> bytes:
+        value = 0
+        for pos, byte in enumerate(self._cells.tolist()):
+            if byte:
+                s = (pos * SHIFT) % WIDTH_BITS
+                value ^= ((byte << s) | (byte >> (WIDTH_BITS - s))) & _MASK
+        value ^= self._length << (WIDTH_BITS - 64)
+        return (value & _MASK).to_bytes(WIDTH_BITS // 8, "little")
+
+    def b64digest(self) -> str:
+        return base64.b64encode(self.digest()).decode("ascii")
+
+
+def quickxor_b64(data: bytes) -> str:
+    return QuickXorHash(data).b64digest()
@@ -0,0 +1,198 @@
+"""
+On-demand profiling of Streamlit page reruns.
+
+The page script wraps its render call:
+
+    rerun_profiler.run(IR_gen.render, page="ir_generator")
+    rerun_profiler.admin_expander()
+
+Off unless IR_PROFILE is set (1 / cprofile / sample) or secrets
+[profiling] enabled = true. When on, every rerun is profiled with
+pyinstrument (a sampling profiler) if it is installed and mode allows it,
+otherwise cProfile. Profiles go to [profiling] dir (IR_PROFILE_DIR,
+default .cache/profiles) as
+
+    <utc time>_<page>_<session>_<action>.prof   (cProfile, pstats format)
+    <utc time>_<page>_<session>_<action>.html   (pyinstrument flame view)
+
+keeping the newest `keep` files. <action> is the widget keys whose values
+changed since the session's previous rerun (e.g. "serial_raw", "ir_form"),
+or "load" for the first one. cProfile also yields the hot-function table
+shown by admin_expander().
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from importlib.util import find_spec
+
+import streamlit as st
+
+DEFAULT_DIR = ".cache/profiles"
+DEFAULT_KEEP = 200
+TOP_FUNCTIONS = 25
+
+# cProfile (3.12+ sys.monitoring) allows one active profiler per process;
+# a rerun that finds it busy simply runs unprofiled.
+_busy = threading.Lock()
+
+
+def _config() -> dict:
+    s = st.secrets.get("profiling", {})
+    env = os.getenv("IR_PROFILE", "").lower()
+    mode = env or ("auto" if s.get("enabled") else "")
+    if mode in ("", "0", "false", "no", "off"):
+        mode = ""
+    elif mode in ("1", "true", "yes", "on"):
+        mode = s.get("mode", "auto")
+    return {
+        "mode": mode,
+        "dir": os.getenv("IR_PROFILE_DIR") or s.get("dir", DEFAULT_DIR),
+        "keep": int(s.get("keep", DEFAULT_KEEP)),
+    }
+
+
+def enabled() -> bool:
+    return bool(_config()["mode"])
+
+
+def _session_id() -> str:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        return ctx.session_id[:8] if ctx else "nosession"
+    except Exception:
+        return "nosession"
+
+
+def _action() -> str:
+    """Widget keys whose value changed since this session's previous rerun."""
+    snap = {}
+    for k in list(st.session_state.keys()):
+        if str(k).startswith("_prof_"):
+            continue
+        try:
+            v = st.session_state[k]
+        except Exception:
+            continue
+        if isinstance(v, (str, int, float, bool)) or v is None:
+            snap[str(k)] = v
+    prev = st.session_state.get("_prof_snapshot")
+    st.session_state["_prof_snapshot"] = snap
+    if prev is None:
+        return "load"
+    changed = sorted(k for k in snap.keys() | prev.keys() if snap.get(k) != prev.get(k))
+    if not changed:
+        return "rerun"
+    tag = "+".join(changed[:3]) + (f"+{len(changed) - 3}more" if len(changed) > 3 else "")
+    return re.sub(r"[^A-Za-z0-9_+.-]", "_", tag)[:60]
+
+
+def _rotate(directory: str, keep: int) -> None:
+    files = sorted(
+        (os.path.join(directory, f) for f in os.listdir(directory) if f.endswith((".prof", ".html"))),
+        key=os.path.getmtime,
+    )
+    for path in files[:-keep] if keep > 0 else []:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _top_functions(prof: cProfile.Profile, limit: int = TOP_FUNCTIONS) -> list[dict]:
+    stats = pstats.Stats(prof)
+    rows = []
+    for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": func,
+            "where": f"{os.path.basename(filename)}:{line}",
+            "calls": nc,
+            "own ms": round(tt * 1000, 2),
+            "cumulative ms": round(ct * 1000, 2),
+        })
+    rows.sort(key=lambda r: r["own ms"], reverse=True)
+    return rows[:limit]
+
+
+def run(render, page: str = "page"):
+    """Call render(), profiled when profiling is enabled."""
+    cfg = _config()
+    if not cfg["mode"] or not _busy.acquire(blocking=False):
+        return render()
+
+    try:
+        use_sampler = cfg["mode"] in ("auto", "sample") and find_spec("pyinstrument") is not None
+        os.makedirs(cfg["dir"], exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}Z"
+        stem = f"{stamp}_{page}_{_session_id()}_{_action()}"
+        base = os.path.join(cfg["dir"], stem)
+
+        if use_sampler:
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            t0 = time.perf_counter()
+            profiler.start()
+            try:
+                return render()
+            finally:
+                # st.stop()/st.rerun() end the script with an exception; keep the profile anyway
+                profiler.stop()
+                with open(f"{base}.html", "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+                st.session_state["_prof_last"] = {
+                    "file": f"{base}.html",
+                    "seconds": time.perf_counter() - t0,
+                    "text": profiler.output_text(unicode=True, color=False),
+                }
+                _rotate(cfg["dir"], cfg["keep"])
+
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        prof.enable()
+        try:
+            return render()
+        finally:
+            prof.disable()
+            prof.dump_stats(f"{base}.prof")
+            st.session_state["_prof_last"] = {
+                "file": f"{base}.prof",
+                "seconds": time.perf_counter() - t0,
+                "top": _top_functions(prof),
+            }
+            _rotate(cfg["dir"], cfg["keep"])
+    finally:
+        _busy.release()
+
+
+def admin_expander() -> None:
+    """Hot functions of this session's last profiled rerun (nothing when profiling is off)."""
+    if not enabled():
+        return
+    last = st.session_state.get("_prof_last")
+    with st.expander("Profiler: last rerun"):
+        if not last:
+            st.caption("No profiled rerun yet in this session.")
+            return
+        st.caption(f"{last['seconds'] * 1000:.0f} ms · {last['file']}")
+        if "top" in last:
+            st.dataframe(last["top"], use_container_width=True, hide_index=True)
+            st.caption("Open the .prof with snakeviz or `python -m pstats`; flameprof turns it into a flame graph.")
+        else:
+            st.code(last["text"], language="text")
+        if os.path.exists(last["file"]):  # may have been rotated away
+            with open(last["file"], "rb") as f:
+                st.download_button("Download profile", data=f.read(), file_name=os.path.basename(last["file"]))
+
+
+def summarize(path: str, limit: int = TOP_FUNCTIONS) -> str:
+    """pstats text report of a saved .prof file (for scripts / the shell)."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats("tottime").print_stats(limit)
+    return out.getvalue()
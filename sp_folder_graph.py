@@ -1,6 +1,19 @@
+import base64
+import codecs
+import functools
+import io
+import json
+import tempfile
+from urllib.parse import quote
+
 import requests
 
-GRAPH_BASE = "https://graph.microsoft.com/v1.0"
+import graph_batch
+import graph_cache
+import graph_http
+from quickxor import QuickXorHash
+
+GRAPH_BASE = graph_http.GRAPH_BASE
 
 
 def _headers(token: str, extra: dict | None = None):
@@ -10,6 +23,77 @@ def _headers(token: str, extra: dict | None = None):
     return h
 
 
+def _http() -> graph_http.GraphClient:
+    return graph_http.get_client()
+
+
+def http_stats() -> dict:
+    """Retry / connection-reuse counters of the shared Graph client."""
+    return _http().stats()
+
+
+# ---------------------------
+# Read cache (shared by all sessions in the process)
+# ---------------------------
+# Site and drive ids practically never change; listings are kept short so
+# edits made outside this app show up quickly.
+SITE_CACHE_TTL = 24 * 3600
+LISTING_CACHE_TTL = 60
+
+
+def _cache() -> graph_cache.TTLCache:
+    return graph_cache.get_cache()
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters of the shared read cache."""
+    return _cache().stats()
+
+
+@functools.lru_cache(maxsize=256)
+def _tenant(token: str) -> str:
+    # Tenant id from the (unverified) access token, so cached entries are
+    # never shared across tenants. Opaque tokens fall back to one bucket.
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get("tid", "")
+    except Exception:
+        return ""
+
+
+def _norm_path(path: str) -> str:
+    return path.strip("/").lower()
+
+
+def _path_tag(drive_id: str, path: str) -> tuple:
+    return ("path", drive_id, _norm_path(path))
+
+
+def _item_tag(drive_id: str, item_id: str) -> tuple:
+    return ("item", drive_id, item_id)
+
+
+def invalidate_path(drive_id: str, path: str) -> None:
+    """Forget cached lookups/listings for path and each of its parents."""
+    parts = _norm_path(path).split("/")
+    _cache().invalidate_tags(*(_path_tag(drive_id, "/".join(parts[:i])) for i in range(1, len(parts) + 1)))
+
+
+def _drive_tag(drive_id: str) -> tuple:
+    return ("drive", drive_id)
+
+
+def invalidate_drive(drive_id: str) -> None:
+    """Forget every cached lookup/listing in the drive (explicit Refresh)."""
+    _cache().invalidate_tags(_drive_tag(drive_id))
+
+
+def invalidate_folder(drive_id: str, folder_item_id: str) -> None:
+    """Forget cached listings of a folder (after something was written into it)."""
+    _cache().invalidate_tags(_item_tag(drive_id, folder_item_id))
+
+
 def resolve_site_id(token: str, site_url: str) -> str:
     site_url = site_url.rstrip("/")
     if "://" in site_url:
@@ -17,78 +101,390 @@ def resolve_site_id(token: str, site_url: str) -> str:
     host, path = site_url.split("/", 1)
     path = "/" + path
 
-    url = f"{GRAPH_BASE}/sites/{host}:{path}"
-    r = requests.get(url, headers=_headers(token), timeout=60)
-    r.raise_for_status()
-    return r.json()["id"]
+    def load():
+        url = f"{GRAPH_BASE}/sites/{host}:{path}"
+        r = _http().get(url, headers=_headers(token), timeout=60)
+        r.raise_for_status()
+        return r.json()["id"]
+
+    return _cache().get_or_load(("site", _tenant(token), site_url.lower()), load, ttl=SITE_CACHE_TTL)
 
 
 def get_default_drive_id(token: str, site_id: str) -> str:
-    url = f"{GRAPH_BASE}/sites/{site_id}/drive"
-    r = requests.get(url, headers=_headers(token), timeout=60)
-    r.raise_for_status()
-    return r.json()["id"]
+    def load():
+        url = f"{GRAPH_BASE}/sites/{site_id}/drive"
+        r = _http().get(url, headers=_headers(token), timeout=60)
+        r.raise_for_status()
+        return r.json()["id"]
+
+    return _cache().get_or_load(("drive", _tenant(token), site_id), load, ttl=SITE_CACHE_TTL)
 
 
-def _item_by_path(token: str, drive_id: str, path: str):
+def _fetch_item_by_path(token: str, drive_id: str, path: str):
     path = path.strip("/")
     url = f"{GRAPH_BASE}/drives/{drive_id}/root:/{path}"
-    r = requests.get(url, headers=_headers(token), timeout=60)
+    r = _http().get(url, headers=_headers(token), timeout=60)
     if r.status_code == 404:
         return None
     r.raise_for_status()
     return r.json()
 
 
-def _children(token: str, drive_id: str, folder_item_id: str):
+def _item_by_path(token: str, drive_id: str, path: str, cached: bool = True):
+    if not cached:
+        return _fetch_item_by_path(token, drive_id, path)
+    return _cache().get_or_load(
+        ("item_by_path", _tenant(token), drive_id, _norm_path(path)),
+        lambda: _fetch_item_by_path(token, drive_id, path),
+        ttl=LISTING_CACHE_TTL,
+        tags=[_path_tag(drive_id, path), _drive_tag(drive_id)],
+    )
+
+
+# Fields the listing helpers actually read; keeps each page small.
+LIST_SELECT = "id,name,folder,file,size"
+
+
+def iter_children(
+    token: str,
+    drive_id: str,
+    folder_item_id: str,
+    select: str | None = None,
+    top: int | None = None,
+    orderby: str | None = None,
+):
+    """
+    Yield the children of a folder, following @odata.nextLink lazily.
+    Pages are only fetched as the caller consumes items, so a caller that
+    stops early (e.g. found the folder it wanted) skips the remaining pages.
+    """
+    params = {}
+    if select:
+        params["$select"] = select
+    if top:
+        params["$top"] = str(top)
+    if orderby:
+        params["$orderby"] = orderby
+
     url = f"{GRAPH_BASE}/drives/{drive_id}/items/{folder_item_id}/children"
-    r = requests.get(url, headers=_headers(token), timeout=60)
-    r.raise_for_status()
-    return r.json().get("value", [])
+    while url:
+        r = _http().get(url, headers=_headers(token), params=params or None, timeout=60)
+        r.raise_for_status()
+        body = r.json()
+        yield from body.get("value", [])
+        # nextLink already carries the query string
+        url = body.get("@odata.nextLink")
+        params = {}
 
 
-def ensure_folder(token: str, drive_id: str, parent_item_id: str, folder_name: str) -> dict:
-    kids = _children(token, drive_id, parent_item_id)
-    for k in kids:
-        if k.get("name") == folder_name and k.get("folder") is not None:
+def _children(token: str, drive_id: str, folder_item_id: str, select: str | None = None):
+    return list(iter_children(token, drive_id, folder_item_id, select=select))
+
+
+def _find_child_folder(token: str, drive_id: str, parent_item_id: str, folder_name: str) -> dict | None:
+    # SharePoint names are case-insensitive (a 409 may be for "qzn" vs "QZN")
+    want = folder_name.lower()
+    for k in iter_children(token, drive_id, parent_item_id, select=LIST_SELECT):
+        if k.get("name", "").lower() == want and k.get("folder") is not None:
             return k
+    return None
+
+
+def ensure_folder(token: str, drive_id: str, parent_item_id: str, folder_name: str) -> dict:
+    existing = _find_child_folder(token, drive_id, parent_item_id, folder_name)
+    if existing:
+        return existing
 
     url = f"{GRAPH_BASE}/drives/{drive_id}/items/{parent_item_id}/children"
     payload = {"name": folder_name, "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}
-    r = requests.post(url, headers=_headers(token, {"Content-Type": "application/json"}), json=payload, timeout=60)
+    r = _http().post(url, headers=_headers(token, {"Content-Type": "application/json"}), json=payload, timeout=60)
+    invalidate_folder(drive_id, parent_item_id)
+
+    if r.status_code == 409:
+        existing = _find_child_folder(token, drive_id, parent_item_id, folder_name)
+        if existing:
+            return existing
+
+    r.raise_for_status()
+    return r.json()
 
+
+def create_folder(token: str, drive_id: str, parent_item_id: str, folder_name: str) -> dict | None:
+    """
+    Create a folder with conflictBehavior "fail": the new folder, or None if
+    the name is already taken (409). The create is the existence check, so
+    two callers racing for the same name cannot both get it.
+    """
+    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{parent_item_id}/children"
+    payload = {"name": folder_name, "folder": {}, "@microsoft.graph.conflictBehavior": "fail"}
+    r = _http().post(url, headers=_headers(token, {"Content-Type": "application/json"}), json=payload, timeout=60)
+    invalidate_folder(drive_id, parent_item_id)
     if r.status_code == 409:
-        kids = _children(token, drive_id, parent_item_id)
-        for k in kids:
-            if k.get("name") == folder_name and k.get("folder") is not None:
-                return k
+        return None
+    r.raise_for_status()
+    return r.json()
+
+
+def delete_item(token: str, drive_id: str, item_id: str, parent_item_id: str = "", if_match: str = "") -> bool:
+    """
+    Delete a driveItem (moves it to the site recycle bin). With if_match the
+    delete only happens if the item still has that eTag (WriteConflictError
+    otherwise). Returns False if it was already gone.
+    """
+    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{item_id}"
+    r = _http().delete(url, headers=_headers(token, {"If-Match": if_match} if if_match else None), timeout=60)
+    invalidate_folder(drive_id, item_id)
+    if parent_item_id:
+        invalidate_folder(drive_id, parent_item_id)
+    if r.status_code == 404:
+        return False
+    _raise_for_write(r, "The item")
+    return True
 
+
+def get_item(token: str, drive_id: str, item_id: str, select: str | None = None) -> dict | None:
+    """Fresh (uncached) driveItem metadata, or None if the item is gone."""
+    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{item_id}"
+    r = _http().get(url, headers=_headers(token), params={"$select": select} if select else None, timeout=60)
+    if r.status_code == 404:
+        return None
     r.raise_for_status()
     return r.json()
 
 
+def quickxor_of(item: dict | None) -> str | None:
+    """The quickXorHash SharePoint reports for a driveItem (None for folders / when absent)."""
+    return (((item or {}).get("file") or {}).get("hashes") or {}).get("quickXorHash")
+
+
+class WriteConflictError(RuntimeError):
+    """A conditional write failed: the item changed since its eTag was read (HTTP 412)."""
+
+
+def _raise_for_write(r: requests.Response, what: str) -> None:
+    if r.status_code == 412:
+        raise WriteConflictError(f"{what} was changed by someone else since it was loaded")
+    r.raise_for_status()
+
+
+def _drive_path(path: str) -> str:
+    return quote(path.strip("/"), safe="/")
+
+
 def ensure_path(token: str, drive_id: str, root_path: str, parts: list[str]) -> dict:
-    root_item = _item_by_path(token, drive_id, root_path)
-    if not root_item:
-        raise RuntimeError(f"Root path not found in drive: {root_path}")
+    return ensure_path_checked(token, drive_id, root_path, parts)[0]
 
-    current = root_item
-    for name in parts:
-        current = ensure_folder(token, drive_id, current["id"], name)
-    return current
 
+def ensure_path_checked(token: str, drive_id: str, root_path: str, parts: list[str]) -> tuple[dict, bool]:
+    """
+    Make sure root_path/parts[0]/.../parts[-1] exists, in at most two $batch
+    round trips: one GET per level, then the missing levels created by path
+    as a dependsOn chain.
+
+    Returns (leaf folder item, leaf_already_existed).
+    """
+    paths = [root_path.strip("/")]
+    for name in parts:
+        paths.append(f"{paths[-1]}/{name}")
+
+    batch = graph_batch.GraphBatch(token)
+    get_ids = [batch.get(f"/drives/{drive_id}/root:/{_drive_path(p)}") for p in paths]
+    got = batch.execute()
+
+    items: list[dict | None] = []
+    for rid in get_ids:
+        res = got[rid]
+        if res.status_code == 404:
+            items.append(None)
+        else:
+            res.raise_for_status()
+            body = res.json()
+            items.append(body if body.get("folder") is not None else None)
+
+    if items[0] is None:
+        raise RuntimeError(f"Root path not found in drive: {root_path}")
+    if items[-1] is not None:
+        return items[-1], True
+
+    # Everything below the first missing level has to be created.
+    first_missing = items.index(None)
+    create = graph_batch.GraphBatch(token)
+    create_ids: dict[int, str] = {}
+    prev = None
+    for level in range(first_missing, len(paths)):
+        prev = create.post(
+            f"/drives/{drive_id}/root:/{_drive_path(paths[level - 1])}:/children",
+            {"name": parts[level - 1], "folder": {}, "@microsoft.graph.conflictBehavior": "fail"},
+            depends_on=[prev] if prev else None,
+        )
+        create_ids[level] = prev
+    created = create.execute()
+    # after the writes, so a listing loaded meanwhile is not cached with the old contents
+    invalidate_path(drive_id, paths[-1])
+    invalidate_folder(drive_id, items[first_missing - 1]["id"])
+
+    for level, rid in create_ids.items():
+        res = created[rid]
+        if res.ok:
+            items[level] = res.json()
+
+    # Parents still unresolved (409 race, 424 after a failed parent) are
+    # finished the slow way, one level at a time.
+    leaf = len(paths) - 1
+    for level in range(1, leaf):
+        if items[level] is None:
+            items[level] = ensure_folder(token, drive_id, items[level - 1]["id"], parts[level - 1])
+
+    # The leaf is the duplicate check, so it is never just adopted: a 409, or a
+    # 424 because a parent turned out to exist already, is re-run as an atomic
+    # create whose 409 means somebody else has this folder.
+    leaf_conflict = False
+    if items[leaf] is None:
+        parent_id = items[leaf - 1]["id"]
+        items[leaf] = create_folder(token, drive_id, parent_id, parts[-1])
+        if items[leaf] is None:
+            leaf_conflict = True
+            items[leaf] = _find_child_folder(token, drive_id, parent_id, parts[-1])
+            if items[leaf] is None:
+                raise RuntimeError(f"Folder {paths[-1]} exists but could not be read back")
+
+    return items[-1], leaf_conflict
+
+
+# Graph only accepts simple PUT .../content uploads up to 4 MB; above that an
+# upload session is needed, sent in chunks that are multiples of 320 KiB.
+SIMPLE_UPLOAD_LIMIT = 4 * 1024 * 1024
+UPLOAD_CHUNK_UNIT = 320 * 1024
+UPLOAD_CHUNK_SIZE = 10 * UPLOAD_CHUNK_UNIT
+
+
+def upload_file_to_folder(
+    token: str,
+    drive_id: str,
+    folder_item_id: str,
+    filename: str,
+    content_bytes: bytes,
+    content_type: str,
+    progress=None,
+    if_match: str | None = None,
+):
+    """
+    progress, if given, is called as progress(bytes_sent, total_bytes).
+    Files above SIMPLE_UPLOAD_LIMIT go through a resumable upload session.
+    if_match (an eTag) makes the write conditional: WriteConflictError if
+    the existing file no longer has that eTag.
+    """
+    if len(content_bytes) > SIMPLE_UPLOAD_LIMIT:
+        return upload_large_file(token, drive_id, folder_item_id, filename, content_bytes, progress=progress, if_match=if_match)
 
-def upload_file_to_folder(token: str, drive_id: str, folder_item_id: str, filename: str, content_bytes: bytes, content_type: str):
     url = f"{GRAPH_BASE}/drives/{drive_id}/items/{folder_item_id}:/{filename}:/content"
-    r = requests.put(url, headers=_headers(token, {"Content-Type": content_type}), data=content_bytes, timeout=120)
-    r.raise_for_status()
+    extra = {"Content-Type": content_type}
+    if if_match:
+        extra["If-Match"] = if_match
+    r = _http().put(url, headers=_headers(token, extra), data=content_bytes, timeout=120)
+    invalidate_folder(drive_id, folder_item_id)
+    _raise_for_write(r, filename)
+    if progress:
+        progress(len(content_bytes), len(content_bytes))
     return r.json()
 
 
-def check_duplicate_ir(token: str, drive_id: str, root_path: str, year: str, city: str, incident_folder_name: str) -> bool:
-    path = f"{root_path}/{year}/{city}/{incident_folder_name}"
-    item = _item_by_path(token, drive_id, path)
-    return bool(item and item.get("folder") is not None)
+def create_upload_session(
+    token: str,
+    drive_id: str,
+    folder_item_id: str,
+    filename: str,
+    conflict_behavior: str = "replace",
+    if_match: str | None = None,
+) -> dict:
+    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{folder_item_id}:/{filename}:/createUploadSession"
+    payload = {"item": {"@microsoft.graph.conflictBehavior": conflict_behavior}}
+    extra = {"Content-Type": "application/json"}
+    if if_match:
+        extra["If-Match"] = if_match
+    r = _http().post(url, headers=_headers(token, extra), json=payload, timeout=60)
+    _raise_for_write(r, filename)
+    return r.json()
+
+
+def _next_expected_offset(session_status: dict) -> int | None:
+    """First byte the server still wants, from nextExpectedRanges ("start-end" or "start-")."""
+    ranges = session_status.get("nextExpectedRanges") or []
+    if not ranges:
+        return None
+    return int(ranges[0].split("-", 1)[0])
+
+
+def upload_large_file(
+    token: str,
+    drive_id: str,
+    folder_item_id: str,
+    filename: str,
+    content_bytes: bytes,
+    progress=None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+    max_resumes: int = 5,
+    if_match: str | None = None,
+):
+    if chunk_size <= 0 or chunk_size % UPLOAD_CHUNK_UNIT:
+        raise ValueError(f"chunk_size must be a positive multiple of {UPLOAD_CHUNK_UNIT} bytes")
+
+    session = create_upload_session(token, drive_id, folder_item_id, filename, if_match=if_match)
+    invalidate_folder(drive_id, folder_item_id)
+    upload_url = session["uploadUrl"]
+    total = len(content_bytes)
+    offset = 0
+    resumes = 0
+
+    while True:
+        end = min(offset + chunk_size, total)
+        # uploadUrl is pre-authenticated; Graph rejects an Authorization header on it
+        headers = {"Content-Length": str(end - offset), "Content-Range": f"bytes {offset}-{end - 1}/{total}"}
+        try:
+            r = _http().put(upload_url, headers=headers, data=content_bytes[offset:end], timeout=120)
+        except (requests.ConnectionError, requests.Timeout):
+            r = None
+
+        if r is not None and r.status_code in (200, 201):
+            if progress:
+                progress(total, total)
+            return r.json()
+
+        if r is not None and r.status_code == 202:
+            nxt = _next_expected_offset(r.json())
+            offset = end if nxt is None else nxt
+            if progress:
+                progress(offset, total)
+            continue
+
+        # Dropped connection, 5xx, or 416 (server already has part of the range):
+        # ask the session which bytes it still needs and carry on from there.
+        if r is not None and r.status_code < 500 and r.status_code != 416:
+            # the eTag precondition is checked again when the file is committed
+            _raise_for_write(r, filename)
+        resumes += 1
+        if resumes > max_resumes:
+            if r is not None:
+                r.raise_for_status()
+            raise RuntimeError(f"Upload of {filename} did not complete after {max_resumes} resumes")
+
+        status = _http().get(upload_url, timeout=60)
+        status.raise_for_status()
+        nxt = _next_expected_offset(status.json())
+        if nxt is None:
+            # every byte arrived; only the final response was lost
+            item = _http().get(
+                f"{GRAPH_BASE}/drives/{drive_id}/items/{folder_item_id}:/{filename}",
+                headers=_headers(token),
+                timeout=60,
+            )
+            item.raise_for_status()
+            if progress:
+                progress(total, total)
+            return item.json()
+        offset = nxt
+        if progress:
+            progress(offset, total)
 
 
 # ---------------------------
@@ -103,60 +499,220 @@ def list_incident_folders(token: str, drive_id: str, base_path: str) -> list[dic
     if not folder or folder.get("folder") is None:
         raise RuntimeError(f"Folder not found: {base_path}")
 
-    kids = _children(token, drive_id, folder["id"])
-    out = []
-    for k in kids:
-        if k.get("folder") is not None:
-            out.append({"id": k["id"], "name": k["name"]})
-    # sort newest-style names last; simple alpha sort is fine
-    return sorted(out, key=lambda x: x["name"].lower())
+    def load():
+        out = []
+        for k in iter_children(token, drive_id, folder["id"], select=LIST_SELECT):
+            if k.get("folder") is not None:
+                out.append({"id": k["id"], "name": k["name"]})
+        # sort newest-style names last; simple alpha sort is fine
+        return sorted(out, key=lambda x: x["name"].lower())
+
+    out = _cache().get_or_load(
+        ("folders", _tenant(token), drive_id, folder["id"]),
+        load,
+        ttl=LISTING_CACHE_TTL,
+        tags=[_path_tag(drive_id, base_path), _item_tag(drive_id, folder["id"]), _drive_tag(drive_id)],
+    )
+    return [dict(x) for x in out]
 
 
 # ---------------------------
 # NEW: list files inside incident folder
 # ---------------------------
 def list_files(token: str, drive_id: str, folder_item_id: str) -> list[dict]:
-    kids = _children(token, drive_id, folder_item_id)
-    out = []
-    for k in kids:
-        if k.get("file") is not None:
-            out.append({
-                "id": k["id"],
-                "name": k["name"],
-                "size": k.get("size", 0),
-                "mime": k.get("file", {}).get("mimeType", ""),
-            })
-    return sorted(out, key=lambda x: x["name"].lower())
+    def load():
+        out = []
+        for k in iter_children(token, drive_id, folder_item_id, select=LIST_SELECT):
+            if k.get("file") is not None:
+                out.append({
+                    "id": k["id"],
+                    "name": k["name"],
+                    "size": k.get("size", 0),
+                    "mime": k.get("file", {}).get("mimeType", ""),
+                })
+        return sorted(out, key=lambda x: x["name"].lower())
+
+    out = _cache().get_or_load(
+        ("files", _tenant(token), drive_id, folder_item_id),
+        load,
+        ttl=LISTING_CACHE_TTL,
+        tags=[_item_tag(drive_id, folder_item_id), _drive_tag(drive_id)],
+    )
+    # callers get their own dicts; the cached list is shared across sessions
+    return [dict(x) for x in out]
+
+
+# ---------------------------
+# Downloads (streamed)
+# ---------------------------
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Default sinks keep downloads up to this size in memory, larger ones roll over to a temp file
+DOWNLOAD_SPOOL_MAX = 8 * 1024 * 1024
+DOWNLOAD_SELECT = "id,name,size,eTag,file,@microsoft.graph.downloadUrl"
+
+
+class DownloadIntegrityError(RuntimeError):
+    """Downloaded content does not match the driveItem's quickXorHash."""
+
+
+def download_file(
+    token: str,
+    drive_id: str,
+    file_item_id: str,
+    sink=None,
+    verify: bool = True,
+    progress=None,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+    max_resumes: int = 3,
+    item: dict | None = None,
+):
+    """
+    Stream a file's content into sink (a binary writable; default a
+    SpooledTemporaryFile that spills to disk past DOWNLOAD_SPOOL_MAX) without
+    ever holding the whole file in memory. Dropped transfers resume with a
+    Range request. With verify, the bytes are checked against the item's
+    quickXorHash when SharePoint reports one (DownloadIntegrityError if not).
+    progress, if given, is called as progress(bytes_received, total_bytes).
+    item: metadata already fetched with get_item(select=DOWNLOAD_SELECT), e.g.
+    to keep the eTag that matches the downloaded content.
+    Returns the sink, rewound to where writing started if it is seekable.
+    """
+    meta = item
+    if meta is None:
+        meta = get_item(token, drive_id, file_item_id, select=DOWNLOAD_SELECT)
+        if meta is None:
+            raise RuntimeError(f"File not found: {file_item_id}")
+    total = meta.get("size")
+    expected = quickxor_of(meta) if verify else None
+
+    # downloadUrl is pre-authenticated and skips the /content redirect; it must not get the bearer token
+    url = meta.get("@microsoft.graph.downloadUrl")
+    headers = {}
+    if not url:
+        url = f"{GRAPH_BASE}/drives/{drive_id}/items/{file_item_id}/content"
+        headers = _headers(token)
+
+    own_sink = sink is None
+    if own_sink:
+        sink = tempfile.SpooledTemporaryFile(max_size=DOWNLOAD_SPOOL_MAX)
+    start = sink.tell() if sink.seekable() else None
+
+    try:
+        hasher = QuickXorHash() if expected else None
+        received = 0
+        resumes = 0
+        while True:
+            h = dict(headers, Range=f"bytes={received}-") if received else headers
+            try:
+                with _http().get(url, headers=h, stream=True, timeout=120) as resp:
+                    if received and resp.status_code == 200:
+                        # range ignored: the body starts from byte 0 again
+                        if start is None:
+                            raise RuntimeError(f"Download of {meta.get('name')} was interrupted and cannot be restarted into this sink")
+                        sink.seek(start)
+                        sink.truncate()
+                        hasher = QuickXorHash() if expected else None
+                        received = 0
+                    resp.raise_for_status()
+                    for chunk in resp.iter_content(chunk_size):
+                        sink.write(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
+                        received += len(chunk)
+                        if progress:
+                            progress(received, total)
+                if total is None or received >= total:
+                    break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                pass
+            resumes += 1
+            if resumes > max_resumes:
+                raise RuntimeError(f"Download of {meta.get('name')} did not complete after {max_resumes} resumes")
+
+        if hasher is not None and hasher.b64digest() != expected:
+            raise DownloadIntegrityError(
+                f"{meta.get('name')}: quickXorHash {hasher.b64digest()} does not match the expected {expected}"
+            )
+    except BaseException:
+        if own_sink:
+            sink.close()
+        raise
+
+    if start is not None:
+        sink.seek(start)
+    return sink
 
 
 def download_file_bytes(token: str, drive_id: str, file_item_id: str) -> bytes:
-    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{file_item_id}/content"
-    r = requests.get(url, headers=_headers(token), timeout=120)
-    r.raise_for_status()
-    return r.content
+    """Whole file as bytes; prefer download_file when the consumer can read a file object."""
+    return download_file(token, drive_id, file_item_id, sink=io.BytesIO()).getvalue()
 
 
 def download_file_text(token: str, drive_id: str, file_item_id: str) -> str:
-    b = download_file_bytes(token, drive_id, file_item_id)
-    return b.decode("utf-8", errors="replace")
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with download_file(token, drive_id, file_item_id) as f:
+        parts = [decoder.decode(chunk) for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b"")]
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+def update_file_text(
+    token: str,
+    drive_id: str,
+    file_item_id: str,
+    new_text: str,
+    if_match: str | None = None,
+    remote_hash: str | None = None,
+) -> dict | None:
+    """
+    Overwrite a text file by id. Pass the eTag and quickXorHash captured when
+    the text was read: an unchanged text is not sent at all (returns None),
+    and a file changed by someone else in the meantime raises
+    WriteConflictError instead of being overwritten.
+    """
+    content_bytes = (new_text or "").encode("utf-8")
+    if remote_hash and QuickXorHash(content_bytes).b64digest() == remote_hash:
+        return None
 
+    extra = {"Content-Type": "text/plain; charset=utf-8"}
+    if if_match:
+        extra["If-Match"] = if_match
+    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{file_item_id}/content"
+    r = _http().put(url, headers=_headers(token, extra), data=content_bytes, timeout=120)
+    _raise_for_write(r, file_item_id)
+    item = r.json()
+    parent_id = (item.get("parentReference") or {}).get("id")
+    if parent_id:
+        invalidate_folder(drive_id, parent_id)
+    return item
 
-def update_file_text(token: str, drive_id: str, file_item_id: str, new_text: str):
-    meta_url = f"{GRAPH_BASE}/drives/{drive_id}/items/{file_item_id}"
-    meta = requests.get(meta_url, headers=_headers(token), timeout=60)
-    meta.raise_for_status()
-    meta = meta.json()
 
-    parent_id = meta["parentReference"]["id"]
-    filename = meta["name"]
+# ---------------------------
+# Drive delta (change feed)
+# ---------------------------
+DELTA_SELECT = "id,name,folder,file,size,eTag,parentReference,deleted,root"
 
-    content_bytes = (new_text or "").encode("utf-8")
-    url = f"{GRAPH_BASE}/drives/{drive_id}/items/{parent_id}:/{filename}:/content"
-    r = requests.put(
-        url,
-        headers=_headers(token, {"Content-Type": "text/plain; charset=utf-8"}),
-        data=content_bytes,
-        timeout=120,
-    )
-    r.raise_for_status()
-    return r.json()
+
+def iter_drive_delta(token: str, drive_id: str, delta_link: str | None = None, select: str | None = DELTA_SELECT):
+    """
+    Walk the drive's delta feed page by page.
+    Yields (items, delta_link); delta_link is None except on the last page,
+    where it is the token to pass next time to get only newer changes.
+
+    SharePoint only supports delta on the drive root, so callers filter to the
+    subtree they care about. A 410 response means the token expired and a full
+    resync is needed (raised as requests.HTTPError).
+    """
+    if delta_link:
+        url, params = delta_link, None
+    else:
+        url = f"{GRAPH_BASE}/drives/{drive_id}/root/delta"
+        params = {"$select": select} if select else None
+
+    while url:
+        r = _http().get(url, headers=_headers(token), params=params, timeout=60)
+        r.raise_for_status()
+        body = r.json()
+        next_link = body.get("@odata.nextLink")
+        yield body.get("value", []), (None if next_link else body.get("@odata.deltaLink"))
+        url, params = next_link, None
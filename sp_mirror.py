@@ -0,0 +1,297 @@
+"""
+Local SQLite mirror of the Incident Reports tree.
+
+The mirror is filled from the drive delta feed and keeps the delta token, so a
+refresh only downloads what changed since the last sync. SharePoint only
+serves delta for the whole drive, so entries outside root_path are dropped
+(and items moved out of it removed). Each page is applied in its own short
+transaction, so readers and other writers are never blocked for the whole
+network walk. Folder/file listings for the Update Existing selector are then
+plain local queries.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+import sp_folder_graph as spg
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    drive_id  TEXT NOT NULL,
+    id        TEXT NOT NULL,
+    parent_id TEXT,
+    name      TEXT NOT NULL,
+    is_folder INTEGER NOT NULL,
+    size      INTEGER NOT NULL DEFAULT 0,
+    mime      TEXT NOT NULL DEFAULT '',
+    etag      TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (drive_id, id)
+);
+CREATE INDEX IF NOT EXISTS items_by_parent ON items (drive_id, parent_id, name COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    drive_id   TEXT NOT NULL,
+    root_path  TEXT NOT NULL,
+    root_id    TEXT,
+    delta_link TEXT,
+    synced_at  REAL,
+    PRIMARY KEY (drive_id, root_path)
+);
+"""
+
+
+class SharePointMirror:
+    def __init__(self, db_path: str, drive_id: str, root_path: str, min_sync_interval: float = 30.0):
+        self.db_path = db_path
+        self.drive_id = drive_id
+        self.root_path = root_path.strip("/")
+        self.min_sync_interval = min_sync_interval
+        self._sync_lock = threading.Lock()
+
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._db() as con:
+            con.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, timeout=30)
+        # WAL lets replicas on the same host read while one of them syncs
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+    @contextmanager
+    def _db(self):
+        con = self._connect()
+        try:
+            yield con
+            con.commit()
+        finally:
+            con.close()
+
+    # ---------------------------
+    # sync
+    # ---------------------------
+    def _state(self, con) -> tuple[str | None, str | None, float | None]:
+        row = con.execute(
+            "SELECT root_id, delta_link, synced_at FROM sync_state WHERE drive_id = ? AND root_path = ?",
+            (self.drive_id, self.root_path),
+        ).fetchone()
+        return row if row else (None, None, None)
+
+    def _save_state(self, con, root_id: str | None, delta_link: str | None) -> None:
+        con.execute(
+            "INSERT OR REPLACE INTO sync_state (drive_id, root_path, root_id, delta_link, synced_at) VALUES (?, ?, ?, ?, ?)",
+            (self.drive_id, self.root_path, root_id, delta_link, time.time()),
+        )
+
+    def _delete_subtree(self, con, item_id: str) -> None:
+        con.execute(
+            """
+            WITH RECURSIVE sub(id) AS (
+                SELECT ?
+                UNION ALL
+                SELECT i.id FROM items i JOIN sub ON i.parent_id = sub.id WHERE i.drive_id = ?
+            )
+            DELETE FROM items WHERE drive_id = ? AND id IN (SELECT id FROM sub)
+            """,
+            (item_id, self.drive_id, self.drive_id),
+        )
+
+    def apply_items(self, items: list[dict], con: sqlite3.Connection | None = None) -> None:
+        """Upsert driveItems (delta entries, or items returned by a write)."""
+        if con is None:
+            with self._db() as own:
+                self.apply_items(items, own)
+            return
+
+        for it in items:
+            if it.get("deleted") is not None:
+                self._delete_subtree(con, it["id"])
+                continue
+            if "name" not in it:
+                continue
+            con.execute(
+                "INSERT OR REPLACE INTO items (drive_id, id, parent_id, name, is_folder, size, mime, etag) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    self.drive_id,
+                    it["id"],
+                    (it.get("parentReference") or {}).get("id"),
+                    it["name"],
+                    1 if (it.get("folder") is not None or it.get("root") is not None) else 0,
+                    int(it.get("size") or 0),
+                    (it.get("file") or {}).get("mimeType", ""),
+                    it.get("eTag") or "",
+                ),
+            )
+
+    def sync(self, token: str, force: bool = False) -> int:
+        """
+        Pull changes from the delta feed. First call enumerates the drive,
+        later calls only fetch changes. Returns number of entries applied
+        under root_path.
+        """
+        with self._sync_lock:
+            with self._db() as con:
+                root_id, delta_link, synced_at = self._state(con)
+            if not force and delta_link and synced_at and time.time() - synced_at < self.min_sync_interval:
+                return 0
+
+            if not root_id:
+                root_item = spg._item_by_path(token, self.drive_id, self.root_path)
+                if not root_item:
+                    raise RuntimeError(f"Root path not found in drive: {self.root_path}")
+                root_id = root_item["id"]
+
+            try:
+                return self._pull(token, root_id, delta_link)
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 410:
+                    raise
+                # delta token expired: start over from a full enumeration of this
+                # root only; other root_paths on the drive keep their rows and links
+                with self._db() as con:
+                    self._delete_subtree(con, root_id)
+                return self._pull(token, root_id, None)
+
+    def _pull(self, token: str, root_id: str, delta_link: str | None) -> int:
+        applied = 0
+        # items seen before their (possibly in-subtree) parent folder, by parent id
+        orphans: dict[str, list[dict]] = {}
+        for items, new_link in spg.iter_drive_delta(token, self.drive_id, delta_link):
+            # the next page is fetched with no transaction open
+            with self._db() as con:
+                applied += self._apply_delta_page(con, root_id, items, orphans)
+                if new_link:
+                    self._save_state(con, root_id, new_link)
+        return applied
+
+    def _in_subtree(self, con, root_id: str, it: dict) -> bool | None:
+        """True/False when decidable from this entry and the mirror, None if the parent is not known yet."""
+        parent = it.get("parentReference") or {}
+        path = parent.get("path")
+        if path and "root:" in path:
+            rel = path.split("root:", 1)[1].strip("/").lower()
+            root = self.root_path.lower()
+            return rel == root or rel.startswith(root + "/")
+        parent_id = parent.get("id")
+        if parent_id == root_id:
+            return True
+        row = con.execute(
+            "SELECT 1 FROM items WHERE drive_id = ? AND id = ? AND is_folder = 1", (self.drive_id, parent_id)
+        ).fetchone()
+        return True if row else None
+
+    def _forget(self, con, item_id: str, root_id: str | None = None) -> None:
+        """Drop item_id's subtree; with root_id only if the mirror currently has it below that root."""
+        if root_id is not None:
+            row = con.execute(
+                """
+                WITH RECURSIVE up(id, parent_id) AS (
+                    SELECT id, parent_id FROM items WHERE drive_id = ? AND id = ?
+                    UNION
+                    SELECT i.id, i.parent_id FROM items i JOIN up ON i.id = up.parent_id WHERE i.drive_id = ?
+                )
+                SELECT 1 FROM up WHERE id = ? LIMIT 1
+                """,
+                (self.drive_id, item_id, self.drive_id, root_id),
+            ).fetchone()
+        else:
+            row = con.execute("SELECT 1 FROM items WHERE drive_id = ? AND id = ?", (self.drive_id, item_id)).fetchone()
+        if row:
+            self._delete_subtree(con, item_id)
+
+    def _apply_delta_page(self, con, root_id: str, items: list[dict], orphans: dict) -> int:
+        applied = 0
+        for it in items:
+            if it.get("deleted") is not None:
+                self._forget(con, it["id"])
+                continue
+            inside = True if it["id"] == root_id else self._in_subtree(con, root_id, it)
+            if inside is None:
+                # parent not seen yet: park it (and drop any stale copy) until the parent shows up
+                self._forget(con, it["id"], root_id)
+                orphans.setdefault((it.get("parentReference") or {}).get("id"), []).append(it)
+                continue
+            if not inside:
+                # outside root_path, or moved out of it; rows other root_paths on
+                # this drive mirror are theirs to keep
+                self._forget(con, it["id"], root_id)
+                continue
+            stack = [it]
+            while stack:
+                cur = stack.pop()
+                self.apply_items([cur], con)
+                applied += 1
+                stack.extend(orphans.pop(cur["id"], ()))
+        return applied
+
+    # ---------------------------
+    # queries
+    # ---------------------------
+    def _root_id(self, con) -> str | None:
+        return self._state(con)[0]
+
+    def _folder_id(self, con, path: str) -> str | None:
+        """path is either absolute (starts with root_path) or relative to it."""
+        path = path.strip("/")
+        if path.lower().startswith(self.root_path.lower()):
+            path = path[len(self.root_path):].strip("/")
+
+        current = self._root_id(con)
+        for part in [p for p in path.split("/") if p]:
+            if current is None:
+                return None
+            row = con.execute(
+                "SELECT id FROM items WHERE drive_id = ? AND parent_id = ? AND is_folder = 1 AND name = ? COLLATE NOCASE",
+                (self.drive_id, current, part),
+            ).fetchone()
+            current = row[0] if row else None
+        return current
+
+    def list_child_folders(self, path: str = "") -> list[dict]:
+        with self._db() as con:
+            folder_id = self._folder_id(con, path)
+            if folder_id is None:
+                return []
+            rows = con.execute(
+                "SELECT id, name FROM items WHERE drive_id = ? AND parent_id = ? AND is_folder = 1",
+                (self.drive_id, folder_id),
+            ).fetchall()
+        return sorted(({"id": i, "name": n} for i, n in rows), key=lambda x: x["name"].lower())
+
+    def list_incident_folders(self, base_path: str) -> list[dict]:
+        """Same shape as spg.list_incident_folders."""
+        with self._db() as con:
+            if self._folder_id(con, base_path) is None:
+                raise RuntimeError(f"Folder not found: {base_path}")
+        return self.list_child_folders(base_path)
+
+    def list_files(self, folder_item_id: str) -> list[dict]:
+        """Same shape as spg.list_files (plus eTag)."""
+        with self._db() as con:
+            rows = con.execute(
+                "SELECT id, name, size, mime, etag FROM items WHERE drive_id = ? AND parent_id = ? AND is_folder = 0",
+                (self.drive_id, folder_item_id),
+            ).fetchall()
+        out = [{"id": i, "name": n, "size": s, "mime": m, "etag": e} for i, n, s, m, e in rows]
+        return sorted(out, key=lambda x: x["name"].lower())
+
+
+_mirrors: dict[tuple, SharePointMirror] = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(db_path: str, drive_id: str, root_path: str) -> SharePointMirror:
+    key = (os.path.abspath(db_path), drive_id, root_path.strip("/"))
+    with _mirrors_lock:
+        m = _mirrors.get(key)
+        if m is None:
+            m = SharePointMirror(db_path, drive_id, root_path)
+            _mirrors[key] = m
+        return m
@@ -0,0 +1,62 @@
+import copy
+import hashlib
+import os
+import threading
+
+from docx import Document
+
+# abs path -> {"mtime_ns", "size", "sha256", "document"}
+_cache: dict[str, dict] = {}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _master(path: str):
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and (entry["mtime_ns"], entry["size"]) == (st.st_mtime_ns, st.st_size):
+            _stats["hits"] += 1
+            return entry["document"]
+
+        # mtime/size moved: only re-parse if the content really changed (e.g. a touch or re-checkout)
+        digest = _sha256(key)
+        if entry is None or entry["sha256"] != digest:
+            _stats["misses"] += 1
+            document = Document(key)
+        else:
+            _stats["hits"] += 1
+            document = entry["document"]
+
+        _cache[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha256": digest, "document": document}
+        return document
+
+
+def load_template(path: str):
+    """
+    Fresh Document for the template at path.
+    The template is unzipped and parsed once per process (re-parsed when its
+    mtime and hash change); each call gets its own deep copy to fill in.
+    """
+    return copy.deepcopy(_master(path))
+
+
+def cache_info() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_cache)}
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+        _stats["hits"] = 0
+        _stats["misses"] = 0
@@ -0,0 +1,304 @@
+"""
+Lightweight in-process tracing for the report hot paths.
+
+    with tracing.span("docx.save", bytes=n):
+        ...
+
+Spans nest through a contextvar (so a span opened in a worker thread starts
+its own trace). Finished spans go to a ring buffer for the Metrics page and
+into per-name duration histograms for the Prometheus text export.
+export_otlp_json() writes the buffer as OTLP/JSON (resourceSpans), which
+an OpenTelemetry collector's file receiver can ingest.
+
+Disabled unless IR_TRACING=1 (or enable()): span() then hands back one
+shared no-op context manager, so the cost is a flag check per call site.
+IR_METRICS_PORT=<port> additionally serves /metrics for scraping, on
+127.0.0.1 unless IR_METRICS_HOST names another interface (0.0.0.0 for all;
+the endpoint is unauthenticated).
+"""
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_BUFFER_SIZE = 5000
+# seconds; Prometheus histogram bucket upper bounds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# span attributes that become Prometheus labels (everything else stays on the span only)
+LABEL_ATTRS = ("http.method", "http.endpoint", "http.status")
+SERVICE_NAME = "smcod-tools"
+
+_enabled = os.getenv("IR_TRACING", "").lower() in ("1", "true", "yes", "on")
+_current: contextvars.ContextVar = contextvars.ContextVar("tracing_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "error", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        parent = _current.get()
+        self.name = name
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.error = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _recorder.record(self)
+        return False
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "attrs": dict(self.attrs),
+            "error": self.error,
+        }
+
+
+class Recorder:
+    """Ring buffer of finished spans plus cumulative histograms by (name, labels)."""
+
+    def __init__(self, size: int = DEFAULT_BUFFER_SIZE):
+        self._lock = threading.Lock()
+        self._spans: deque[Span] = deque(maxlen=size)
+        # (name, labels) -> [bucket counts..., count, sum seconds, errors]
+        self._hist: dict[tuple, list] = {}
+
+    def record(self, span: Span) -> None:
+        seconds = (span.end_ns - span.start_ns) / 1e9
+        labels = tuple((k, str(span.attrs[k])) for k in LABEL_ATTRS if k in span.attrs)
+        with self._lock:
+            self._spans.append(span)
+            h = self._hist.get((span.name, labels))
+            if h is None:
+                h = self._hist[(span.name, labels)] = [0] * (len(BUCKETS) + 3)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-3] += 1
+            h[-2] += seconds
+            if span.error:
+                h[-1] += 1
+
+    def spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def histograms(self) -> dict[tuple, list]:
+        with self._lock:
+            return {k: list(v) for k, v in self._hist.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+            self._hist.clear()
+
+
+_recorder = Recorder()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def span(name: str, **attrs):
+    """Context manager timing one operation (no-op while tracing is disabled)."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def recent_spans(limit: int | None = None) -> list[dict]:
+    spans = _recorder.spans()
+    if limit:
+        spans = spans[-limit:]
+    return [s.as_dict() for s in spans]
+
+
+def recent_traces(limit: int = 20) -> list[list[dict]]:
+    """Last `limit` traces (newest first), each a list of its spans ordered by start."""
+    by_trace: dict[str, list[dict]] = {}
+    for s in _recorder.spans():
+        by_trace.setdefault(s.trace_id, []).append(s.as_dict())
+    traces = sorted(by_trace.values(), key=lambda t: max(s["end_ns"] for s in t), reverse=True)
+    return [sorted(t, key=lambda s: s["start_ns"]) for t in traces[:limit]]
+
+
+def clear() -> None:
+    _recorder.clear()
+
+
+# ---------------------------
+# exports
+# ---------------------------
+def _metric_name(span_name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in span_name)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(labels: tuple, extra: tuple = ()) -> str:
+    parts = [f'{k.replace(".", "_")}="{_escape(v)}"' for k, v in labels + extra]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def prometheus_text() -> str:
+    """Cumulative span duration histograms in the Prometheus text exposition format."""
+    by_metric: dict[str, list] = {}
+    for (name, labels), h in sorted(_recorder.histograms().items()):
+        by_metric.setdefault(_metric_name(name), []).append((name, labels, h))
+
+    out = []
+    for metric, series in by_metric.items():
+        out.append(f"# HELP ir_span_{metric}_seconds Duration of {series[0][0]} spans.")
+        out.append(f"# TYPE ir_span_{metric}_seconds histogram")
+        for _, labels, h in series:
+            for i, bound in enumerate(BUCKETS):
+                out.append(f"ir_span_{metric}_seconds_bucket{_label_str(labels, (('le', str(bound)),))} {h[i]}")
+            out.append(f"ir_span_{metric}_seconds_bucket{_label_str(labels, (('le', '+Inf'),))} {h[-3]}")
+            out.append(f"ir_span_{metric}_seconds_count{_label_str(labels)} {h[-3]}")
+            out.append(f"ir_span_{metric}_seconds_sum{_label_str(labels)} {h[-2]:.6f}")
+        out.append(f"# TYPE ir_span_{metric}_errors_total counter")
+        for _, labels, h in series:
+            out.append(f"ir_span_{metric}_errors_total{_label_str(labels)} {h[-1]}")
+    return "\n".join(out) + "\n"
+
+
+def _otlp_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def otlp_json() -> dict:
+    """The ring buffer as an OTLP/JSON ExportTraceServiceRequest."""
+    spans = []
+    for s in _recorder.spans():
+        item = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 3 if s.name.startswith("http.") else 1,  # CLIENT / INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": spans}],
+        }]
+    }
+
+
+def export_otlp_json(path: str) -> int:
+    """Append the ring buffer to path as one OTLP/JSON line; returns the span count."""
+    payload = otlp_json()
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(payload) + "\n")
+    return len(payload["resourceSpans"][0]["scopeSpans"][0]["spans"])
+
+
+# ---------------------------
+# /metrics endpoint
+# ---------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server: ThreadingHTTPServer | None = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start (once per process) a background HTTP server exposing GET /metrics."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    return _server
+
+
+if os.getenv("IR_METRICS_PORT"):
+    try:
+        serve_metrics(int(os.environ["IR_METRICS_PORT"]), os.getenv("IR_METRICS_HOST") or "127.0.0.1")
+    except OSError:
+        # another process on this host already serves it
+        pass
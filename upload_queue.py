@@ -0,0 +1,401 @@
+"""
+Durable queue for publishing generated reports to SharePoint.
+
+Generate Report only renders the DOCX and calls submit(): the bytes are
+spooled to disk, the job row goes into SQLite and worker threads do the
+folder check/creation and the upload (ir_engine.publish_report). The page
+polls get() for status.
+
+Jobs survive restarts: a job is claimed with a lease, so one left "running"
+by a dead process is picked up again once its lease runs out. Failed
+attempts are retried with exponential backoff (plus jitter) up to
+max_attempts. An existing incident folder on Create New is a final
+"duplicate" state, and an Update whose report was changed by someone else
+since it was loaded (eTag mismatch) a final "conflict"; neither is retried.
+
+No bearer token is written to disk. Jobs keep the submitting account id;
+workers ask token_source(account_id) (ms_graph.background_token_source,
+which refreshes through the per-user MSAL cache) and fall back to the
+token passed to submit() while it is in memory and has not been refused
+with a 401. Running jobs renew their lease after every upload chunk.
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+import ir_engine
+import sp_folder_graph as spg
+import sp_mirror
+import tracing
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+CONFLICT = "conflict"
+FINAL_STATES = (DONE, FAILED, DUPLICATE, CONFLICT)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id            TEXT PRIMARY KEY,
+    status        TEXT NOT NULL,
+    account_id    TEXT,
+    drive_id      TEXT NOT NULL,
+    root_path     TEXT NOT NULL,
+    incident_no   TEXT NOT NULL,
+    year          TEXT NOT NULL DEFAULT '',
+    city          TEXT NOT NULL DEFAULT '',
+    target        TEXT,
+    mirror_db     TEXT,
+    spool_path    TEXT NOT NULL,
+    size          INTEGER NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    next_run_at   REAL NOT NULL,
+    lease_until   REAL,
+    last_error    TEXT,
+    result        TEXT,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_run_at);
+"""
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_BASE_DELAY = 5.0
+DEFAULT_MAX_DELAY = 15 * 60.0
+# a running job whose worker is gone is retried after this long
+DEFAULT_LEASE = 15 * 60.0
+# finished jobs are deleted after this long
+DEFAULT_KEEP = 7 * 24 * 3600.0
+
+
+class UploadQueue:
+    """
+    Jobs in <queue_dir>/queue.sqlite (WAL), DOCX bytes in <queue_dir>/spool/.
+    Short-lived connections per call, so several processes may share a
+    queue_dir; the lease keeps them from uploading the same job twice.
+    """
+
+    def __init__(self, queue_dir: str, token_source=None, workers: int = DEFAULT_WORKERS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY, lease: float = DEFAULT_LEASE,
+                 poll_interval: float = 1.0):
+        self.queue_dir = queue_dir
+        self.db_path = os.path.join(queue_dir, "queue.sqlite")
+        self.spool_dir = os.path.join(queue_dir, "spool")
+        self.token_source = token_source
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+        self._tokens: dict[str, str] = {}
+        self._progress: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        # autocommit; writes take the lock up front with BEGIN IMMEDIATE
+        con = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        con.row_factory = sqlite3.Row
+        return con
+
+    def _write(self, fn):
+        con = self._connect()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(con)
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+            return out
+        finally:
+            con.close()
+
+    # ---------------------------
+    # producer side
+    # ---------------------------
+    def submit(self, docx_bytes: bytes, drive_id: str, full_incident_no: str,
+               root_path: str = ir_engine.DEFAULT_ROOT_PATH, year: str = "", city: str = "",
+               target: dict | None = None, account_id: str | None = None, token: str | None = None,
+               mirror_db_path: str | None = None) -> str:
+        """
+        Persist the report and its destination (same meaning as
+        ir_engine.publish_report) and return the job id. The DOCX is on disk
+        before the job row exists, so a queued job always has its bytes.
+        """
+        job_id = uuid.uuid4().hex
+        spool_path = os.path.join(self.spool_dir, f"{job_id}.docx")
+        tmp = f"{spool_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(docx_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, spool_path)
+
+        now = time.time()
+        self._write(lambda con: con.execute(
+            "INSERT INTO jobs (id, status, account_id, drive_id, root_path, incident_no, year, city, target, "
+            "mirror_db, spool_path, size, next_run_at, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, account_id, drive_id, root_path, full_incident_no, year, city,
+             json.dumps(target) if target else None, mirror_db_path, spool_path, len(docx_bytes),
+             now, now, now),
+        ))
+        if token:
+            with self._lock:
+                self._tokens[job_id] = token
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Job as a dict, plus "sent"/"total" bytes while it is uploading."""
+        con = self._connect()
+        try:
+            row = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            con.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job["target"] = json.loads(job["target"]) if job["target"] else None
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        with self._lock:
+            job["sent"], job["total"] = self._progress.get(job_id, (0, job["size"]))
+        return job
+
+    def retry(self, job_id: str) -> bool:
+        """Put a failed job back in the queue with a fresh attempt budget."""
+        now = time.time()
+        changed = self._write(lambda con: con.execute(
+            "UPDATE jobs SET status = ?, attempts = 0, next_run_at = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (QUEUED, now, now, job_id, FAILED),
+        ).rowcount)
+        if changed:
+            self.start()
+            self._wake.set()
+        return bool(changed)
+
+    def purge(self, keep: float = DEFAULT_KEEP) -> int:
+        """Delete finished jobs (and any spool file left) older than keep seconds."""
+        cutoff = time.time() - keep
+
+        def _do(con):
+            rows = con.execute(
+                f"SELECT id, spool_path FROM jobs WHERE status IN ({','.join('?' * len(FINAL_STATES))}) AND updated_at < ?",
+                (*FINAL_STATES, cutoff),
+            ).fetchall()
+            con.executemany("DELETE FROM jobs WHERE id = ?", [(r["id"],) for r in rows])
+            return rows
+
+        rows = self._write(_do)
+        for r in rows:
+            _remove(r["spool_path"])
+        return len(rows)
+
+    def stats(self) -> dict:
+        con = self._connect()
+        try:
+            rows = con.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        finally:
+            con.close()
+        return {status: n for status, n in rows}
+
+    # ---------------------------
+    # workers
+    # ---------------------------
+    def start(self) -> None:
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(max(1, self.workers)):
+                t = threading.Thread(target=self._run, name=f"upload-queue-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        for t in list(self._threads):
+            t.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            job = self._claim()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._process(job)
+
+    def _claim(self) -> dict | None:
+        """Take the oldest due job (or one whose lease expired) and lease it."""
+        now = time.time()
+
+        def _do(con):
+            row = con.execute(
+                "SELECT * FROM jobs WHERE (status = ? AND next_run_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY next_run_at LIMIT 1",
+                (QUEUED, now, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            con.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, now + self.lease, now, row["id"]),
+            )
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+
+        return self._write(_do)
+
+    def _token_for(self, job: dict) -> str | None:
+        # A fresh token from the MSAL cache first: the one captured at submit
+        # time may have expired by the time a retried or resumed job runs.
+        if self.token_source is not None and job["account_id"]:
+            try:
+                token = self.token_source(job["account_id"])
+            except Exception:
+                token = None
+            if token:
+                return token
+        with self._lock:
+            return self._tokens.get(job["id"])
+
+    def _renew_lease(self, job_id: str) -> None:
+        """Push the lease out again so a long upload is not reclaimed while it is still running."""
+        now = time.time()
+        self._write(lambda con: con.execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+            (now + self.lease, now, job_id, RUNNING),
+        ))
+
+    def _process(self, job: dict) -> None:
+        with tracing.span("queue.upload", attempt=job["attempts"], bytes=job["size"]):
+            self._process_job(job)
+
+    def _process_job(self, job: dict) -> None:
+        job_id = job["id"]
+
+        def _progress(sent, total):
+            with self._lock:
+                self._progress[job_id] = (sent, total)
+            # called after every upload chunk
+            self._renew_lease(job_id)
+
+        try:
+            token = self._token_for(job)
+            if not token:
+                raise RuntimeError("no Graph token for this job (sign in again to resume it)")
+            with open(job["spool_path"], "rb") as f:
+                docx_bytes = f.read()
+            mirror = None
+            if job["mirror_db"]:
+                mirror = sp_mirror.get_mirror(job["mirror_db"], job["drive_id"], job["root_path"])
+            uploaded = ir_engine.publish_report(
+                token,
+                job["drive_id"],
+                docx_bytes,
+                job["incident_no"],
+                root_path=job["root_path"],
+                year=job["year"],
+                city=job["city"],
+                target=json.loads(job["target"]) if job["target"] else None,
+                progress=_progress,
+                mirror=mirror,
+            )
+        except ir_engine.DuplicateIncidentError as e:
+            self._finish(job, DUPLICATE, error=str(e))
+        except spg.WriteConflictError as e:
+            self._finish(job, CONFLICT, error=str(e))
+        except Exception as e:
+            if getattr(getattr(e, "response", None), "status_code", None) == 401:
+                # the cached bearer token is no good; later attempts ask token_source only
+                with self._lock:
+                    self._tokens.pop(job_id, None)
+            if job["attempts"] >= self.max_attempts:
+                self._finish(job, FAILED, error=str(e))
+            else:
+                self._reschedule(job, str(e))
+        else:
+            result = {k: uploaded.get(k) for k in ("id", "name", "webUrl", "size", "eTag", "unchanged")}
+            self._finish(job, DONE, result=result)
+        finally:
+            with self._lock:
+                self._progress.pop(job_id, None)
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _reschedule(self, job: dict, error: str) -> None:
+        now = time.time()
+        self._write(lambda con: con.execute(
+            "UPDATE jobs SET status = ?, next_run_at = ?, lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+            (QUEUED, now + self._backoff(job["attempts"]), error, now, job["id"]),
+        ))
+
+    def _finish(self, job: dict, status: str, error: str | None = None, result: dict | None = None) -> None:
+        now = time.time()
+        self._write(lambda con: con.execute(
+            "UPDATE jobs SET status = ?, lease_until = NULL, last_error = ?, result = ?, updated_at = ? WHERE id = ?",
+            (status, error, json.dumps(result) if result else None, now, job["id"]),
+        ))
+        with self._lock:
+            self._tokens.pop(job["id"], None)
+        # failed jobs keep their bytes so retry() can resend them
+        if status != FAILED:
+            _remove(job["spool_path"])
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_queues: dict[str, UploadQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(queue_dir: str, token_source=None, workers: int = DEFAULT_WORKERS) -> UploadQueue:
+    """
+    Process-wide queue for queue_dir with its workers running. Jobs left by
+    a previous process are resumed; old finished jobs are purged.
+    """
+    key = os.path.abspath(queue_dir)
+    with _queues_lock:
+        q = _queues.get(key)
+        if q is None:
+            q = UploadQueue(queue_dir, token_source=token_source, workers=workers)
+            q.purge()
+            _queues[key] = q
+        elif token_source is not None and q.token_source is None:
+            q.token_source = token_source
+    q.start()
+    return q